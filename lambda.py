@@ -1,5 +1,4 @@
 """Lambda function handler."""
-import asyncio
 import json
 import logging
 from typing import TYPE_CHECKING
@@ -8,7 +7,10 @@ import boto3
 
 import expense_bot as bot
 from expense_bot import Repository, setup_logging
-from expense_bot.secrets import provides
+from expense_bot.metrics import metrics
+from expense_bot.runtime import Runtime
+from expense_bot.secrets import provides, secrets
+from expense_bot.tenants import tenants
 
 if TYPE_CHECKING:
     from awslambdaric.lambda_context import LambdaContext
@@ -16,8 +18,11 @@ if TYPE_CHECKING:
 setup_logging()
 logger = logging.getLogger()
 
+runtime = Runtime()
+metrics.emf = True
 
-@provides(secret="g-service-acct")
+
+@provides(secret="g-service-acct", ttl=3600)
 def service_acct_credentials():
     secret_name = "expenseBot/credentials/gsheet"
 
@@ -27,12 +32,16 @@ def service_acct_credentials():
     return json.loads(response["SecretString"])
 
 
-Repository.set_current(Repository.new("GoogleSheets"))
-
-
 def handler(event: dict, context: "LambdaContext"):
     """Entry point for the Lambda function."""
+    if Repository.get_current() is None:
+        secrets.configure_cache()
+        tenants.configure()
+        runtime.run(secrets.prefetch())
+        Repository.set_current(Repository.new("GoogleSheets"))
+
     logger.info("Expense Bot (version %s) is running!", bot.__version__)
-    return asyncio.get_event_loop().run_until_complete(
-        bot.handle_lambda_event(event)
-    )
+    try:
+        return runtime.run(bot.handle_lambda_event(event))
+    finally:
+        metrics.flush()
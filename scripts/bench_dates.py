@@ -0,0 +1,54 @@
+"""Compare the regex-driven date parser against
+the former chain of `datetime.strptime` calls."""
+import argparse
+import timeit
+from contextlib import suppress
+from datetime import date, datetime, timedelta
+
+from expense_bot.utils import FORMATS, parse_date
+
+INPUTS = [
+    "today",
+    "yesterday",
+    "2024-01-31",
+    "20240131",
+    "1/31/2024",
+    "01/31/24",
+]
+
+
+def strptime_parse_date(value: str) -> date:
+    """Former implementation of `parse_date`."""
+    if value == "today":
+        return date.today()
+    if value == "yesterday":
+        return date.today() - timedelta(days=1)
+
+    for fmt in FORMATS:
+        with suppress(ValueError):
+            return datetime.strptime(value, fmt).date()
+    raise ValueError(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=10000)
+    args = parser.parse_args()
+
+    for value in INPUTS:
+        assert parse_date(value) == strptime_parse_date(value), value
+
+        timings = [
+            timeit.timeit(lambda: func(value), number=args.number)
+            for func in (strptime_parse_date, parse_date)
+        ]
+        per_call = [t / args.number * 1e6 for t in timings]
+        print(
+            f"{value:>12}: strptime {per_call[0]:6.2f} us,"
+            f" regex {per_call[1]:6.2f} us,"
+            f" x{timings[0] / timings[1]:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Measure throughput of the Google Sheets repository
+against an in-process fake spreadsheet."""
+import argparse
+import asyncio
+import time
+from datetime import date, timedelta
+
+from expense_bot.metrics import metrics
+from expense_bot.model import ExpenseItem
+from expense_bot.testing import FakeGoogleSheets, FakeSpreadsheets
+
+
+async def run(repo: FakeGoogleSheets, count: int):
+    start = date(2024, 1, 1)
+    # each day has room for up to four purchases
+    days = [start + timedelta(days=i // 3) for i in range(count)]
+
+    await asyncio.gather(
+        *(
+            repo.add_async(ExpenseItem(1.0, f"Vendor {i % 3}"), dt=dt)
+            for i, dt in enumerate(days)
+        )
+    )
+    await repo.flush_async()
+    await asyncio.gather(*(repo.get_all_async(dt=dt) for dt in days))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    sheets = FakeSpreadsheets(latency=args.latency)
+    repo = FakeGoogleSheets(sheets)
+
+    started = time.perf_counter()
+    asyncio.run(run(repo, args.count))
+    elapsed = time.perf_counter() - started
+
+    print(f"{args.count} adds and reads in {elapsed:.2f}s")
+    print(f"{2 * args.count / elapsed:.1f} operations/s")
+    print(f"{sheets.total_calls} API calls: {dict(sheets.calls)}")
+    print(f"month cache: {repo.month_cache_info()}")
+    for name, stats in metrics.snapshot()["histograms"].items():
+        print(f"{name}: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Report import time of the Lambda handler path,
+as measured by `python -X importtime`."""
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parent.parent.absolute()
+
+
+def measure(statement: str) -> list[tuple[int, int, str]]:
+    """Run the statement in a fresh interpreter and collect
+    (self, cumulative, module) import times in microseconds."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [str(PROJECT_DIR / "src"), str(PROJECT_DIR), env.get("PYTHONPATH", "")]
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split(
+            "|"
+        )
+        timings.append((int(self_us), int(cumulative_us), module[1:]))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "statement",
+        nargs="?",
+        default="__import__('lambda')",
+        help="code to profile (default: %(default)r)",
+    )
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    timings = measure(args.statement)
+    top_level = [t for t in timings if not t[2].startswith(" ")]
+    total = sum(cumulative for _, cumulative, _ in top_level)
+
+    print(f"Total import time: {total / 1000:.1f} ms")
+    print(f"Slowest {args.top} imports (cumulative):")
+    for _, cumulative, module in sorted(timings, key=lambda t: -t[1])[
+        : args.top
+    ]:
+        print(f"{cumulative / 1000:10.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Create month sheets ahead of time, so that no update waits for it."""
+import argparse
+import asyncio
+import json
+
+from expense_bot import Repository, setup_logging
+from expense_bot.bot import provision_months
+from expense_bot.secrets import provides
+from expense_bot.tenants import tenants
+
+
+@provides(secret="g-service-acct")
+def creds():
+    with open("bot-credentials.json", encoding="utf-8") as fin:
+        return json.load(fin)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--months",
+        type=int,
+        default=2,
+        help="number of months to provision, starting with the current one"
+        " (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--repository",
+        default="GoogleSheets",
+        help="repository type (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+    Repository.set_current(Repository.new(args.repository))
+    tenants.configure()
+
+    created = asyncio.run(provision_months(args.months))
+    print(f"Provisioned months: {', '.join(created) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,13 @@
 """Run the bot in a long-polling mode."""
+import argparse
 import asyncio
 import json
 
-from expense_bot import Repository
-from expense_bot.bot import bot, dp
+from expense_bot import Repository, setup_logging
+from expense_bot.metrics import metrics
+from expense_bot.polling import PollingRunner
 from expense_bot.secrets import provides
+from expense_bot.tenants import tenants
 
 
 @provides(secret="g-service-acct")
@@ -13,12 +16,52 @@ def creds():
         return json.load(fin)
 
 
-async def main():
-    Repository.set_current(Repository.new("InMemory"))
-    await dp.start_polling(
-        bot, skip_updates=True, allowed_updates=["message", "callback_query"]
+async def run(args: argparse.Namespace):
+    runner = PollingRunner(
+        concurrency=args.concurrency,
+        max_pending=args.max_pending,
+        skip_updates=args.skip_updates,
     )
+    try:
+        await runner.run()
+    finally:
+        metrics.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--repository",
+        default="GoogleSheets",
+        help="repository type (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="max number of updates processed at a time"
+        " (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        default=100,
+        help="max number of fetched updates waiting to be processed,"
+        " polling pauses beyond it (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--skip-updates",
+        action="store_true",
+        help="drop the updates sent while the bot was not running",
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+    Repository.set_current(Repository.new(args.repository))
+    tenants.configure()
+
+    asyncio.run(run(args))
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
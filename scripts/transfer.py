@@ -0,0 +1,52 @@
+"""Import expenses from, or export them to, a CSV or JSONL file."""
+import argparse
+
+from expense_bot import Repository, setup_logging
+from expense_bot.transfer import export_file, import_file
+from expense_bot.utils import parse_date_range
+
+
+def repository_options(values: list[str]) -> dict[str, str]:
+    """Parse `key=value` pairs passed to the repository constructor."""
+    return dict(value.split("=", 1) for value in values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("path", help="file with a .csv or .jsonl extension")
+    parser.add_argument(
+        "--period",
+        default="this month",
+        help="dates to export (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--repository",
+        default="SQLite",
+        help="repository type (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--option",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="repository constructor argument, e.g. path=expenses.sqlite3",
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+    repo = Repository.new(args.repository, **repository_options(args.option))
+
+    if args.action == "import":
+        result = import_file(repo, args.path)
+        print(f"Imported {result.imported} records")
+        for error in result.errors:
+            print(f"Skipped {error}")
+    else:
+        start, end = parse_date_range(args.period)
+        count = export_file(repo, start, end, args.path)
+        print(f"Exported {count} records from {start} to {end}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,45 @@
-"""Expense Bot."""
+"""Expense Bot.
 
-from .bot import bot, handle_lambda_event
-from .repositories import GoogleSheets, InMemory
-from .repository import Repository
-from .secrets import secrets
-from .utils import setup_logging
+Submodules are imported on first access to their attributes,
+so that importing the package stays cheap for cold starts."""
 
-setup_logging()
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .bot import bot, handle_lambda_event
+    from .repositories import GoogleSheets, InMemory
+    from .repository import Repository
+    from .secrets import secrets
+    from .utils import setup_logging
 
 
 __version__ = "0.1.0"
 
+_LAZY_ATTRS = {
+    "GoogleSheets": ".repositories",
+    "InMemory": ".repositories",
+    "Repository": ".repository",
+    "bot": ".bot",
+    "handle_lambda_event": ".bot",
+    "secrets": ".secrets",
+    "setup_logging": ".utils",
+}
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        module = import_module(_LAZY_ATTRS[name], __name__)
+    except KeyError:
+        raise AttributeError(
+            f"module {__name__!r} has no attribute {name!r}"
+        ) from None
+
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
 __all__ = [
     "GoogleSheets",
     "InMemory",
@@ -18,4 +47,5 @@ __all__ = [
     "bot",
     "handle_lambda_event",
     "secrets",
+    "setup_logging",
 ]
@@ -1,24 +1,27 @@
 """Bot configuration."""
 
+import asyncio
 import json
 import logging
 import os
+import time
+from datetime import date, timedelta
+from functools import cache
+from typing import Any, Optional
 
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.methods import TelegramMethod
 from aiogram.types import Update
+from aiohttp import ClientSession
 
-from .commands import (
-    configure_add_command,
-    configure_cancel_command,
-    configure_error_handling,
-    configure_show_command,
-    configure_start_command,
-)
+from .repository import Repository
 from .secrets import provides, secrets
-from .utils import setup_logging
+from .storage import SQLiteStorage
+from .tenants import TenantMiddleware, tenants
 
-setup_logging()
 logger = logging.getLogger()
 
 
@@ -32,27 +35,284 @@ def bot_token():
             return fin.read().strip()
 
 
-bot = Bot(token=secrets["bot-token"])
-dp = Dispatcher(storage=MemoryStorage())
+class KeepAliveSession(AiohttpSession):
+    """Bot API session which keeps idle connections open for longer,
+    so that back-to-back updates can reuse them."""
 
-# start - Start conversation
-# add - Record an expense item
-# show - Show expenses for a certain date
-# cancel - Cancel current operation
-configure_start_command(dp)
-configure_cancel_command(dp)
-configure_add_command(dp)
-configure_show_command(dp)
-configure_error_handling(dp)
+    def __init__(self, keepalive_timeout: float = 300.0, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._connector_init["keepalive_timeout"] = keepalive_timeout
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.last_used = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        """Whether the session has live connections to reuse."""
+        return self._session is not None and not self._session.closed
+
+    async def create_session(self) -> ClientSession:
+        # aiohttp sessions are bound to the loop they were created in
+        loop = asyncio.get_running_loop()
+        if self._session is not None and self._session_loop is not loop:
+            self._session = None
+
+        self._session_loop = loop
+        self.last_used = time.monotonic()
+        return await super().create_session()
+
+
+def create_bot() -> Bot:
+    """Create a bot client."""
+    return Bot(token=secrets["bot-token"], session=KeepAliveSession())
+
+
+def create_storage() -> BaseStorage:
+    """Create FSM storage, which is persisted to a SQLite database
+    if `FSM_STORAGE_PATH` environment variable is set.
+
+    `FSM_STORAGE_JOURNAL_MODE` sets SQLite journal mode, WAL by default;
+    set it to DELETE when the database is on a network file system."""
+    path = os.environ.get("FSM_STORAGE_PATH")
+    if not path:
+        return MemoryStorage()
+
+    journal_mode = os.environ.get("FSM_STORAGE_JOURNAL_MODE") or "WAL"
+    logger.info("Using FSM storage at '%s' (%s)", path, journal_mode)
+    return SQLiteStorage(path, journal_mode=journal_mode)
+
+
+def create_dispatcher(storage: Optional[BaseStorage] = None) -> Dispatcher:
+    """Create a dispatcher with all bot commands configured."""
+    # pylint: disable-next=C0415
+    from .commands import (
+        configure_add_command,
+        configure_cancel_command,
+        configure_error_handling,
+        configure_show_command,
+        configure_start_command,
+        configure_summary_command,
+        configure_transfer_commands,
+    )
+
+    dp = Dispatcher(storage=storage or create_storage())
+
+    # tenant routing runs before the filters of every handler
+    dp.message.outer_middleware(TenantMiddleware(tenants))
+    dp.callback_query.outer_middleware(TenantMiddleware(tenants))
+
+    # start - Start conversation
+    # add - Record an expense item
+    # show - Show expenses for a certain date
+    # summary - Summarize expenses for a week, month, year or date range
+    # export - Export expenses for a period as a CSV or JSONL file
+    # cancel - Cancel current operation
+    configure_start_command(dp)
+    configure_cancel_command(dp)
+    configure_add_command(dp)
+    configure_show_command(dp)
+    configure_summary_command(dp)
+    configure_transfer_commands(dp)
+    configure_error_handling(dp)
+    return dp
+
+
+@cache
+def get_bot() -> Bot:
+    """Get the bot client, creating it on first use."""
+    return create_bot()
+
+
+@cache
+def get_dispatcher() -> Dispatcher:
+    """Get the dispatcher, creating it on first use."""
+    return create_dispatcher()
+
+
+def __getattr__(name: str) -> Any:
+    if name == "bot":
+        return get_bot()
+    if name == "dp":
+        return get_dispatcher()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def chat_key(values: dict) -> Optional[int]:
+    """Identify the chat (or the user, if there is no chat)
+    which a raw update belongs to."""
+    for value in values.values():
+        if not isinstance(value, dict):
+            continue
+
+        message = value.get("message") or {}
+        chat = value.get("chat") or message.get("chat")
+        if chat:
+            return chat["id"]
+
+        user = value.get("from")
+        if user:
+            return user["id"]
+    return None
+
+
+async def _feed_update(values: dict) -> Any:
+    update = Update.model_construct(**values)
+    return await get_dispatcher().feed_update(get_bot(), update)
+
+
+def webhook_response(method: TelegramMethod) -> Optional[dict]:
+    """Serialize a Bot API method as the webhook HTTP response,
+    so that Telegram performs it without an extra round-trip.
+    Return None if the method cannot be answered inline,
+    e.g. because it uploads files."""
+    bot = get_bot()
+    files: dict[str, Any] = {}
+    payload = {"method": method.__api_method__}
+    for key, value in method.model_dump(warnings=False).items():
+        value = bot.session.prepare_value(
+            value, bot=bot, files=files, _dumps_json=False
+        )
+        if value is not None:
+            payload[key] = value
+
+    if files:
+        return None
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps(payload),
+    }
+
+
+async def _feed_chat_updates(records: list[tuple[str, dict]]) -> list[str]:
+    """Process updates of a single chat one by one, and return ids
+    of the failed records. Once an update fails, the later ones
+    are not processed, so that they can be retried in order."""
+    failed: list[str] = []
+    for record_id, values in records:
+        if failed:
+            failed.append(record_id)
+            continue
+
+        try:
+            result = await _feed_update(values)
+            if isinstance(result, Exception):
+                # the exception was handled by the error handler
+                raise result
+            if isinstance(result, TelegramMethod):
+                # there is no HTTP response to answer batched updates in
+                await get_dispatcher().silent_call_request(get_bot(), result)
+        except Exception:  # pylint: disable=W0718
+            logger.exception("Failed to process record %s", record_id)
+            failed.append(record_id)
+    return failed
+
+
+async def feed_batch(records: list[tuple[str, dict]]) -> list[str]:
+    """Process a batch of raw updates, keyed by record id,
+    and return ids of the failed records.
+
+    Updates of different chats are processed concurrently,
+    while updates of the same chat are processed in order."""
+    chats: dict[object, list[tuple[str, dict]]] = {}
+    for record_id, values in records:
+        key = chat_key(values)
+        chats.setdefault(record_id if key is None else key, []).append(
+            (record_id, values)
+        )
+
+    results = await asyncio.gather(
+        *(_feed_chat_updates(chat) for chat in chats.values())
+    )
+    return [record_id for failed in results for record_id in failed]
+
+
+async def flush_buffers():
+    """Persist buffered FSM and repository writes."""
+    storage = get_dispatcher().storage
+    if isinstance(storage, SQLiteStorage):
+        storage.flush()
+    await Repository.current().flush_async()
+    await tenants.flush_async()
+
+
+async def provision_months(
+    months: int = 2, today: Optional[date] = None
+) -> list[str]:
+    """Prepare storage of the default repository and of every tenant
+    for the current and the upcoming months ahead of time, so that
+    no update has to wait for it. Return the months for which
+    anything had to be created."""
+    firsts = [(today or date.today()).replace(day=1)]
+    for _ in range(months - 1):
+        firsts.append((firsts[-1] + timedelta(days=31)).replace(day=1))
+
+    async def provision(repo: Repository):
+        for first in firsts:
+            if await repo.provision_async(first):
+                created.add(f"{first:%Y-%m}")
+
+    created: set[str] = set()
+    await provision(Repository.current())
+    # tenants are provisioned one by one, so that the pool does not
+    # evict the repositories which are being provisioned
+    for tenant in tenants.all():
+        if tenant.repository:
+            with tenants.use(tenant) as repo:
+                await provision(repo)
+    return sorted(created)
+
+
+async def _handle_single_update(values: dict) -> Optional[dict]:
+    try:
+        result = await _feed_update(values)
+    finally:
+        await flush_buffers()
+
+    if not isinstance(result, TelegramMethod):
+        return None
+
+    response = webhook_response(result)
+    if response is None:
+        await get_dispatcher().silent_call_request(get_bot(), result)
+    return response
 
 
 async def handle_lambda_event(event: dict):
     """Process the webhook payload sent to the Lambda function
-    as a single :type:`aiogram.types.Update` event.
+    and persist buffered repository and FSM writes afterwards.
 
-    Note: this function is NOT stateless - but for now
-    it's OK to assume that AWS Lambda would reuse the same
-    runtime for handling a few requests back-to-back."""
-    values = json.loads(event["body"])
-    update = Update.model_construct(**values)
-    await dp.feed_update(bot, update)
+    The payload is either a single :type:`aiogram.types.Update` event,
+    a JSON array of them, or an SQS-style batch of `Records`. For batches,
+    failed records are reported as `batchItemFailures`, identified by
+    SQS message id or by update id. For a single update, the final
+    Bot API method returned by the handler, if any, is sent back
+    as the webhook HTTP response. Scheduled EventBridge events
+    provision storage for the upcoming months instead.
+
+    Note: unless `FSM_STORAGE_PATH` points to a durable location,
+    this function is NOT stateless - it relies on AWS Lambda
+    reusing the same runtime for handling a few requests
+    back-to-back."""
+    if event.get("source") == "aws.events":
+        return {"provisioned": await provision_months()}
+
+    if "Records" in event:
+        records = [
+            (record["messageId"], json.loads(record["body"]))
+            for record in event["Records"]
+        ]
+    else:
+        values = json.loads(event["body"])
+        if not isinstance(values, list):
+            return await _handle_single_update(values)
+        records = [(str(item.get("update_id")), item) for item in values]
+
+    try:
+        failed = await feed_batch(records)
+        return {
+            "batchItemFailures": [
+                {"itemIdentifier": record_id} for record_id in failed
+            ]
+        }
+    finally:
+        await flush_buffers()
@@ -7,6 +7,8 @@ from .common import (
     configure_start_command,
 )
 from .show import configure_show_command
+from .summary import configure_summary_command
+from .transfer import configure_transfer_commands
 
 __all__ = [
     "configure_add_command",
@@ -14,4 +16,6 @@ __all__ = [
     "configure_error_handling",
     "configure_start_command",
     "configure_show_command",
+    "configure_summary_command",
+    "configure_transfer_commands",
 ]
@@ -41,7 +41,7 @@ def configure_add_command(dp: Dispatcher):
         await state.set_state(Add.amount)
         await state.update_data(dt=dt)
 
-        await message.answer("Amount in $?")
+        return message.answer("Amount in $?")
 
     income_descriptions = ["Paycheck", "Cashback"]
 
@@ -50,7 +50,7 @@ def configure_add_command(dp: Dispatcher):
     async def cmd_add_state1(message: Message, state: FSMContext):
         await state.update_data(amount=float(message.text or ""))
         await state.set_state(Add.vendor)
-        await message.answer(
+        return message.answer(
             "Description?",
             reply_markup=InlineKeyboardMarkup(
                 inline_keyboard=[
@@ -74,10 +74,10 @@ def configure_add_command(dp: Dispatcher):
             EARN if vnd in income_descriptions else SPEND,
         )
 
-        Repository.current().add(item, dt=dt)
+        await Repository.current().add_async(item, dt=dt)
 
-        await message.answer(choice(["🎉", "🥳", "🙌", "✔️", "💾"]))
         await state.clear()
+        return message.answer(choice(["🎉", "🥳", "🙌", "✔️", "💾"]))
 
     @dp.callback_query(auth_required, StateFilter(Add.vendor))
     async def cb_add_state2(callback: CallbackQuery, state: FSMContext):
@@ -88,4 +88,4 @@ def configure_add_command(dp: Dispatcher):
         await msg.answer(**text.as_kwargs())
 
         msg = msg.model_copy(update={"text": callback.data})
-        await cmd_add_state2(msg, state)
+        return await cmd_add_state2(msg, state)
@@ -10,6 +10,9 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, ErrorEvent, Message
 from aiogram.utils.formatting import Code, Text, TextMention
 
+from ..metrics import metrics
+from ..tenants import sender_ids, tenants
+
 logger = logging.getLogger()
 
 
@@ -18,9 +21,8 @@ class AccessDenied(Exception):
 
 
 def auth_required(msg: Union[CallbackQuery, Message]) -> bool:
-    """Allow messages from a single user only."""
-    user = msg.from_user
-    if not user or user.id != 288450274:
+    """Allow messages from the users and chats of registered tenants."""
+    if tenants.resolve(sender_ids(msg)) is None:
         raise AccessDenied("Unauthorized!")
     return True
 
@@ -35,6 +37,12 @@ def default_message_logging(
 ): ...
 
 
+@overload
+def default_message_logging(
+    coro: Callable[[Message, CommandObject], Coroutine],
+): ...
+
+
 @overload
 def default_message_logging(
     coro: Callable[[Message, CommandObject, FSMContext], Coroutine],
@@ -54,7 +62,11 @@ def default_message_logging(coro: Callable[..., Coroutine]):
                 coro.__name__,
             )
 
-            return await coro(message, *args, **kwargs)
+            with metrics.timer("HandlerLatency", Handler=coro.__name__):
+                return await coro(message, *args, **kwargs)
+        except Exception:
+            metrics.increment("HandlerErrors", Handler=coro.__name__)
+            raise
         finally:
             logger.info(
                 "Message %s, chat %s: `%s` handler done",
@@ -85,12 +97,15 @@ def configure_error_handling(dp: Dispatcher):
 
         # dispatcher won't re-raise the exception
         # if a truthy value is returned from handler
+        if isinstance(exc, AccessDenied):
+            return True
+        # while batched updates which end with an exception are retried
         return exc
 
     @dp.message(auth_required)
     @default_message_logging
     async def cmd_unrecognized(message: Message):
-        await message.answer("Command not recognized :(")
+        return message.answer("Command not recognized :(")
 
 
 def configure_start_command(dp: Dispatcher):
@@ -108,7 +123,7 @@ def configure_start_command(dp: Dispatcher):
             TextMention(user.full_name, user=user),
             "! 👋\nI'm your personal expense tracking bot!",
         )
-        await message.answer(**text.as_kwargs())
+        return message.answer(**text.as_kwargs())
 
 
 def configure_cancel_command(dp: Dispatcher):
@@ -120,11 +135,11 @@ def configure_cancel_command(dp: Dispatcher):
     async def cmd_cancel(message: Message, state: FSMContext):
         current_state = await state.get_state()
         if current_state is None:
-            return
+            return None
 
         logger.info("Cancelling state %r", current_state)
 
         operation = current_state.lower().split(":")[0]
 
         await state.clear()
-        await message.answer(f"Operation /{operation} cancelled")
+        return message.answer(f"Operation /{operation} cancelled")
@@ -1,38 +1,136 @@
 """Implementation of /show command."""
 
 import logging
+from datetime import date
 from random import choice
+from typing import Optional
 
 from aiogram import Dispatcher
 from aiogram.filters import Command, CommandObject, StateFilter
+from aiogram.filters.callback_data import CallbackData
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import CallbackQuery, Message
 from aiogram.types.inline_keyboard_button import InlineKeyboardButton
 from aiogram.types.inline_keyboard_markup import InlineKeyboardMarkup
-from aiogram.utils.formatting import Bold, Code, Italic, Text
+from aiogram.utils.formatting import Bold, Italic, Pre, Text
 
+from ..model import EARN, ExpenseItem
 from ..repository import Repository
-from ..utils import parse_date
+from ..utils import parse_date_range
 from .common import auth_required, default_message_logging
 
 logger = logging.getLogger()
 
+# Telegram limit on message text length
+MAX_MESSAGE_LENGTH = 4096
+# room left on each page for the header and the totals
+_PAGE_OVERHEAD = 256
+
+_DatedItems = list[tuple[date, ExpenseItem]]
+
+
+class ShowPage(CallbackData, prefix="show"):
+    """Callback data of /show report pagination buttons."""
+
+    start: int
+    end: int
+    page: int
+
+
+def _format_line(dt: date, item: ExpenseItem, with_date: bool) -> str:
+    amt = f"{'+' if item.cat is EARN else ''}${item.amt:.2f}"
+    line = f"{item.vnd:<20.20} {amt:>10}"
+    return f"{dt:%m/%d} {line}" if with_date else line
+
+
+def _split_pages(lines: list[str]) -> list[list[str]]:
+    limit = MAX_MESSAGE_LENGTH - _PAGE_OVERHEAD
+    pages: list[list[str]] = [[]]
+    size = 0
+    for line in lines:
+        size += len(line) + 1
+        if size > limit and pages[-1]:
+            pages.append([])
+            size = len(line) + 1
+        pages[-1].append(line)
+    return pages
+
+
+def render_report(
+    start: date, end: date, dated_items: _DatedItems
+) -> list[Text]:
+    """Format expenses as a table of vendors and amounts with totals,
+    split into pages that fit into a single message each."""
+    with_date = start != end
+    pages = _split_pages(
+        [_format_line(dt, item, with_date) for dt, item in dated_items]
+    )
+
+    spent = sum(item.amt for _, item in dated_items if item.cat is not EARN)
+    earned = sum(item.amt for _, item in dated_items if item.cat is EARN)
+    totals = f"Total: ${spent:.2f}"
+    if earned:
+        totals += f", earned: ${earned:.2f}"
+
+    title = f"{start:%m/%d/%Y}"
+    if with_date:
+        title += f" - {end:%m/%d/%Y}"
+
+    rendered = []
+    for i, lines in enumerate(pages, start=1):
+        header = Text(Bold(title))
+        if len(pages) > 1:
+            header += Text(" ", Italic(f"({i}/{len(pages)})"))
+        rendered.append(
+            Text(header, "\n", Pre("\n".join(lines)), "\n", Bold(totals))
+        )
+    return rendered
+
+
+def _pagination(
+    start: date, end: date, page: int, count: int
+) -> Optional[InlineKeyboardMarkup]:
+    if count < 2:
+        return None
+
+    buttons = []
+    for target, text in [(page - 1, "◀️"), (page + 1, "▶️")]:
+        if 0 <= target < count:
+            data = ShowPage(
+                start=start.toordinal(), end=end.toordinal(), page=target
+            )
+            buttons.append(
+                InlineKeyboardButton(text=text, callback_data=data.pack())
+            )
+    return InlineKeyboardMarkup(inline_keyboard=[buttons])
+
+
+async def _get_report(start: date, end: date) -> list[Text]:
+    repo = Repository.current()
+    if start == end:
+        items = await repo.get_all_async(dt=start)
+        dated_items = [(start, item) for item in items]
+    else:
+        dated_items = await repo.get_range_async(start, end)
+
+    if not dated_items:
+        return []
+    return render_report(start, end, dated_items)
+
 
 async def _do_show(message: Message, dt_str: str):
-    dt = parse_date(dt_str)
-    items = Repository.current().get_all(dt=dt)
-
-    if not items:
-        await message.answer(choice(["🤷‍♂️", "😴", "😪"]))
-
-    for item in items:
-        vnd, amt = item.vnd, f"${item.amt:.2f}"
-        msg = Text(Bold(vnd), ": ", Code(amt))
-        await message.answer(
-            protect_content=True,
-            **msg.as_kwargs(),
-        )
+    start, end = parse_date_range(dt_str)
+    pages = await _get_report(start, end)
+
+    if not pages:
+        return message.answer(choice(["🤷‍♂️", "😴", "😪"]))
+
+    return message.answer(
+        protect_content=True,
+        reply_markup=_pagination(start, end, 0, len(pages)),
+        **pages[0].as_kwargs(),
+    )
 
 
 class Show(StatesGroup):
@@ -44,6 +142,23 @@ class Show(StatesGroup):
 def configure_show_command(dp: Dispatcher):
     """Configure FSM behind /show command."""
 
+    @dp.callback_query(auth_required, ShowPage.filter())
+    async def cb_show_page(callback: CallbackQuery, callback_data: ShowPage):
+        msg = callback.message
+        assert isinstance(msg, Message), "must be accessible"
+
+        start = date.fromordinal(callback_data.start)
+        end = date.fromordinal(callback_data.end)
+        pages = await _get_report(start, end)
+        page = min(callback_data.page, len(pages) - 1)
+
+        if page >= 0:
+            await msg.edit_text(
+                reply_markup=_pagination(start, end, page, len(pages)),
+                **pages[page].as_kwargs(),
+            )
+        return callback.answer()
+
     @dp.message(auth_required, Command("show"))
     @default_message_logging
     async def cmd_show_state0(
@@ -51,11 +166,10 @@ def configure_show_command(dp: Dispatcher):
     ):
         args = command.args
         if args:
-            await _do_show(message, args)
-            return
+            return await _do_show(message, args)
 
         await state.set_state(Show.selected_date)
-        await message.answer(
+        return message.answer(
             "Which date?",
             reply_markup=InlineKeyboardMarkup(
                 inline_keyboard=[
@@ -70,8 +184,9 @@ def configure_show_command(dp: Dispatcher):
     @dp.message(auth_required, StateFilter(Show.selected_date))
     @default_message_logging
     async def cmd_show_state1(message: Message, state: FSMContext):
-        await _do_show(message, message.text or "")
+        answer = await _do_show(message, message.text or "")
         await state.clear()
+        return answer
 
     @dp.callback_query(auth_required, StateFilter(Show.selected_date))
     async def cb_show_state1(callback: CallbackQuery, state: FSMContext):
@@ -82,4 +197,4 @@ def configure_show_command(dp: Dispatcher):
         await msg.answer(**text.as_kwargs())
 
         msg = msg.model_copy(update={"text": callback.data})
-        await cmd_show_state1(msg, state)
+        return await cmd_show_state1(msg, state)
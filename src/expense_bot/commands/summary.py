@@ -0,0 +1,80 @@
+"""Implementation of /summary command."""
+
+import logging
+
+from aiogram import Dispatcher
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+from aiogram.utils.formatting import (
+    Bold,
+    Code,
+    Italic,
+    Text,
+    as_key_value,
+    as_list,
+    as_marked_section,
+)
+
+from ..model import Summary
+from ..repository import Repository
+from ..utils import parse_period
+from .common import auth_required, default_message_logging
+
+logger = logging.getLogger()
+
+
+def _amount(value: float) -> Code:
+    return Code(f"${value:.2f}")
+
+
+def render_summary(summary: Summary) -> Text:
+    """Format aggregated expenses as a single message."""
+    sections = [
+        Bold(f"{summary.start:%m/%d/%Y} - {summary.end:%m/%d/%Y}"),
+        as_list(
+            as_key_value("Earned", _amount(summary.earned)),
+            as_key_value("Spent", _amount(summary.spent)),
+            as_key_value("Net", _amount(summary.net)),
+            as_key_value("Per day", _amount(summary.daily_average)),
+        ),
+    ]
+    if summary.vendors:
+        sections.append(
+            as_marked_section(
+                Bold("Top vendors:"),
+                *(
+                    as_key_value(vnd, _amount(amt))
+                    for vnd, amt in summary.vendors
+                ),
+            )
+        )
+    if summary.largest:
+        sections.append(
+            as_marked_section(
+                Bold("Largest:"),
+                *(
+                    Text(
+                        Italic(f"{dt:%m/%d}"),
+                        f" {item.vnd}: ",
+                        _amount(item.amt),
+                    )
+                    for dt, item in summary.largest
+                ),
+            )
+        )
+    return as_list(*sections, sep="\n\n")
+
+
+def configure_summary_command(dp: Dispatcher):
+    """Configure handler behind /summary command."""
+
+    @dp.message(auth_required, Command("summary"))
+    @default_message_logging
+    async def cmd_summary(message: Message, command: CommandObject):
+        start, end = parse_period(command.args or "month")
+        summary = await Repository.current().summarize_async(start, end)
+
+        return message.answer(
+            protect_content=True,
+            **render_summary(summary).as_kwargs(),
+        )
@@ -0,0 +1,80 @@
+"""Implementation of /export command and of importing uploaded files."""
+
+import asyncio
+import logging
+import os
+from tempfile import TemporaryDirectory
+
+from aiogram import Dispatcher, F
+from aiogram.filters import Command, CommandObject
+from aiogram.types import FSInputFile, Message
+from aiogram.utils.formatting import Bold, Code, Text, as_list
+
+from ..repository import Repository
+from ..transfer import (
+    FILE_FORMATS,
+    export_file,
+    file_format,
+    import_records_async,
+)
+from ..utils import parse_period
+from .common import auth_required, default_message_logging
+
+logger = logging.getLogger()
+
+# number of skipped records described in the reply
+MAX_REPORTED_ERRORS = 10
+
+
+def configure_transfer_commands(dp: Dispatcher):
+    """Configure handlers behind /export command and file uploads."""
+
+    @dp.message(auth_required, F.document)
+    @default_message_logging
+    async def cmd_import(message: Message):
+        document, bot = message.document, message.bot
+        assert document and bot, "must not be None"
+        fmt = file_format(document.file_name or "")
+
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, f"upload.{fmt}")
+            await bot.download(document, destination=path)
+            with open(path, encoding="utf-8", newline="") as fin:
+                result = await import_records_async(
+                    Repository.current(), fin, fmt
+                )
+
+        text = Text("Imported ", Bold(result.imported), " records")
+        if result.errors:
+            text = as_list(
+                text,
+                Text("Skipped ", Bold(len(result.errors)), ":"),
+                *(
+                    Code(error)
+                    for error in result.errors[:MAX_REPORTED_ERRORS]
+                ),
+            )
+        return message.answer(**text.as_kwargs())
+
+    @dp.message(auth_required, Command("export"))
+    @default_message_logging
+    async def cmd_export(message: Message, command: CommandObject):
+        period, fmt = (command.args or "").strip(), "csv"
+        head, _, tail = period.rpartition(" ")
+        if tail in FILE_FORMATS:
+            period, fmt = head.strip(), tail
+
+        start, end = parse_period(period or "month")
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(
+                tmp, f"expenses_{start:%Y%m%d}_{end:%Y%m%d}.{fmt}"
+            )
+            count = await asyncio.to_thread(
+                export_file, Repository.current(), start, end, path, fmt
+            )
+            # the file has to be uploaded before it is removed
+            await message.answer_document(
+                FSInputFile(path),
+                caption=f"{count} records",
+                protect_content=True,
+            )
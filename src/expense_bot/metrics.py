@@ -0,0 +1,230 @@
+"""In-process metrics, emitted as CloudWatch Embedded Metric Format."""
+
+import json
+import logging
+import math
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+logger = logging.getLogger()
+
+# upper bounds of histogram buckets, e.g. latency in milliseconds
+BUCKETS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, math.inf)
+
+_Dimensions = tuple[tuple[str, str], ...]
+_Key = tuple[str, _Dimensions]
+
+
+class Histogram:
+    """Distribution of observed values, counted in buckets."""
+
+    __slots__ = ("unit", "count", "total", "max", "buckets", "sums")
+
+    def __init__(self, unit: str):
+        self.unit = unit
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.sums = [0.0] * len(BUCKETS)
+
+    def observe(self, value: float):
+        """Record a single value."""
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        i = bisect_left(BUCKETS, value)
+        self.buckets[i] += 1
+        self.sums[i] += value
+
+    def emf_values(self) -> dict[str, list[float]]:
+        """Represent the values as EMF `Values` and `Counts` arrays,
+        with the average value of every non-empty bucket, so that
+        the count and sum of the values are exact."""
+        values: list[float] = []
+        counts: list[float] = []
+        for count, total in zip(self.buckets, self.sums, strict=True):
+            if count:
+                values.append(total / count)
+                counts.append(count)
+        return {"Values": values, "Counts": counts}
+
+    @property
+    def mean(self) -> float:
+        """Average of the recorded values."""
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by the upper bound of its bucket."""
+        rank, seen = q * self.count, 0
+        for bound, count in zip(BUCKETS, self.buckets, strict=True):
+            seen += count
+            if count and seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class MetricsRegistry:
+    """Thread-safe registry of counters and histograms,
+    keyed by metric name and dimensions.
+
+    Metrics are accumulated in-process until :meth:`flush`, which writes
+    them to stdout in CloudWatch Embedded Metric Format if `emf` is set,
+    or logs them as a JSON summary otherwise. Dimensions set with
+    :meth:`dimensions` are added to every metric in the current context."""
+
+    def __init__(self, namespace: str = "ExpenseBot"):
+        self.namespace = namespace
+        self.emf = False
+        self._lock = threading.Lock()
+        self._counters: dict[_Key, float] = {}
+        self._histograms: dict[_Key, Histogram] = {}
+        self._context: ContextVar[Optional[dict[str, Any]]] = ContextVar(
+            f"metrics_{namespace}", default=None
+        )
+
+    def _key(self, name: str, dimensions: dict[str, Any]) -> _Key:
+        dimensions = {**(self._context.get() or {}), **dimensions}
+        return name, tuple(sorted((k, str(v)) for k, v in dimensions.items()))
+
+    @contextmanager
+    def dimensions(self, **dimensions: Any) -> Iterator[None]:
+        """Add dimensions to the metrics recorded within the block."""
+        context = self._context.get() or {}
+        token = self._context.set({**context, **dimensions})
+        try:
+            yield
+        finally:
+            self._context.reset(token)
+
+    def increment(self, name: str, value: float = 1, **dimensions: Any):
+        """Add value to a counter."""
+        key = self._key(name, dimensions)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        unit: str = "Milliseconds",
+        **dimensions: Any,
+    ):
+        """Record a value in a histogram."""
+        key = self._key(name, dimensions)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(unit)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **dimensions: Any) -> Iterator[None]:
+        """Record duration of the block in milliseconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.observe(name, elapsed, **dimensions)
+
+    def counter(self, name: str, **dimensions: Any) -> float:
+        """Get value of a counter, or sum of the counters with a given
+        name over all dimensions, if none are provided."""
+        with self._lock:
+            if dimensions:
+                return self._counters.get(self._key(name, dimensions), 0)
+            return sum(v for (n, _), v in self._counters.items() if n == name)
+
+    def histogram(self, name: str, **dimensions: Any) -> Optional[Histogram]:
+        """Get a histogram, if any values were recorded."""
+        with self._lock:
+            return self._histograms.get(self._key(name, dimensions))
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        """Summarize recorded metrics as a JSON-friendly dictionary."""
+
+        def label(key: _Key) -> str:
+            name, dims = key
+            return f"{name}{{{','.join(f'{k}={v}' for k, v in dims)}}}"
+
+        with self._lock:
+            return {
+                "counters": {label(k): v for k, v in self._counters.items()},
+                "histograms": {
+                    label(k): {
+                        "count": h.count,
+                        "mean": h.mean,
+                        "p50": h.quantile(0.5),
+                        "p99": h.quantile(0.99),
+                        "max": h.max,
+                    }
+                    for k, h in self._histograms.items()
+                },
+            }
+
+    def emf_documents(self) -> list[dict[str, Any]]:
+        """Render recorded metrics as EMF documents,
+        one per unique set of dimensions."""
+        timestamp = int(time.time() * 1000)
+        documents: dict[_Dimensions, dict[str, Any]] = {}
+
+        def document(dims: _Dimensions) -> dict[str, Any]:
+            if dims not in documents:
+                directive = {
+                    "Namespace": self.namespace,
+                    "Dimensions": [[k for k, _ in dims]],
+                    "Metrics": [],
+                }
+                documents[dims] = {
+                    "_aws": {
+                        "Timestamp": timestamp,
+                        "CloudWatchMetrics": [directive],
+                    },
+                    **dict(dims),
+                }
+            return documents[dims]
+
+        def add(dims: _Dimensions, name: str, unit: str, value: Any):
+            doc = document(dims)
+            doc["_aws"]["CloudWatchMetrics"][0]["Metrics"].append(
+                {"Name": name, "Unit": unit}
+            )
+            doc[name] = value
+
+        with self._lock:
+            for (name, dims), value in self._counters.items():
+                add(dims, name, "Count", value)
+            for (name, dims), histogram in self._histograms.items():
+                add(dims, name, histogram.unit, histogram.emf_values())
+        return list(documents.values())
+
+    def reset(self):
+        """Discard recorded metrics."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def flush(self):
+        """Emit recorded metrics and start over."""
+        if self.emf:
+            for doc in self.emf_documents():
+                # EMF is extracted from log lines that are plain JSON
+                sys.stdout.write(json.dumps(doc) + "\n")
+            sys.stdout.flush()
+        elif self._counters or self._histograms:
+            logger.info("Metrics: %s", json.dumps(self.snapshot()))
+        self.reset()
+
+
+metrics = MetricsRegistry()
+
+__all__ = [
+    "MetricsRegistry",
+    "metrics",
+]
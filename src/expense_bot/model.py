@@ -1,6 +1,7 @@
 """Data representations."""
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from datetime import date
 from enum import Enum, auto
 
 
@@ -14,7 +15,7 @@ class Category(Enum):
 EARN, SPEND = list(Category)
 
 
-@dataclass
+@dataclass(slots=True)
 class ExpenseItem:
     """Common expense item.
 
@@ -27,3 +28,39 @@ class ExpenseItem:
     amt: float
     vnd: str
     cat: Category = SPEND
+
+
+@dataclass(slots=True)
+class Summary:
+    """Expenses aggregated over a period of time.
+
+    Attributes:
+        start (date):    first day of the period
+        end (date):      last day of the period
+        earned (float):  total income
+        spent (float):   total expenses
+        vendors (list):  top vendors by amount spent
+        largest (list):  largest expense items with their dates
+    """
+
+    start: date
+    end: date
+    earned: float = 0.0
+    spent: float = 0.0
+    vendors: list[tuple[str, float]] = field(default_factory=list)
+    largest: list[tuple[date, ExpenseItem]] = field(default_factory=list)
+
+    @property
+    def net(self) -> float:
+        """Income minus expenses."""
+        return self.earned - self.spent
+
+    @property
+    def days(self) -> int:
+        """Number of days in the period."""
+        return (self.end - self.start).days + 1
+
+    @property
+    def daily_average(self) -> float:
+        """Average expenses per day."""
+        return self.spent / self.days
@@ -0,0 +1,214 @@
+"""Long-polling runner, which processes updates of different chats
+concurrently."""
+
+import asyncio
+import logging
+import signal
+from collections import deque
+from contextlib import suppress
+from typing import Hashable, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from aiogram.methods import TelegramMethod
+from aiogram.types import Update
+
+from .bot import chat_key, flush_buffers, get_bot, get_dispatcher
+from .metrics import metrics
+
+logger = logging.getLogger()
+
+DEFAULT_ALLOWED_UPDATES = ("message", "callback_query")
+
+
+def update_key(update: Update) -> Hashable:
+    """Identify the chat which an update belongs to, or the update
+    itself, if it belongs to none."""
+    key = chat_key(update.model_dump(by_alias=True, exclude_none=True))
+    return ("update", update.update_id) if key is None else key
+
+
+class PollingRunner:  # pylint: disable=R0902
+    """Fetches updates with long polling, and processes updates of
+    different chats concurrently, up to `concurrency` at a time, while
+    updates of the same chat are processed one by one, in order.
+
+    Polling pauses while `max_pending` fetched updates are waiting to be
+    processed. Once stopped, e.g. by SIGTERM or SIGINT, the runner stops
+    polling, processes the updates it has already fetched, persists
+    buffered writes and confirms the updates to Telegram before
+    returning."""
+
+    def __init__(  # pylint: disable=R0913
+        self,
+        *,
+        concurrency: int = 8,
+        max_pending: int = 100,
+        poll_timeout: int = 30,
+        allowed_updates: Optional[list[str]] = None,
+        skip_updates: bool = False,
+        max_backoff: float = 30.0,
+    ):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._max_pending = max_pending
+        self._poll_timeout = poll_timeout
+        self._allowed_updates = allowed_updates or list(
+            DEFAULT_ALLOWED_UPDATES
+        )
+        self._skip_updates = skip_updates
+        self._max_backoff = max_backoff
+
+        self._offset: Optional[int] = None
+        # updates waiting to be processed, by chat
+        self._chats: dict[Hashable, deque[Update]] = {}
+        self._workers: set[asyncio.Task] = set()
+        self._pending = 0
+        self._room = asyncio.Event()
+        self._stopping = asyncio.Event()
+
+    @property
+    def pending(self) -> int:
+        """Number of fetched updates which are not processed yet."""
+        return self._pending
+
+    def stop(self):
+        """Stop polling, and let the fetched updates finish."""
+        self._stopping.set()
+        self._room.set()
+
+    async def run(self):
+        """Poll and process updates until stopped."""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stop)
+
+        bot = get_bot()
+        try:
+            await bot.delete_webhook(drop_pending_updates=self._skip_updates)
+            logger.info("Polling for updates...")
+            await self._poll_until_stopped(bot)
+        finally:
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                loop.remove_signal_handler(sig)
+            await self.drain()
+            await self._confirm_offset(bot)
+
+    async def _confirm_offset(self, bot: Bot):
+        """Let Telegram know that the fetched updates are processed,
+        so that they are not delivered again after a restart."""
+        if self._offset is None:
+            return
+        try:
+            await bot.get_updates(offset=self._offset, limit=1, timeout=0)
+        except Exception:  # pylint: disable=W0718
+            logger.exception("Failed to confirm offset %s", self._offset)
+
+    async def drain(self):
+        """Wait for the fetched updates to be processed,
+        then persist buffered writes."""
+        if self._workers:
+            logger.info("Draining %s pending update(s)...", self._pending)
+            await asyncio.gather(*self._workers)
+        await flush_buffers()
+
+    async def _poll_until_stopped(self, bot: Bot):
+        failures = 0
+        while not self._stopping.is_set():
+            await self._wait_for_room()
+            if self._stopping.is_set():
+                break
+
+            poll = asyncio.ensure_future(self._poll(bot))
+            stopping = asyncio.ensure_future(self._stopping.wait())
+            await asyncio.wait(
+                {poll, stopping}, return_when=asyncio.FIRST_COMPLETED
+            )
+            stopping.cancel()
+            if not poll.done():
+                # the offset is not confirmed, so Telegram resends them
+                poll.cancel()
+                with suppress(asyncio.CancelledError):
+                    await poll
+                break
+
+            try:
+                updates = poll.result()
+            except TelegramRetryAfter as exc:
+                delay = float(exc.retry_after)
+            except (TelegramNetworkError, TelegramServerError) as exc:
+                delay = min(self._max_backoff, 2.0**failures)
+                failures += 1
+                logger.warning(
+                    "Polling failed: %s, retrying in %.0fs...", exc, delay
+                )
+            else:
+                failures = 0
+                for update in updates:
+                    self._enqueue(update)
+                continue
+
+            metrics.increment("PollingRetries")
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._stopping.wait(), delay)
+
+    async def _poll(self, bot: Bot) -> list[Update]:
+        updates = await bot.get_updates(
+            offset=self._offset,
+            timeout=self._poll_timeout,
+            allowed_updates=self._allowed_updates,
+            request_timeout=self._poll_timeout + 10,
+        )
+        if updates:
+            self._offset = updates[-1].update_id + 1
+        return updates
+
+    async def _wait_for_room(self):
+        while self._pending >= self._max_pending:
+            if self._stopping.is_set():
+                return
+            metrics.increment("PollingPaused")
+            self._room.clear()
+            await self._room.wait()
+
+    def _enqueue(self, update: Update):
+        self._pending += 1
+        key = update_key(update)
+        queue = self._chats.get(key)
+        if queue is not None:
+            queue.append(update)
+            return
+
+        self._chats[key] = deque([update])
+        task = asyncio.create_task(self._process_chat(key))
+        self._workers.add(task)
+        task.add_done_callback(self._workers.discard)
+
+    async def _process_chat(self, key: Hashable):
+        queue = self._chats[key]
+        try:
+            while queue:
+                async with self._semaphore:
+                    await self._process(queue[0])
+                queue.popleft()
+                self._pending -= 1
+                self._room.set()
+        finally:
+            del self._chats[key]
+
+    async def _process(self, update: Update):
+        dp, bot = get_dispatcher(), get_bot()
+        try:
+            result = await dp.feed_update(bot, update)
+            if isinstance(result, TelegramMethod):
+                await dp.silent_call_request(bot, result)
+        except Exception:  # pylint: disable=W0718
+            logger.exception("Failed to process update %s", update.update_id)
+
+
+__all__ = [
+    "PollingRunner",
+]
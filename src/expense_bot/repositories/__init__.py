@@ -1,33 +1,304 @@
 """Storage implementations."""
 
+from array import array
+from bisect import bisect_left, bisect_right, insort
 from collections import defaultdict
 from datetime import date
-from typing import Iterable
+from heapq import nlargest
+from importlib import import_module
+from itertools import compress
+from operator import itemgetter
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Hashable,
+    Iterable,
+    Iterator,
+    Optional,
+)
 
-from ..model import ExpenseItem
-from ..repository import Repository
-from ..utils import setup_logging
-from .google import GoogleSheets
+from ..model import EARN, Category, ExpenseItem, Summary
+from ..repository import GroupBy, Repository
 
-setup_logging()
+if TYPE_CHECKING:
+    from .google import GoogleSheets, GoogleSheetsLedger
+    from .replicated import Replicated
+    from .sqlite import SQLite
 
-_StorageType = dict[date, list[ExpenseItem]]
+# implementations with heavy dependencies are imported on first use
+_LAZY_REPOSITORIES = {
+    "GoogleSheets": ".google",
+    "GoogleSheetsLedger": ".google",
+    "Replicated": ".replicated",
+    "SQLite": ".sqlite",
+}
+
+_CATEGORIES = {cat.value: cat for cat in Category}
+_GROUP_COLUMNS = {"cat": "cats", "vnd": "vendors", "day": "days"}
+# translation tables, which turn category codes into flags of a category
+_CATEGORY_FLAGS = {
+    cat: bytes(code == cat.value for code in range(256)) for cat in Category
+}
+_NEGATE = bytes([1]) + bytes(255)
+
+
+def _add_daily(
+    sums: dict[int, int],
+    days: array,
+    rows: slice,
+    cents: array,
+    flags: Optional[bytes] = None,
+):
+    """Add up amounts of a slice of records ordered by date,
+    summing up the slice of every day at once."""
+    i = rows.start
+    while i < rows.stop:
+        j = bisect_right(days, days[i], i, rows.stop)
+        day = slice(i - rows.start, j - rows.start)
+        if flags is None:
+            sums[days[i]] += sum(cents[day])
+        elif any(flags[day]):
+            sums[days[i]] += sum(compress(cents[day], flags[day]))
+        i = j
+
+
+class _Columns:
+    """Expense records of a single month, ordered by date."""
+
+    __slots__ = ("days", "cents", "vendors", "cats")
+
+    def __init__(self):
+        self.days = array("l")
+        self.cents = array("q")
+        self.vendors = array("L")
+        self.cats = array("B")
+
+    def insert(self, day: int, cents: int, vendor: int, cat: int):
+        """Insert a record after all records of the same day."""
+        i = bisect_right(self.days, day)
+        self.days.insert(i, day)
+        self.cents.insert(i, cents)
+        self.vendors.insert(i, vendor)
+        self.cats.insert(i, cat)
+
+    def bounds(self, first: int, last: int) -> tuple[int, int]:
+        """Find the slice of records between two date ordinals."""
+        return bisect_left(self.days, first), bisect_right(self.days, last)
+
+    def flags(self, rows: slice, cat: Category) -> bytes:
+        """Flag the records of a category within a slice, a byte each."""
+        return self.cats[rows].tobytes().translate(_CATEGORY_FLAGS[cat])
+
+    def remove(self, day: int):
+        """Remove all records of the day."""
+        i, j = self.bounds(day, day)
+        for column in (self.days, self.cents, self.vendors, self.cats):
+            del column[i:j]
 
 
 class InMemory(Repository):
-    """In-memory repository."""
+    """In-memory repository.
+
+    Records are kept in per-month columns of date ordinals,
+    amounts in integer cents, interned vendor ids and category codes.
+    Aggregates are computed over the columns directly, and readers
+    get :class:`ExpenseItem` views built on demand."""
+
+    durable = False
+    supports_replace = True
 
     def __init__(self):
-        self._storage: _StorageType = defaultdict(list)
+        self._months: dict[int, _Columns] = {}
+        self._keys: list[int] = []
+        self._vendors: list[str] = []
+        self._vendor_ids: dict[str, int] = {}
+
+    @staticmethod
+    def _month_key(dt: date) -> int:
+        return dt.year * 12 + dt.month - 1
+
+    def _vendor_id(self, vnd: str) -> int:
+        vendor_id = self._vendor_ids.get(vnd)
+        if vendor_id is None:
+            vendor_id = self._vendor_ids[vnd] = len(self._vendors)
+            self._vendors.append(vnd)
+        return vendor_id
+
+    def _item(self, cols: _Columns, i: int) -> ExpenseItem:
+        return ExpenseItem(
+            cols.cents[i] / 100,
+            self._vendors[cols.vendors[i]],
+            _CATEGORIES[cols.cats[i]],
+        )
+
+    def _decoder(self, by: GroupBy) -> Callable[[int], Hashable]:
+        decoders: dict[str, Callable[[int], Hashable]] = {
+            "cat": _CATEGORIES.__getitem__,
+            "vnd": self._vendors.__getitem__,
+            "day": date.fromordinal,
+        }
+        return decoders[by]
+
+    def _scan(
+        self, start: date, end: date
+    ) -> Iterator[tuple[_Columns, slice]]:
+        lo = bisect_left(self._keys, self._month_key(start))
+        hi = bisect_right(self._keys, self._month_key(end))
+        first, last = start.toordinal(), end.toordinal()
+        for key in self._keys[lo:hi]:
+            cols = self._months[key]
+            i, j = cols.bounds(first, last)
+            if i < j:
+                yield cols, slice(i, j)
 
     def get_all(self, *, dt: date) -> Iterable[ExpenseItem]:
-        return self._storage.get(dt) or []
+        return [
+            self._item(cols, i)
+            for cols, rows in self._scan(dt, dt)
+            for i in range(rows.start, rows.stop)
+        ]
+
+    def get_range(
+        self, start: date, end: date
+    ) -> Iterator[tuple[date, ExpenseItem]]:
+        for cols, rows in self._scan(start, end):
+            for i in range(rows.start, rows.stop):
+                yield date.fromordinal(cols.days[i]), self._item(cols, i)
 
     def add(self, item: ExpenseItem, /, *, dt: date):
-        self._storage[dt].append(item)
+        key = self._month_key(dt)
+        cols = self._months.get(key)
+        if cols is None:
+            cols = self._months[key] = _Columns()
+            insort(self._keys, key)
+        cols.insert(
+            dt.toordinal(),
+            round(item.amt * 100),
+            self._vendor_id(item.vnd),
+            item.cat.value,
+        )
+
+    # pylint: disable-next=R0914
+    def totals(
+        self,
+        start: date,
+        end: date,
+        *,
+        by: GroupBy = "cat",
+        cat: Optional[Category] = None,
+    ) -> dict[Hashable, float]:
+        sums: dict[int, int] = defaultdict(int)
+        for cols, rows in self._scan(start, end):
+            cents = cols.cents[rows]
+            flags = None if cat is None else cols.flags(rows, cat)
+            if by == "cat":
+                for each in Category if cat is None else [cat]:
+                    selected = cols.flags(rows, each)
+                    if any(selected):
+                        sums[each.value] += sum(compress(cents, selected))
+            elif by == "day":
+                _add_daily(sums, cols.days, rows, cents, flags)
+            else:
+                # vendors are too many to be summed up one by one
+                keys: Iterable[int] = getattr(cols, _GROUP_COLUMNS[by])[rows]
+                amounts: Iterable[int] = cents
+                if flags is not None:
+                    keys = compress(keys, flags)
+                    amounts = compress(cents, flags)
+                for key, amt in zip(keys, amounts, strict=True):
+                    sums[key] += amt
+
+        decode = self._decoder(by)
+        return {decode(key): amt / 100 for key, amt in sums.items()}
+
+    # pylint: disable-next=R0914
+    def summarize(self, start: date, end: date, *, top: int = 5) -> Summary:
+        earned = spent = 0
+        vendors: dict[int, int] = defaultdict(int)
+        largest: list[tuple[int, _Columns, int]] = []
+
+        for cols, rows in self._scan(start, end):
+            cents = cols.cents[rows]
+            earnings = cols.flags(rows, EARN)
+            spend = earnings.translate(_NEGATE)
+            month_earned = sum(compress(cents, earnings))
+            earned += month_earned
+            spent += sum(cents) - month_earned
+
+            spend_vendors = compress(cols.vendors[rows], spend)
+            for vendor, amt in zip(
+                spend_vendors, compress(cents, spend), strict=True
+            ):
+                vendors[vendor] += amt
+
+            # like a stable sort, so that earlier items win ties
+            indices = compress(range(rows.start, rows.stop), spend)
+            largest.extend(
+                (cols.cents[i], cols, i)
+                for i in nlargest(top, indices, key=cols.cents.__getitem__)
+            )
+
+        top_vendors = nlargest(top, vendors.items(), key=itemgetter(1))
+        return Summary(
+            start,
+            end,
+            earned / 100,
+            spent / 100,
+            vendors=[(self._vendors[v], amt / 100) for v, amt in top_vendors],
+            largest=[
+                (date.fromordinal(cols.days[i]), self._item(cols, i))
+                for _, cols, i in nlargest(top, largest, key=itemgetter(0))
+            ],
+        )
+
+    def replace_day(self, dt: date, items: Iterable[ExpenseItem]):
+        cols = self._months.get(self._month_key(dt))
+        if cols is not None:
+            cols.remove(dt.toordinal())
+        for item in items:
+            self.add(item, dt=dt)
+
+    async def get_all_async(self, *, dt: date) -> Iterable[ExpenseItem]:
+        return self.get_all(dt=dt)
+
+    async def get_range_async(
+        self, start: date, end: date
+    ) -> list[tuple[date, ExpenseItem]]:
+        return list(self.get_range(start, end))
+
+    async def add_async(self, item: ExpenseItem, /, *, dt: date):
+        self.add(item, dt=dt)
+
+    async def summarize_async(
+        self, start: date, end: date, *, top: int = 5
+    ) -> Summary:
+        return self.summarize(start, end, top=top)
+
+    async def flush_async(self):
+        pass
+
+    async def close_async(self):
+        self.close()
+
+    async def provision_async(self, dt: date) -> bool:
+        return self.provision(dt)
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        module = import_module(_LAZY_REPOSITORIES[name], __name__)
+    except KeyError:
+        raise AttributeError(
+            f"module {__name__!r} has no attribute {name!r}"
+        ) from None
+    return getattr(module, name)
 
 
 __all__ = [
     "GoogleSheets",
+    "GoogleSheetsLedger",
     "InMemory",
+    "Replicated",
+    "SQLite",
 ]
@@ -1,20 +1,73 @@
 """Google Sheets-backed storage."""
 
+# pylint: disable=C0302
+
+import asyncio
+import contextvars
 import logging
-from datetime import date
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
 from enum import Enum, auto
-from functools import cache
-from typing import Iterable
+from functools import partial
+from operator import itemgetter
+from typing import (
+    Any,
+    Callable,
+    Hashable,
+    Iterable,
+    Iterator,
+    Optional,
+    TypeVar,
+)
 
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 
+from ..metrics import metrics
 from ..model import EARN, SPEND, Category, ExpenseItem
 from ..repository import Repository
+from ..scheduler import Priority, RequestScheduler
 from ..secrets import secrets
+from ..utils import CacheInfo, LRUCache
 
 logger = logging.getLogger()
 
+_T = TypeVar("_T")
+
+_Month = dict[int, list[ExpenseItem]]
+
+_A1_CELL = re.compile(r"([A-Z]+)(\d+)")
+
+# credentials are not loaded yet
+_UNSET = object()
+
+LEDGER_FIELDS = ["Date", "Amount", "Vendor", "Category", "Batch"]
+
+# day zero of date serial numbers in Google Sheets
+_SERIAL_EPOCH = date(1899, 12, 30)
+# date serial numbers are shown in the spreadsheet locale
+_DATE_FORMAT = {"type": "DATE"}
+
+
+def _grid_cell(ref: str) -> tuple[int, int]:
+    """Convert a cell in A1 notation (e.g. 'D2')
+    into zero-based row and column indices."""
+    match = _A1_CELL.fullmatch(ref)
+    if match is None:
+        raise ValueError(f"Invalid cell reference '{ref}'")
+
+    letters, digits = match.groups()
+    col = 0
+    for letter in letters:
+        col = col * 26 + ord(letter) - ord("A") + 1
+    return int(digits) - 1, col - 1
+
 
 class Scope(str, Enum):
     """Authorization scopes for Google Sheets API."""
@@ -44,28 +97,93 @@ class Render(Enum):
         return self.name
 
 
-class GoogleSheets(Repository):
+class GoogleSheets(Repository):  # pylint: disable=R0902
     """Google Sheets-backed repository."""
 
-    def __init__(
+    # every row of a month sheet has 4 cells for amounts
+    max_items: Optional[int] = 4
+    supports_replace = True
+
+    def __init__(  # pylint: disable=R0913
         self,
         spreadsheet_id: str = "1Jn-zYIl3pmJBmj8ki2YY9QovfNMCzLXaqxmy7N9ZEoY",
         template_sheet: str = "TEMPLATE",
         formula_cell_range: str = "Notes!D2:D2",
+        *,
+        metadata_ttl: float = 600.0,
+        max_workers: int = 4,
+        flush_size: int = 20,
+        flush_interval: float = 5.0,
+        month_cache_size: int = 12,
+        month_cache_ttl: float = 300.0,
+        quota_per_minute: Optional[int] = 60,
+        max_retries: int = 4,
+        retry_delay: float = 0.5,
     ):
+        self._sheet_id = spreadsheet_id
+        self._template_sheet = template_sheet
+        self._formula_cell = formula_cell_range
+
+        self._metadata_ttl = metadata_ttl
+        self._sheet_ids: dict[str, int] = {}
+        self._sheet_ids_expiry = 0.0
+
+        # httplib2 transport is not thread-safe, so every worker
+        # thread gets its own set of sheet services
+        self._local = threading.local()
+        self._generation = 0
+        self._creds: Any = None
+        self._creds_info: Any = _UNSET
+        self._lock = threading.Lock()
+        self._metadata_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="gsheets"
+        )
+
+        # write-behind buffer of full row contents, keyed by (page, row)
+        self._pending: dict[tuple[str, int], list[ExpenseItem]] = {}
+        self._pending_since = 0.0
+        self._flush_size = flush_size
+        self._flush_interval = flush_interval
+        self._flush_task: asyncio.Task | None = None
+
+        # throttles, retries and coalesces requests of all worker threads
+        self._scheduler = RequestScheduler(
+            quota_per_minute,
+            is_transient=self._is_transient,
+            max_retries=max_retries,
+            base_delay=retry_delay,
+            name="GoogleSheets",
+        )
+
+        # decoded month sheets, kept in sync with rows written by `add`
+        self._months: LRUCache[str, _Month] = LRUCache(
+            month_cache_size, ttl=month_cache_ttl, name="SheetsMonths"
+        )
+
+    @property
+    def creds(self) -> Credentials:
+        """Service account credentials, reloaded (along with the sheet
+        services) once the secret they are loaded from is refreshed."""
+        info = self._credentials_info()
+        if info is not self._creds_info:
+            self._creds = self._load_credentials(info)
+            self._creds_info = info
+            self._generation += 1
+        return self._creds
+
+    @staticmethod
+    def _credentials_info() -> Any:
         try:
-            creds_dict = secrets["g-service-acct"]
+            return secrets["g-service-acct"]
         except Exception as exc:
             raise ValueError("Credentials were not provided") from exc
 
-        self.creds = Credentials.from_service_account_info(creds_dict)
-
-        self._sheet_id = spreadsheet_id
-        self._template_sheet = template_sheet
-        self._formula_cell = formula_cell_range
+    @staticmethod
+    def _load_credentials(info: Any) -> Credentials:
+        return Credentials.from_service_account_info(info)
 
     @staticmethod
-    @cache
     def _sheet_service_with_scope(creds: Credentials, scope: Scope):
         logger.info(
             "Configuring sheet service with scope '%s'...", scope.name
@@ -75,13 +193,85 @@ class GoogleSheets(Repository):
         )
         return service.spreadsheets()  # pylint: disable=E1101
 
+    def _service(self, scope: Scope):
+        creds = self.creds
+        if getattr(self._local, "generation", None) != self._generation:
+            self._local.generation = self._generation
+            self._local.services = {}
+
+        services = self._local.services
+        if scope not in services:
+            services[scope] = self._sheet_service_with_scope(creds, scope)
+        return services[scope]
+
+    def reset_connections(self):
+        # services of every worker thread are rebuilt on next use
+        self._generation += 1
+
+    def close(self):
+        self.flush()
+        self._executor.shutdown()
+
+    async def close_async(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        await super().close_async()
+
     @property
     def _sheet(self):
-        return self._sheet_service_with_scope(self.creds, Scope.READ)
+        return self._service(Scope.READ)
 
     @property
     def _mutable_sheet(self):
-        return self._sheet_service_with_scope(self.creds, Scope.WRITE)
+        return self._service(Scope.WRITE)
+
+    @staticmethod
+    def _is_transient(exc: Exception) -> bool:
+        """Whether a failed request should be retried."""
+        if not isinstance(exc, HttpError):
+            return False
+        return exc.status_code == 429 or exc.status_code >= 500
+
+    def _execute(
+        self,
+        request: Any,
+        *,
+        priority: Priority = Priority.INTERACTIVE,
+        key: Optional[Hashable] = None,
+        applied: Optional[Callable[[], bool]] = None,
+    ) -> Any:
+        """Execute an API request through the scheduler,
+        recording latency and outcome of every attempt.
+
+        Requests which are not idempotent provide `applied` to check
+        whether a failed attempt took effect anyway, before retrying."""
+        method = request.methodId.rpartition("spreadsheets.")[2]
+        attempted = False
+
+        def attempt() -> Any:
+            nonlocal attempted
+            if attempted and applied is not None and applied():
+                logger.info("Failed %s call was applied", method)
+                return None
+            attempted = True
+
+            metrics.increment("SheetsCalls", Method=method)
+            try:
+                with metrics.timer("SheetsCallLatency", Method=method):
+                    return request.execute()
+            except HttpError as exc:
+                metrics.increment(
+                    "SheetsCallErrors", Method=method, Status=exc.status_code
+                )
+                raise
+
+        return self._scheduler.execute(attempt, priority=priority, key=key)
+
+    async def _run_in_executor(self, func: Callable[[], _T]) -> _T:
+        loop = asyncio.get_running_loop()
+        # keep context variables, e.g. metric dimensions, in the worker
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, context.run, func)
 
     @staticmethod
     def _to_internal(items: list[ExpenseItem]) -> list[str]:
@@ -106,74 +296,274 @@ class GoogleSheets(Repository):
             for amt, vnd in zip(amts, descr, strict=True)
         ]
 
-    def _get_cells(
-        self, page: str, row: int, *, render: Render
-    ) -> list[ExpenseItem]:
-        result = (
-            self._sheet.values()
-            .get(
-                spreadsheetId=self._sheet_id,
-                range=f"{page}!D{row}:H{row}",
-                valueRenderOption=str(render),
+    @classmethod
+    def _decode_month(cls, values: list[list[str]]) -> _Month:
+        month = {}
+        for row, vals in enumerate(values, start=3):
+            if row == 4:
+                continue  # header row
+
+            vals = vals + ["" for _ in range(len(vals), 5)]
+            month[row] = cls._from_internal(vals, EARN if row == 3 else SPEND)
+        return month
+
+    def _get_months(self, pages: list[str]) -> dict[str, _Month]:
+        months = {page: self._months.get(page) for page in pages}
+        missing = [page for page, month in months.items() if month is None]
+        if missing:
+            # concurrent readers of the same months share the request
+            result = self._execute(
+                self._sheet.values().batchGet(
+                    spreadsheetId=self._sheet_id,
+                    ranges=[f"{page}!D3:H35" for page in missing],
+                    valueRenderOption=str(Render.UNFORMATTED_VALUE),
+                ),
+                key=("batchGet", *missing),
             )
-            .execute()
-        )
 
-        vals = result.get("values") or [["" for _ in range(5)]]
-        return self._from_internal(vals[0], EARN if row == 3 else SPEND)
+            value_ranges = result.get("valueRanges") or []
+            for page, value_range in zip(missing, value_ranges, strict=True):
+                month = self._decode_month(value_range.get("values") or [])
+                self._months[page] = months[page] = month
+
+        # empty months are shared with the cache too, so that writes
+        # into them are seen by later reads
+        return {
+            page: {} if month is None else month
+            for page, month in months.items()
+        }
+
+    def _get_month(self, page: str) -> _Month:
+        return self._get_months([page])[page]
+
+    def month_cache_info(self) -> CacheInfo:
+        """Report hits and misses of the month sheet cache."""
+        return self._months.cache_info()
 
     def get_all(self, *, dt: date) -> Iterable[ExpenseItem]:
         page = dt.strftime("%m/%y")
         row = dt.day + 4
 
         assert self._sheet_exists(page), f"Sheet '{page}' does not exist!"
-        return self._get_cells(page, row, render=Render.UNFORMATTED_VALUE)
+
+        items = self._pending.get((page, row))
+        if items is None:
+            items = self._get_month(page).get(row, [])
+        return list(items)
+
+    async def get_all_async(self, *, dt: date) -> Iterable[ExpenseItem]:
+        return await self._run_in_executor(partial(self.get_all, dt=dt))
+
+    @staticmethod
+    def _gen_pages(start: date, end: date) -> Iterator[tuple[str, date]]:
+        dt = start.replace(day=1)
+        while dt <= end:
+            yield dt.strftime("%m/%y"), dt
+            dt = (dt + timedelta(days=31)).replace(day=1)
+
+    @staticmethod
+    def _gen_rows(first: date) -> Iterator[tuple[int, date]]:
+        yield 3, first
+        dt = first
+        while dt.month == first.month:
+            yield dt.day + 4, dt
+            dt += timedelta(days=1)
+
+    def get_range(
+        self, start: date, end: date
+    ) -> Iterator[tuple[date, ExpenseItem]]:
+        """Get expenses recorded between two dates (inclusive).
+
+        Earnings are recorded per month, so they are reported
+        on the first day of the month if it is within the range."""
+        firsts = dict(self._gen_pages(start, end))
+        pages = [page for page in firsts if self._sheet_exists(page)]
+
+        for page, month in self._get_months(pages).items():
+            for row, dt in self._gen_rows(firsts[page]):
+                if not start <= dt <= end:
+                    continue
+
+                items = self._pending.get((page, row))
+                if items is None:
+                    items = month.get(row, [])
+                for item in items:
+                    yield dt, item
+
+    async def get_range_async(
+        self, start: date, end: date
+    ) -> list[tuple[date, ExpenseItem]]:
+        return await self._run_in_executor(
+            lambda: list(self.get_range(start, end))
+        )
 
     @staticmethod
-    def _gen_dates(dt: date):
+    def _gen_dates(dt: date) -> Iterator[date]:
         for day in range(1, 32):
             try:
-                yield dt.replace(day=day).strftime("%m/%d/%Y")
+                yield dt.replace(day=day)
             except ValueError:
                 break
 
+    async def add_async(self, item: ExpenseItem, /, *, dt: date):
+        await self._run_in_executor(partial(self.add, item, dt=dt))
+
+        if self._pending_count() and not self._flush_task:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self._flush_interval)
+            await self.flush_async()
+        except Exception:  # pylint: disable=W0718
+            logger.exception("Failed to flush pending writes")
+        finally:
+            self._flush_task = None
+
     def add(self, item: ExpenseItem, /, *, dt: date):
         assert dt >= date(2019, 1, 1), "Date is too far in the past!"
 
+        # rows are updated with read-modify-write,
+        # so concurrent writers must take turns
+        with self._lock:
+            self._add(item, dt=dt)
+
+    def _add(self, item: ExpenseItem, /, *, dt: date):
         page = dt.strftime("%m/%y")
         row = dt.day + 4 if item.cat is SPEND else 3
 
         if not self._sheet_exists(page):
-            self._create_new_sheet(page, row_names=self._gen_dates(dt))
+            self._create_new_sheet(page, dt.replace(day=1))
+
+        month = self._get_month(page)
+        items = self._pending.get((page, row))
+        if items is None:
+            items = month.get(row, [])
 
-        items = list(
-            self._get_cells(page, row, render=Render.UNFORMATTED_VALUE)
-        )
         if item.cat is SPEND:
             msg = f"No room to add more purchases for {dt}!"
         else:
             msg = f"No room to add more earnings for {dt:%m/%Y}!"
         assert len(items) < 4, msg
 
-        items.append(item)
-        (
-            self._mutable_sheet.values()
-            .update(
+        if not self._pending:
+            self._pending_since = time.monotonic()
+        self._pending[page, row] = month[row] = [*items, item]
+        self._flush_if_due()
+
+    def replace_day(self, dt: date, items: Iterable[ExpenseItem]):
+        items = list(items)
+        page = dt.strftime("%m/%y")
+        rows = {dt.day + 4: [item for item in items if item.cat is SPEND]}
+        if dt.day == 1:
+            rows[3] = [item for item in items if item.cat is EARN]
+
+        placed = sum(map(len, rows.values()))
+        assert placed == len(items), "Earnings are recorded per month!"
+        assert all(len(v) <= 4 for v in rows.values()), f"No room for {dt}!"
+
+        with self._lock:
+            if not self._sheet_exists(page):
+                if not items:
+                    return
+                self._create_new_sheet(page, dt.replace(day=1))
+
+            month = self._get_month(page)
+            if not self._pending:
+                self._pending_since = time.monotonic()
+            for row, row_items in rows.items():
+                self._pending[page, row] = month[row] = row_items
+            self._flush_if_due()
+
+    def refresh(self):
+        self._months.clear()
+        self._invalidate_sheet_ids()
+
+    def _pending_count(self) -> int:
+        return len(self._pending)
+
+    def _flush_if_due(self):
+        is_full = self._pending_count() >= self._flush_size
+        age = time.monotonic() - self._pending_since
+        if is_full or age >= self._flush_interval:
+            self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    async def flush_async(self):
+        await self._run_in_executor(self.flush)
+
+    def _flush(self):
+        if not self._pending:
+            return
+
+        logger.info("Flushing %s pending row(s)...", len(self._pending))
+        data = [
+            {
+                "range": f"{page}!D{row}:H{row}",
+                # rows without items are cleared
+                "values": [self._to_internal(items) if items else [""] * 5],
+            }
+            for (page, row), items in self._pending.items()
+        ]
+        self._execute(
+            self._mutable_sheet.values().batchUpdate(
                 spreadsheetId=self._sheet_id,
-                range=f"{page}!D{row}:H{row}",
-                body={"values": [self._to_internal(items)]},
-                valueInputOption=str(Input.USER_ENTERED),
+                body={
+                    "valueInputOption": str(Input.USER_ENTERED),
+                    "data": data,
+                },
+            ),
+            priority=Priority.BACKGROUND,
+        )
+        self._pending.clear()
+
+    def _fetch_sheet_ids(self) -> dict[str, int]:
+        logger.info("Fetching spreadsheet metadata...")
+        result = self._execute(
+            self._sheet.get(
+                spreadsheetId=self._sheet_id,
+                fields="sheets.properties(sheetId,title)",
             )
-            .execute()
         )
 
+        self._sheet_ids = {
+            item["properties"]["title"]: item["properties"]["sheetId"]
+            for item in result.get("sheets", [])
+        }
+        self._sheet_ids_expiry = time.monotonic() + self._metadata_ttl
+        return self._sheet_ids
+
+    def _invalidate_sheet_ids(self):
+        self._sheet_ids_expiry = 0.0
+
     def _get_sheet_id_by_title(self, title: str) -> int:
-        items = self._sheet.get(spreadsheetId=self._sheet_id).execute()
-        for item in items["sheets"]:
-            if item["properties"]["title"] == title:
-                return item["properties"]["sheetId"]
+        """Look up the sheet id in the metadata cache, which is
+        refreshed once it expires. Missing titles are cached as well,
+        so sheets added outside of this instance are only seen after
+        that, or once a sheet is about to be created."""
+        with self._metadata_lock:
+            sheet_ids = self._sheet_ids
+            expired = time.monotonic() >= self._sheet_ids_expiry
+            metrics.increment(
+                "CacheMisses" if expired else "CacheHits",
+                Cache="SheetsMetadata",
+            )
+            if expired:
+                sheet_ids = self._fetch_sheet_ids()
+
+        try:
+            return sheet_ids[title]
+        except KeyError:
+            raise ValueError(
+                f"Sheet with title '{title}' not found!"
+            ) from None
 
-        raise ValueError(f"Sheet with title '{title}' not found!")
+    def _sheet_added(self, title: str) -> bool:
+        with self._metadata_lock:
+            return title in self._fetch_sheet_ids()
 
     def _sheet_exists(self, page: str) -> bool:
         try:
@@ -182,93 +572,475 @@ class GoogleSheets(Repository):
         except ValueError:
             return False
 
-    def _create_new_sheet(self, page: str, row_names: Iterable[str]):
-        assert not self._sheet_exists(page), f"Sheet '{page}' already exists!"
+    @staticmethod
+    def _update_cells(
+        sheet_id: int,
+        cells: str,
+        rows: Optional[list[list[dict]]] = None,
+        number_format: Optional[dict] = None,
+    ) -> dict:
+        """Build a request to overwrite a range of cells (e.g. 'B5:B35')
+        with rows of values, clearing the cells that are not given,
+        and set their number format, if given."""
+        first, _, last = cells.partition(":")
+        row0, col0 = _grid_cell(first)
+        row1, col1 = _grid_cell(last or first)
+        cell: dict[str, Any] = {}
+        fields = "userEnteredValue"
+        if number_format is not None:
+            cell["userEnteredFormat"] = {"numberFormat": number_format}
+            fields += ",userEnteredFormat.numberFormat"
+        return {
+            "updateCells": {
+                "fields": fields,
+                "range": {
+                    "sheetId": sheet_id,
+                    "startRowIndex": row0,
+                    "endRowIndex": row1 + 1,
+                    "startColumnIndex": col0,
+                    "endColumnIndex": col1 + 1,
+                },
+                "rows": [
+                    {
+                        "values": [
+                            {**cell, "userEnteredValue": v} for v in values
+                        ]
+                    }
+                    for values in rows or []
+                ],
+            }
+        }
+
+    def _unused_sheet_id(self, preferred: Optional[int] = None) -> int:
+        with self._metadata_lock:
+            sheet_ids = set(self._sheet_ids.values())
+        if preferred is not None and preferred not in sheet_ids:
+            return preferred
+        return max(sheet_ids, default=0) + 1
+
+    def _create_new_sheet(self, page: str, first: date) -> bool:
+        """Create the sheet, unless it has been added outside of
+        this instance, and return whether it was created."""
+        self._invalidate_sheet_ids()
+        if self._sheet_exists(page):
+            return False
+
+        try:
+            self._do_create_new_sheet(page, first)
+        except Exception:
+            self._invalidate_sheet_ids()
+            raise
+        return True
+
+    def _do_create_new_sheet(self, page: str, first: date):
+        assert page not in self._sheet_ids, f"Sheet '{page}' already exists!"
 
-        logger.info("Creating a new sheet from the template...")
         template_id = self._get_sheet_id_by_title(self._template_sheet)
+        formula_title, _, formula_cells = self._formula_cell.rpartition("!")
+        formula_sheet_id = self._get_sheet_id_by_title(
+            formula_title.strip("'")
+        )
 
-        copy_response = (
-            self._mutable_sheet.sheets()
-            .copyTo(
-                spreadsheetId=self._sheet_id,
-                sheetId=template_id,
-                body={"destination_spreadsheet_id": self._sheet_id},
+        # the id is picked upfront to refer to the sheet within the batch
+        new_sheet_id = self._unused_sheet_id(first.year * 100 + first.month)
+
+        logger.info("Fetching the formula for the total balance...")
+        formula = (
+            self._execute(
+                self._sheet.values().get(
+                    spreadsheetId=self._sheet_id,
+                    range=self._formula_cell,
+                    valueRenderOption=str(Render.FORMULA),
+                )
             )
-            .execute()
+        )["values"][0][0]
+
+        dates = [
+            [{"numberValue": (dt - _SERIAL_EPOCH).days}]
+            for dt in self._gen_dates(first)
+        ]
+        requests = [
+            {
+                "duplicateSheet": {
+                    "sourceSheetId": template_id,
+                    "insertSheetIndex": 1,
+                    "newSheetId": new_sheet_id,
+                    "newSheetName": page,
+                },
+            },
+            self._update_cells(new_sheet_id, "D3:H35"),
+            # dates past the end of the month are cleared along with
+            # their weekdays
+            self._update_cells(
+                new_sheet_id, "B5:B35", dates, number_format=_DATE_FORMAT
+            ),
+        ]
+        if len(dates) < 31:
+            requests.append(
+                self._update_cells(new_sheet_id, f"C{5 + len(dates)}:C35")
+            )
+        if page not in formula:
+            formula += f"-'{page}'!A1"
+            requests.append(
+                self._update_cells(
+                    formula_sheet_id,
+                    formula_cells,
+                    [[{"formulaValue": formula}]],
+                )
+            )
+
+        logger.info("Creating sheet '%s' from the template...", page)
+        # the batch is applied as a whole, or not at all
+        self._execute(
+            self._mutable_sheet.batchUpdate(
+                spreadsheetId=self._sheet_id, body={"requests": requests}
+            ),
+            applied=partial(self._sheet_added, page),
         )
 
-        auto_title = copy_response["title"]
-        new_sheet_id = copy_response["sheetId"]
+        with self._metadata_lock:
+            self._sheet_ids[page] = new_sheet_id
+        self._months[page] = {}
 
-        logger.info(
-            "Created new sheet (id=%s, title='%s'})", new_sheet_id, auto_title
+    def provision(self, dt: date) -> bool:
+        page = dt.strftime("%m/%y")
+        with self._lock:
+            if self._sheet_exists(page):
+                return False
+            return self._create_new_sheet(page, dt.replace(day=1))
+
+    async def provision_async(self, dt: date) -> bool:
+        return await self._run_in_executor(partial(self.provision, dt))
+
+
+class _Ledger:
+    """Rows of the ledger sheet, ordered by date."""
+
+    __slots__ = ("days", "items")
+
+    def __init__(self, records: Iterable[tuple[date, ExpenseItem]] = ()):
+        ordered = sorted(records, key=itemgetter(0))
+        self.days = [dt.toordinal() for dt, _ in ordered]
+        self.items = [item for _, item in ordered]
+
+    def insert(self, dt: date, item: ExpenseItem):
+        """Add an item after the other items of the same date."""
+        i = bisect_right(self.days, dt.toordinal())
+        self.days.insert(i, dt.toordinal())
+        self.items.insert(i, item)
+
+    def range(self, start: date, end: date) -> list[tuple[date, ExpenseItem]]:
+        """Get items recorded between two dates (inclusive)."""
+        lo = bisect_left(self.days, start.toordinal())
+        hi = bisect_right(self.days, end.toordinal())
+        return [
+            (date.fromordinal(day), item)
+            for day, item in zip(
+                self.days[lo:hi], self.items[lo:hi], strict=True
+            )
+        ]
+
+
+class GoogleSheetsLedger(GoogleSheets):
+    """Google Sheets-backed repository, which records every expense
+    as a row of a single ledger sheet (date, amount, vendor, category).
+
+    Buffered rows are written with a single `values().append` call,
+    and there is no limit on the number of expenses per day. Appended
+    rows are tagged with a batch id, which is looked up before a failed
+    append is retried, so that rows are never written twice. The ledger
+    is read whole and kept ordered by date in memory. Optionally,
+    a pivot table on a separate sheet sums up the ledger by month."""
+
+    max_items = None
+
+    def __init__(
+        self,
+        *args: Any,
+        ledger_sheet: str = "Ledger",
+        pivot_sheet: Optional[str] = "Monthly",
+        ledger_cache_ttl: float = 300.0,
+        **kwargs: Any,
+    ):
+        super().__init__(*args, **kwargs)
+        self._ledger_sheet = ledger_sheet
+        self._pivot_sheet = pivot_sheet
+
+        # write-behind buffer of new ledger rows, along with the id and
+        # size of the batch of them, which an append failed to write
+        self._rows: list[tuple[date, ExpenseItem]] = []
+        self._failed_batch: Optional[tuple[str, int]] = None
+        self._ledger: LRUCache[str, _Ledger] = LRUCache(
+            1, ttl=ledger_cache_ttl, name="SheetsLedger"
         )
 
-        logger.info(
-            "Renaming created sheet to '%s' and moving it to the front...",
-            page,
+    @staticmethod
+    def _to_row(dt: date, item: ExpenseItem) -> list[Any]:
+        return [dt.isoformat(), item.amt, item.vnd, item.cat.name]
+
+    @staticmethod
+    def _from_row(vals: list[Any]) -> tuple[date, ExpenseItem]:
+        value, amt, vnd, *rest = vals
+        if isinstance(value, (int, float)):
+            dt = _SERIAL_EPOCH + timedelta(days=int(value))
+        else:
+            dt = date.fromisoformat(value)
+        cat = Category[rest[0]] if rest and rest[0] else SPEND
+        return dt, ExpenseItem(float(amt), str(vnd), cat)
+
+    @classmethod
+    def _decode_ledger(
+        cls, values: list[list[Any]]
+    ) -> list[tuple[int, tuple[date, ExpenseItem]]]:
+        records = []
+        for row, vals in enumerate(values, start=2):
+            if not any(vals):
+                continue  # cleared by `replace_day`
+            try:
+                records.append((row, cls._from_row(vals)))
+            except (KeyError, TypeError, ValueError):
+                logger.warning("Skipping malformed ledger row %s", row)
+        return records
+
+    def _fetch_ledger(self) -> list[tuple[int, tuple[date, ExpenseItem]]]:
+        """Read records of the ledger along with their row numbers."""
+        logger.info("Reading the ledger...")
+        response = self._execute(
+            self._sheet.values().get(
+                spreadsheetId=self._sheet_id,
+                range=f"'{self._ledger_sheet}'!A2:D",
+                valueRenderOption=str(Render.UNFORMATTED_VALUE),
+                dateTimeRenderOption="SERIAL_NUMBER",
+            ),
+            key=("get", self._ledger_sheet),
         )
-        self._mutable_sheet.batchUpdate(
-            spreadsheetId=self._sheet_id,
-            body={
-                "requests": {
-                    "updateSheetProperties": {
-                        "fields": "index, title",
-                        "properties": {
-                            "sheetId": new_sheet_id,
-                            "index": 1,
-                            "title": page,
-                        },
-                    },
-                },
-            },
-        ).execute()
+        return self._decode_ledger(response.get("values", []))
 
-        logger.info("Clearing cells in range 'D3:H35'...")
-        self._mutable_sheet.values().clear(
-            spreadsheetId=self._sheet_id,
-            range=f"{page}!D3:H35",
-        ).execute()
+    def _get_ledger(self) -> _Ledger:
+        ledger = self._ledger.get(self._ledger_sheet)
+        if ledger is None:
+            ledger = _Ledger(record for _, record in self._fetch_ledger())
+            for dt, item in list(self._rows):
+                ledger.insert(dt, item)
+            self._ledger[self._ledger_sheet] = ledger
+        return ledger
 
-        logger.info("Updating the date column...")
-        vals = [[name] for name in row_names]
+    def get_all(self, *, dt: date) -> Iterable[ExpenseItem]:
+        return [item for _, item in self.get_range(dt, dt)]
 
-        self._mutable_sheet.values().update(
-            spreadsheetId=self._sheet_id,
-            range=f"{page}!B5:B{4+len(vals)}",
-            body={"values": vals},
-            valueInputOption=str(Input.USER_ENTERED),
-        ).execute()
+    def get_range(
+        self, start: date, end: date
+    ) -> Iterator[tuple[date, ExpenseItem]]:
+        if not self._sheet_exists(self._ledger_sheet):
+            return iter(())
+        return iter(self._get_ledger().range(start, end))
 
-        if len(vals) < 31:
-            diff = 31 - len(vals)
+    def _add(self, item: ExpenseItem, /, *, dt: date):
+        if not self._sheet_exists(self._ledger_sheet):
+            self._create_ledger()
 
-            logger.info("Removing the last %s rows in the sheet...", diff)
-            self._mutable_sheet.values().clear(
-                spreadsheetId=self._sheet_id,
-                range=f"{page}!B{36-diff}:C35",
-            ).execute()
+        # rows are appended blindly, the ledger is only
+        # updated in memory if it has been read already
+        ledger = self._ledger.get(self._ledger_sheet)
+        if ledger is not None:
+            ledger.insert(dt, item)
 
-        logger.info("Fetching the formula for the total balance...")
-        formula = (
-            self._sheet.values()
-            .get(
+        if not self._rows:
+            self._pending_since = time.monotonic()
+        self._rows.append((dt, item))
+        self._flush_if_due()
+
+    def _pending_count(self) -> int:
+        return len(self._rows)
+
+    def replace_day(self, dt: date, items: Iterable[ExpenseItem]):
+        """Overwrite the rows of the date in place, clearing the extra
+        ones, and append the items that do not fit. Unlike deleting
+        rows, overwriting them is safe to retry."""
+        items = list(items)
+        with self._lock:
+            if not self._sheet_exists(self._ledger_sheet):
+                if not items:
+                    return
+                self._create_ledger()
+
+            # buffered rows of the date are replaced as well
+            self._flush()
+            self._ledger.clear()
+            rows = [
+                row for row, (day, _) in self._fetch_ledger() if day == dt
+            ]
+
+            data = [
+                {
+                    "range": f"'{self._ledger_sheet}'!A{row}:E{row}",
+                    "values": [
+                        (
+                            [*self._to_row(dt, items[i]), ""]
+                            if i < len(items)
+                            else [""] * len(LEDGER_FIELDS)
+                        )
+                    ],
+                }
+                for i, row in enumerate(rows)
+            ]
+            if data:
+                self._execute(
+                    self._mutable_sheet.values().batchUpdate(
+                        spreadsheetId=self._sheet_id,
+                        body={
+                            "valueInputOption": str(Input.USER_ENTERED),
+                            "data": data,
+                        },
+                    ),
+                    priority=Priority.BACKGROUND,
+                )
+
+            extra = [(dt, item) for item in items[len(rows) :]]
+            if extra:
+                self._pending_since = time.monotonic()
+                self._rows.extend(extra)
+                self._flush_if_due()
+
+    def refresh(self):
+        super().refresh()
+        self._ledger.clear()
+
+    def _batch_appended(self, batch_id: str) -> bool:
+        response = self._execute(
+            self._sheet.values().get(
                 spreadsheetId=self._sheet_id,
-                range=self._formula_cell,
-                valueRenderOption=str(Render.FORMULA),
+                range=f"'{self._ledger_sheet}'!E2:E",
             )
-            .execute()
-        )["values"][0][0]
+        )
+        return any(batch_id in vals for vals in response.get("values", []))
 
-        if page not in formula:
-            logger.info("Updating the formula for the total balance...")
+    def _flush(self):
+        # the failed append might have been applied nevertheless
+        if self._failed_batch is not None:
+            batch_id, count = self._failed_batch
+            if self._batch_appended(batch_id):
+                logger.info("Failed append was applied")
+                del self._rows[:count]
+            self._failed_batch = None
 
-            formula += f"-'{page}'!A1"
+        if not self._rows:
+            return
 
-            self._mutable_sheet.values().update(
+        batch_id = uuid.uuid4().hex
+        self._failed_batch = batch_id, len(self._rows)
+        logger.info("Appending %s row(s) to the ledger...", len(self._rows))
+        self._execute(
+            self._mutable_sheet.values().append(
                 spreadsheetId=self._sheet_id,
-                range=self._formula_cell,
-                body={"values": [[formula]]},
+                range=f"'{self._ledger_sheet}'!A:E",
                 valueInputOption=str(Input.USER_ENTERED),
-            ).execute()
+                insertDataOption="INSERT_ROWS",
+                body={
+                    "values": [
+                        [*self._to_row(*row), batch_id] for row in self._rows
+                    ]
+                },
+            ),
+            priority=Priority.BACKGROUND,
+            applied=partial(self._batch_appended, batch_id),
+        )
+        self._rows.clear()
+        self._failed_batch = None
+
+    @staticmethod
+    def _pivot_table(source_id: int) -> dict:
+        """Sum of amounts by month and category."""
+        return {
+            "source": {
+                "sheetId": source_id,
+                "startRowIndex": 0,
+                "startColumnIndex": 0,
+                "endColumnIndex": len(LEDGER_FIELDS),
+            },
+            "rows": [
+                {
+                    "sourceColumnOffset": 0,
+                    "sortOrder": "ASCENDING",
+                    "showTotals": True,
+                    "groupRule": {"dateTimeRule": {"type": "YEAR_MONTH"}},
+                }
+            ],
+            "columns": [
+                {
+                    "sourceColumnOffset": 3,
+                    "sortOrder": "ASCENDING",
+                    "showTotals": True,
+                }
+            ],
+            "values": [{"sourceColumnOffset": 1, "summarizeFunction": "SUM"}],
+        }
+
+    def _create_ledger(self) -> bool:
+        self._invalidate_sheet_ids()
+        if self._sheet_exists(self._ledger_sheet):
+            return False
+
+        try:
+            self._do_create_ledger()
+        except Exception:
+            self._invalidate_sheet_ids()
+            raise
+        return True
+
+    def _do_create_ledger(self):
+        ledger_id = self._unused_sheet_id()
+        header = [{"stringValue": name} for name in LEDGER_FIELDS]
+        requests = [
+            {
+                "addSheet": {
+                    "properties": {
+                        "sheetId": ledger_id,
+                        "title": self._ledger_sheet,
+                        "index": 1,
+                        "gridProperties": {"frozenRowCount": 1},
+                    }
+                }
+            },
+            self._update_cells(ledger_id, "A1:E1", [header]),
+        ]
+
+        sheet_ids = {self._ledger_sheet: ledger_id}
+        if self._pivot_sheet and not self._sheet_exists(self._pivot_sheet):
+            pivot_id = sheet_ids[self._pivot_sheet] = ledger_id + 1
+            pivot = {"pivotTable": self._pivot_table(ledger_id)}
+            requests += [
+                {
+                    "addSheet": {
+                        "properties": {
+                            "sheetId": pivot_id,
+                            "title": self._pivot_sheet,
+                            "index": 1,
+                        }
+                    }
+                },
+                {
+                    "updateCells": {
+                        "fields": "pivotTable",
+                        "start": {"sheetId": pivot_id},
+                        "rows": [{"values": [pivot]}],
+                    }
+                },
+            ]
+
+        logger.info("Creating the ledger sheet '%s'...", self._ledger_sheet)
+        self._execute(
+            self._mutable_sheet.batchUpdate(
+                spreadsheetId=self._sheet_id, body={"requests": requests}
+            )
+        )
+
+        with self._metadata_lock:
+            self._sheet_ids.update(sheet_ids)
+        self._ledger[self._ledger_sheet] = _Ledger()
+
+    def provision(self, dt: date) -> bool:
+        with self._lock:
+            if self._sheet_exists(self._ledger_sheet):
+                return False
+            return self._create_ledger()
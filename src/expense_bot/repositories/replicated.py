@@ -0,0 +1,502 @@
+"""Local replica of a remote repository, synchronized day by day."""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from typing import (
+    Any,
+    Hashable,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Union,
+)
+
+from ..model import EARN, Category, ExpenseItem, Summary
+from ..repository import GroupBy, Records, Repository
+
+logger = logging.getLogger()
+
+# the key identifies the remote and replica repositories
+DEFAULT_SNAPSHOT_PATH = "/tmp/expense-bot-replica-{key}.json"
+
+_Rows = dict[int, list[ExpenseItem]]
+
+
+def _ordered(items: Iterable[ExpenseItem]) -> list[ExpenseItem]:
+    # earnings and purchases are kept in separate rows of the spreadsheet
+    return sorted(items, key=lambda item: item.cat.value)
+
+
+def row_hash(items: Iterable[ExpenseItem]) -> str:
+    """Content hash of the expenses recorded for a single day."""
+    data = json.dumps(
+        [[round(item.amt, 2), item.vnd, item.cat.name] for item in items]
+    )
+    return hashlib.blake2b(data.encode(), digest_size=8).hexdigest()
+
+
+def _group_rows(records: Records) -> _Rows:
+    rows: _Rows = {}
+    for dt, item in records:
+        rows.setdefault(dt.toordinal(), []).append(item)
+    return {day: _ordered(items) for day, items in rows.items()}
+
+
+def _month_end(dt: date) -> date:
+    next_month = (dt.replace(day=1) + timedelta(days=31)).replace(day=1)
+    return next_month - timedelta(days=1)
+
+
+def _months(start: date, end: date) -> Iterator[date]:
+    """First days of the months between two dates."""
+    first = start.replace(day=1)
+    while first <= end:
+        yield first
+        first = _month_end(first) + timedelta(days=1)
+
+
+def _encode(items: list[ExpenseItem]) -> list[list[Any]]:
+    return [[item.amt, item.vnd, item.cat.name] for item in items]
+
+
+def _decode(items: list[list[Any]]) -> list[ExpenseItem]:
+    return [ExpenseItem(amt, vnd, Category[cat]) for amt, vnd, cat in items]
+
+
+def _write_json(path: str, data: Any):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fout:
+        json.dump(data, fout, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def _instantiate(
+    repo: Union[str, Repository], options: Optional[dict[str, Any]]
+) -> Repository:
+    if isinstance(repo, str):
+        return Repository.new(repo, **(options or {}))
+    return repo
+
+
+def _item_key(item: ExpenseItem) -> tuple[float, str, Category]:
+    return round(item.amt, 2), item.vnd, item.cat
+
+
+def _merge(
+    remote: list[ExpenseItem], added: list[ExpenseItem]
+) -> list[ExpenseItem]:
+    """Add the locally added items missing from the remote version
+    of a day."""
+    missing = Counter(map(_item_key, added)) - Counter(map(_item_key, remote))
+    extra = []
+    for item in added:
+        if missing[_item_key(item)] > 0:
+            missing[_item_key(item)] -= 1
+            extra.append(item)
+    return _ordered(remote + extra)
+
+
+class SyncResult(NamedTuple):
+    """Number of days pulled from and pushed to the remote repository,
+    of the days changed on both sides, where the items added locally
+    were merged into the remote version, and of the days which could
+    not be pushed, e.g. because they do not fit into the remote."""
+
+    pulled: int
+    pushed: int
+    conflicts: int
+    failed: int = 0
+
+
+class Replicated(Repository):  # pylint: disable=R0902
+    """Repository which serves reads and writes from a local replica,
+    e.g. :class:`InMemory` or :class:`SQLite`, synchronized both ways
+    with a remote one, e.g. :class:`GoogleSheets`.
+
+    The replica covers a contiguous span of months, which starts with
+    the last `history_months` and grows whenever older dates are read
+    or written. Every day of the span is compared by content hash with
+    its version as of the last sync, so that only the days changed
+    on one side are pulled or pushed, and the edits made to the remote
+    by hand are detected. Local writes are pushed on :meth:`flush`,
+    comparing only the months written to with their cached remote
+    version, and the whole span is re-read and synced once
+    `sync_interval` has passed.
+
+    The replica and sync state are saved next to `snapshot_path`, one
+    file per month, so that a restarted process resumes without
+    downloading everything again, and a flush rewrites only the months
+    it has pushed.
+    By default, the path is derived from the repository names and
+    options, and there is no snapshot if instances are passed instead.
+    Earnings are recorded on the first day of the month, like in the
+    spreadsheet, and writes which would not fit into the remote are
+    rejected upfront."""
+
+    supports_replace = True
+
+    def __init__(  # pylint: disable=R0913
+        self,
+        remote: Union[str, Repository] = "GoogleSheets",
+        replica: Union[str, Repository] = "InMemory",
+        *,
+        remote_options: Optional[dict[str, Any]] = None,
+        replica_options: Optional[dict[str, Any]] = None,
+        snapshot_path: Optional[str] = DEFAULT_SNAPSHOT_PATH,
+        sync_interval: float = 300.0,
+        history_months: int = 12,
+    ):
+        self.remote = _instantiate(remote, remote_options)
+        self.replica = _instantiate(replica, replica_options)
+        if not self.remote.supports_replace:
+            raise TypeError(
+                f"{type(self.remote).__name__} cannot be a remote,"
+                " because it does not support replacing records"
+            )
+
+        if snapshot_path == DEFAULT_SNAPSHOT_PATH:
+            snapshot_path = self._default_snapshot_path(
+                remote, remote_options, replica, replica_options
+            )
+        self._snapshot_path = snapshot_path
+        self._sync_interval = sync_interval
+        self._history_months = history_months
+
+        self._lock = threading.RLock()
+        # first and last day of the replicated months
+        self._span: Optional[tuple[date, date]] = None
+        # hashes of the days as of the last sync, by date ordinal
+        self._synced: dict[int, str] = {}
+        self._synced_at = 0.0
+        # first days of the months with local changes
+        self._dirty: set[date] = set()
+        # items added locally since the last sync, by date ordinal
+        self._added: dict[int, list[ExpenseItem]] = {}
+
+        self._load_snapshot()
+
+    @staticmethod
+    def _default_snapshot_path(
+        remote: Union[str, Repository],
+        remote_options: Optional[dict[str, Any]],
+        replica: Union[str, Repository],
+        replica_options: Optional[dict[str, Any]],
+    ) -> Optional[str]:
+        if not isinstance(remote, str) or not isinstance(replica, str):
+            logger.info("Replica of a repository instance is not saved")
+            return None
+
+        config = [remote, remote_options, replica, replica_options]
+        data = json.dumps(config, sort_keys=True, default=str)
+        key = hashlib.blake2b(data.encode(), digest_size=8).hexdigest()
+        return DEFAULT_SNAPSHOT_PATH.format(key=key)
+
+    @property
+    def max_items(self) -> Optional[int]:  # type: ignore[override]
+        """Records have to fit into the remote repository."""
+        return self.remote.max_items
+
+    def _initial_span(self) -> tuple[date, date]:
+        start = date.today().replace(day=1)
+        for _ in range(self._history_months - 1):
+            start = (start - timedelta(days=1)).replace(day=1)
+        return start, _month_end(date.today() + timedelta(days=31))
+
+    def _ensure(self, start: date, end: date):
+        """Extend the span to the months between two dates, pulling
+        their contents, and run a full sync if one is due."""
+        with self._lock:
+            if self._span is None:
+                self.sync()
+            assert self._span is not None
+
+            span_start, span_end = self._span
+            if start < span_start:
+                day_before = span_start - timedelta(days=1)
+                self._extend(start.replace(day=1), day_before)
+            if end > span_end:
+                day_after = span_end + timedelta(days=1)
+                self._extend(day_after, _month_end(end))
+
+            if time.time() - self._synced_at >= self._sync_interval:
+                self.sync()
+
+    def _extend(self, start: date, end: date):
+        """Pull the months between two dates into the span."""
+        self._sync_range(start, end)
+        span_start, span_end = self._span or (start, end)
+        self._span = min(span_start, start), max(span_end, end)
+        self._save_snapshot(_months(start, end))
+
+    def sync(self) -> SyncResult:
+        """Synchronize all replicated months with the remote repository."""
+        with self._lock:
+            span = self._span or self._initial_span()
+            result = self._sync_range(*span)
+            self._span, self._synced_at = span, time.time()
+            self._save_snapshot(_months(*span))
+            return result
+
+    def _push(self, dt: date, items: list[ExpenseItem]) -> bool:
+        try:
+            self.remote.replace_day(dt, items)
+        except Exception:  # pylint: disable=W0718
+            logger.exception("Failed to push %s, keeping it local", dt)
+            return False
+        return True
+
+    # pylint: disable-next=R0912,R0914
+    def _sync_range(
+        self, start: date, end: date, *, refresh: bool = True
+    ) -> SyncResult:
+        if refresh:
+            self.remote.refresh()
+        remote = _group_rows(self.remote.get_range(start, end))
+        local = _group_rows(self.replica.get_range(start, end))
+
+        first, last = start.toordinal(), end.toordinal()
+        days = set(remote) | set(local)
+        days.update(day for day in self._synced if first <= day <= last)
+
+        pulled = pushed = conflicts = 0
+        unpushed: set[date] = set()
+        for day in sorted(days):
+            dt = date.fromordinal(day)
+            local_items, remote_items = local.get(day), remote.get(day)
+            local_hash = row_hash(local_items) if local_items else None
+            remote_hash = row_hash(remote_items) if remote_items else None
+            synced_hash = self._synced.get(day)
+
+            if local_hash == remote_hash:
+                pass
+            elif remote_hash == synced_hash:
+                if self._push(dt, local_items or []):
+                    pushed += 1
+                else:
+                    unpushed.add(dt)
+                    local_hash = synced_hash
+            elif local_hash == synced_hash or not local_items:
+                self.replica.replace_day(dt, remote_items or [])
+                local_hash = remote_hash
+                pulled += 1
+            else:
+                # local additions are kept rather than silently dropped
+                logger.warning("Conflicting changes on %s", dt)
+                conflicts += 1
+                merged = _merge(remote_items or [], self._added.get(day, []))
+                self.replica.replace_day(dt, merged)
+                pulled += 1
+                local_hash = remote_hash
+                if row_hash(merged) != remote_hash:
+                    if self._push(dt, merged):
+                        local_hash = row_hash(merged)
+                    else:
+                        unpushed.add(dt)
+
+            if local_hash is None:
+                self._synced.pop(day, None)
+            else:
+                self._synced[day] = local_hash
+            if dt not in unpushed:
+                self._added.pop(day, None)
+
+        self.remote.flush()
+        self._dirty = {m for m in self._dirty if not start <= m <= end}
+        self._dirty.update(dt.replace(day=1) for dt in unpushed)
+
+        result = SyncResult(pulled, pushed, conflicts, len(unpushed))
+        logger.info("Synced %s - %s: %s", start, end, result)
+        return result
+
+    def _month_path(self, first: date) -> str:
+        root, ext = os.path.splitext(self._snapshot_path or "")
+        return f"{root}-{first:%Y-%m}{ext}"
+
+    def _load_snapshot(self):
+        if not self._snapshot_path:
+            return
+
+        try:
+            with open(self._snapshot_path, encoding="utf-8") as fin:
+                data = json.load(fin)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            logger.warning("Ignoring unreadable replica snapshot")
+            return
+
+        start, end = data["span"]
+        self._span = date.fromordinal(start), date.fromordinal(end)
+        self._synced_at = data["synced_at"]
+        self._dirty = {date.fromordinal(day) for day in data["dirty"]}
+
+        # older snapshots keep every month in the same file
+        months = [data] if "rows" in data else []
+        for first in [] if months else _months(*self._span):
+            try:
+                with open(self._month_path(first), encoding="utf-8") as fin:
+                    months.append(json.load(fin))
+            except (FileNotFoundError, ValueError):
+                logger.warning("Missing snapshot of %s, syncing again", first)
+                # the month is pulled again by a full sync on next use
+                self._synced_at = 0.0
+
+        rows: list[tuple[date, ExpenseItem]] = []
+        for month in months:
+            self._synced.update(
+                (int(day), h) for day, h in month["synced"].items()
+            )
+            self._added.update(
+                (int(day), _decode(items))
+                for day, items in month.get("added", {}).items()
+            )
+            rows.extend(
+                (date.fromordinal(int(day)), item)
+                for day, items in month["rows"].items()
+                for item in _decode(items)
+            )
+
+        # a durable replica, e.g. SQLite, keeps its own records
+        if next(iter(self.replica.get_range(*self._span)), None) is None:
+            self.replica.add_many(rows)
+        logger.info("Restored replica snapshot of %s - %s", *self._span)
+
+    def _save_snapshot(self, months: Iterable[date] = ()):
+        """Save the replica and sync state of the given months,
+        along with the span of the replica."""
+        if not self._snapshot_path or self._span is None:
+            return
+
+        for first in months:
+            last = _month_end(first)
+            days = range(first.toordinal(), last.toordinal() + 1)
+            rows = _group_rows(self.replica.get_range(first, last))
+            month = {
+                "synced": {
+                    day: h for day, h in self._synced.items() if day in days
+                },
+                "added": {
+                    day: _encode(items)
+                    for day, items in self._added.items()
+                    if day in days
+                },
+                "rows": {day: _encode(items) for day, items in rows.items()},
+            }
+            _write_json(self._month_path(first), month)
+
+        _write_json(
+            self._snapshot_path,
+            {
+                "span": [dt.toordinal() for dt in self._span],
+                "synced_at": self._synced_at,
+                "dirty": [dt.toordinal() for dt in self._dirty],
+            },
+        )
+
+    def get_all(self, *, dt: date) -> Iterable[ExpenseItem]:
+        self._ensure(dt, dt)
+        return self.replica.get_all(dt=dt)
+
+    def get_range(
+        self, start: date, end: date
+    ) -> Iterator[tuple[date, ExpenseItem]]:
+        self._ensure(start, end)
+        return iter(self.replica.get_range(start, end))
+
+    def totals(
+        self,
+        start: date,
+        end: date,
+        *,
+        by: GroupBy = "cat",
+        cat: Optional[Category] = None,
+    ) -> dict[Hashable, float]:
+        self._ensure(start, end)
+        return self.replica.totals(start, end, by=by, cat=cat)
+
+    def summarize(self, start: date, end: date, *, top: int = 5) -> Summary:
+        self._ensure(start, end)
+        return self.replica.summarize(start, end, top=top)
+
+    def add(self, item: ExpenseItem, /, *, dt: date):
+        self.add_many([(dt, item)])
+
+    def _check_room(self, records: list[tuple[date, ExpenseItem]]):
+        """Make sure that the records would fit into the remote."""
+        if self.max_items is None:
+            return
+
+        counts = Counter((dt, item.cat) for dt, item in records)
+        for (dt, cat), count in counts.items():
+            room = self.room_for(dt, cat)
+            if cat is EARN:
+                msg = f"No room to add more earnings for {dt:%m/%Y}!"
+            else:
+                msg = f"No room to add more purchases for {dt}!"
+            assert room is None or count <= room, msg
+
+    def add_many(self, items: Records, /) -> int:
+        records = [
+            (dt.replace(day=1) if item.cat is EARN else dt, item)
+            for dt, item in items
+        ]
+        if not records:
+            return 0
+
+        with self._lock:
+            dates = [dt for dt, _ in records]
+            self._ensure(min(dates), max(dates))
+            self._check_room(records)
+            count = self.replica.add_many(records)
+            for dt, item in records:
+                self._added.setdefault(dt.toordinal(), []).append(item)
+            self._dirty.update(dt.replace(day=1) for dt in dates)
+        return count
+
+    def replace_day(self, dt: date, items: Iterable[ExpenseItem]):
+        items = list(items)
+        limit = self.max_items
+        if limit is not None:
+            counts = Counter(item.cat for item in items)
+            assert (
+                max(counts.values(), default=0) <= limit
+            ), f"No room for {dt}!"
+
+        with self._lock:
+            self._ensure(dt, dt)
+            self.replica.replace_day(dt, items)
+            self._added[dt.toordinal()] = items
+            self._dirty.add(dt.replace(day=1))
+
+    def flush(self):
+        """Push local changes to the remote repository."""
+        with self._lock:
+            # the cached remote months are re-read by the periodic sync
+            months = sorted(self._dirty)
+            for first in months:
+                self._sync_range(first, _month_end(first), refresh=False)
+            if months:
+                self._save_snapshot(months)
+
+    def refresh(self):
+        # run a full sync on next use
+        self._synced_at = 0.0
+
+    def reset_connections(self):
+        self.remote.reset_connections()
+        self.replica.reset_connections()
+
+    def close(self):
+        self.flush()
+        self.remote.close()
+        self.replica.close()
+
+    def provision(self, dt: date) -> bool:
+        return self.remote.provision(dt)
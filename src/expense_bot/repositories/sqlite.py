@@ -0,0 +1,171 @@
+"""Repository backed by a local SQLite database."""
+
+import sqlite3
+import threading
+from datetime import date
+from typing import Any, Callable, Hashable, Iterable, Iterator, Optional
+
+from ..model import EARN, SPEND, Category, ExpenseItem, Summary
+from ..repository import GroupBy, Records, Repository
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS expenses ("
+    " id INTEGER PRIMARY KEY,"
+    " dt INTEGER NOT NULL,"
+    " amt REAL NOT NULL,"
+    " vnd TEXT NOT NULL,"
+    " cat INTEGER NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS expenses_dt ON expenses (dt)",
+    "CREATE INDEX IF NOT EXISTS expenses_vnd_dt ON expenses (vnd, dt)",
+    "CREATE INDEX IF NOT EXISTS expenses_cat_dt ON expenses (cat, dt)",
+)
+
+_INSERT = "INSERT INTO expenses (dt, amt, vnd, cat) VALUES (?, ?, ?, ?)"
+
+_GROUP_COLUMNS = {"cat": "cat", "vnd": "vnd", "day": "dt"}
+_GROUP_DECODERS: dict[str, Callable[[Any], Hashable]] = {
+    "cat": Category,
+    "vnd": str,
+    "day": date.fromordinal,
+}
+
+# rows fetched per round trip when streaming a date range
+_FETCH_SIZE = 512
+
+
+class SQLite(Repository):
+    """SQLite repository.
+
+    Dates are stored as ordinals, so that range scans and aggregates
+    are served by the date indexes. The connection is shared between
+    threads and serialized with a lock."""
+
+    supports_replace = True
+
+    def __init__(self, path: str = "expenses.sqlite3"):
+        self.durable = path != ":memory:"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+
+    @staticmethod
+    def _row(dt: date, item: ExpenseItem) -> tuple[int, float, str, int]:
+        return dt.toordinal(), item.amt, item.vnd, item.cat.value
+
+    def get_all(self, *, dt: date) -> Iterable[ExpenseItem]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT amt, vnd, cat FROM expenses WHERE dt = ? ORDER BY id",
+                (dt.toordinal(),),
+            ).fetchall()
+        return [
+            ExpenseItem(amt, vnd, Category(cat)) for amt, vnd, cat in rows
+        ]
+
+    def get_range(
+        self, start: date, end: date
+    ) -> Iterator[tuple[date, ExpenseItem]]:
+        cursor = self._conn.cursor()
+        with self._lock:
+            cursor.execute(
+                "SELECT dt, amt, vnd, cat FROM expenses"
+                " WHERE dt BETWEEN ? AND ? ORDER BY dt, id",
+                (start.toordinal(), end.toordinal()),
+            )
+        try:
+            while True:
+                with self._lock:
+                    rows = cursor.fetchmany(_FETCH_SIZE)
+                if not rows:
+                    break
+                for dt, amt, vnd, cat in rows:
+                    yield date.fromordinal(dt), ExpenseItem(
+                        amt, vnd, Category(cat)
+                    )
+        finally:
+            cursor.close()
+
+    def add(self, item: ExpenseItem, /, *, dt: date):
+        with self._lock:
+            self._conn.execute(_INSERT, self._row(dt, item))
+
+    def add_many(self, items: Records, /) -> int:
+        rows = [self._row(dt, item) for dt, item in items]
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(_INSERT, rows)
+        return len(rows)
+
+    def replace_day(self, dt: date, items: Iterable[ExpenseItem]):
+        rows = [self._row(dt, item) for item in items]
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "DELETE FROM expenses WHERE dt = ?", (dt.toordinal(),)
+            )
+            self._conn.executemany(_INSERT, rows)
+
+    def totals(
+        self,
+        start: date,
+        end: date,
+        *,
+        by: GroupBy = "cat",
+        cat: Optional[Category] = None,
+    ) -> dict[Hashable, float]:
+        column = _GROUP_COLUMNS[by]
+        query = (
+            f"SELECT {column}, SUM(amt) FROM expenses"
+            " WHERE dt BETWEEN ? AND ?"
+        )
+        params: tuple[int, ...] = (start.toordinal(), end.toordinal())
+        if cat is not None:
+            query += " AND cat = ?"
+            params += (cat.value,)
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"{query} GROUP BY {column}", params
+            ).fetchall()
+
+        decode = _GROUP_DECODERS[by]
+        return {decode(key): total for key, total in rows}
+
+    def summarize(self, start: date, end: date, *, top: int = 5) -> Summary:
+        totals = self.totals(start, end)
+        params = (start.toordinal(), end.toordinal(), SPEND.value, top)
+        with self._lock:
+            vendors = self._conn.execute(
+                "SELECT vnd, SUM(amt) AS total FROM expenses"
+                " WHERE dt BETWEEN ? AND ? AND cat = ?"
+                " GROUP BY vnd ORDER BY total DESC LIMIT ?",
+                params,
+            ).fetchall()
+            largest = self._conn.execute(
+                "SELECT dt, amt, vnd FROM expenses"
+                " WHERE dt BETWEEN ? AND ? AND cat = ?"
+                " ORDER BY amt DESC, dt, id LIMIT ?",
+                params,
+            ).fetchall()
+
+        return Summary(
+            start,
+            end,
+            totals.get(EARN, 0.0),
+            totals.get(SPEND, 0.0),
+            vendors=list(vendors),
+            largest=[
+                (date.fromordinal(dt), ExpenseItem(amt, vnd))
+                for dt, amt, vnd in largest
+            ],
+        )
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
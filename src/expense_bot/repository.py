@@ -1,22 +1,54 @@
 """Storage for expense records."""
 
+import asyncio
 import logging
 from abc import ABC, abstractmethod
-from datetime import date
-from typing import Iterable, Type
+from contextlib import suppress
+from datetime import date, timedelta
+from functools import partial
+from heapq import heappush, heappushpop, nlargest
+from importlib import import_module
+from operator import itemgetter
+from typing import (
+    Any,
+    Callable,
+    Hashable,
+    Iterable,
+    Iterator,
+    Literal,
+    Optional,
+    Type,
+)
 
 from aiogram.utils.mixins import ContextInstanceMixin
 
-from .model import ExpenseItem
-from .utils import FactoryMixin, setup_logging
+from .model import EARN, Category, ExpenseItem, Summary
+from .utils import FactoryMixin
 
-setup_logging()
 logger = logging.getLogger()
 
+GroupBy = Literal["cat", "vnd", "day"]
+Records = Iterable[tuple[date, ExpenseItem]]
 
+_GROUP_KEYS: dict[str, Callable[[date, ExpenseItem], Hashable]] = {
+    "cat": lambda dt, item: item.cat,
+    "vnd": lambda dt, item: item.vnd,
+    "day": lambda dt, item: dt,
+}
+
+
+# pylint: disable-next=R0904
 class Repository(ABC, ContextInstanceMixin, FactoryMixin):
     """Base repository."""
 
+    # max number of items of a category per day (earnings are counted
+    # per month), if limited
+    max_items: Optional[int] = None
+    # whether records outlive the instance
+    durable = True
+    # whether records of a day can be replaced with `replace_day`
+    supports_replace = False
+
     @classmethod
     def current(cls: Type["Repository"]) -> "Repository":
         """Get registered instance of this class,
@@ -28,6 +60,16 @@ class Repository(ABC, ContextInstanceMixin, FactoryMixin):
                 f"{cls.__name__} is not configured..."
             ) from None
 
+    @classmethod
+    def new(cls, type_name: str, *args: Any, **kwargs: Any):
+        """Instantiate a repository with matching name."""
+        # make sure lazily imported implementations are registered
+        repositories = import_module(".repositories", __package__)
+        with suppress(AttributeError):
+            getattr(repositories, type_name)
+
+        return super().new(type_name, *args, **kwargs)
+
     @abstractmethod
     def get_all(self, *, dt: date) -> Iterable[ExpenseItem]:
         """Get expense report for a given date"""
@@ -35,3 +77,154 @@ class Repository(ABC, ContextInstanceMixin, FactoryMixin):
     @abstractmethod
     def add(self, item: ExpenseItem, /, *, dt: date):
         """Record a new expense"""
+
+    def get_range(
+        self, start: date, end: date
+    ) -> Iterator[tuple[date, ExpenseItem]]:
+        """Get expenses recorded between two dates (inclusive),
+        ordered by date"""
+        dt = start
+        while dt <= end:
+            for item in self.get_all(dt=dt):
+                yield dt, item
+            dt += timedelta(days=1)
+
+    def add_many(self, items: Records, /) -> int:
+        """Record multiple expenses, return the number of records added"""
+        count = 0
+        for dt, item in items:
+            self.add(item, dt=dt)
+            count += 1
+        return count
+
+    def totals(
+        self,
+        start: date,
+        end: date,
+        *,
+        by: GroupBy = "cat",
+        cat: Optional[Category] = None,
+    ) -> dict[Hashable, float]:
+        """Sum amounts recorded between two dates (inclusive),
+        grouped by category, vendor or day"""
+        key_of = _GROUP_KEYS[by]
+        result: dict[Hashable, float] = {}
+        for dt, item in self.get_range(start, end):
+            if cat is None or item.cat is cat:
+                key = key_of(dt, item)
+                result[key] = result.get(key, 0.0) + item.amt
+        return result
+
+    def summarize(self, start: date, end: date, *, top: int = 5) -> Summary:
+        """Aggregate expenses recorded between two dates (inclusive)
+        in a single pass over the records"""
+        summary = Summary(start, end)
+        vendors: dict[str, float] = {}
+        largest: list[tuple[float, int, date, ExpenseItem]] = []
+
+        for i, (dt, item) in enumerate(self.get_range(start, end)):
+            if item.cat is EARN:
+                summary.earned += item.amt
+                continue
+
+            summary.spent += item.amt
+            vendors[item.vnd] = vendors.get(item.vnd, 0.0) + item.amt
+            # earlier items win ties
+            entry = (item.amt, -i, dt, item)
+            if len(largest) < top:
+                heappush(largest, entry)
+            else:
+                heappushpop(largest, entry)
+
+        summary.vendors = nlargest(top, vendors.items(), key=itemgetter(1))
+        summary.largest = [
+            (dt, item) for _, _, dt, item in sorted(largest, reverse=True)
+        ]
+        return summary
+
+    def flush(self):
+        """Persist any buffered writes"""
+
+    def reset_connections(self):
+        """Drop connections to the backing storage,
+        so that they are re-established on next use"""
+
+    def close(self):
+        """Persist any buffered writes and release connections
+        and worker threads, the repository is not used afterwards"""
+        self.flush()
+
+    def replace_day(self, dt: date, items: Iterable[ExpenseItem]):
+        """Replace all expenses recorded for a given date,
+        if `supports_replace` is set"""
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support replacing records"
+        )
+
+    def room_for(self, dt: date, cat: Category) -> Optional[int]:
+        """Number of items of a category which can still be recorded
+        on a given date, or None if there is no limit"""
+        if self.max_items is None:
+            return None
+
+        start = end = dt
+        if cat is EARN:
+            start = dt.replace(day=1)
+            end = (start + timedelta(days=31)).replace(day=1)
+            end -= timedelta(days=1)
+        used = sum(
+            1 for _, item in self.get_range(start, end) if item.cat is cat
+        )
+        return max(0, self.max_items - used)
+
+    def refresh(self):
+        """Discard cached reads, so that changes made
+        to the backing storage by others are seen"""
+
+    def provision(self, dt: date) -> bool:  # pylint: disable=W0613
+        """Prepare storage for the month of a given date ahead of time,
+        and return whether anything had to be created"""
+        return False
+
+    async def get_all_async(self, *, dt: date) -> Iterable[ExpenseItem]:
+        """Get expense report for a given date
+        without blocking the event loop"""
+        return await asyncio.to_thread(partial(self.get_all, dt=dt))
+
+    async def get_range_async(
+        self, start: date, end: date
+    ) -> list[tuple[date, ExpenseItem]]:
+        """Get expenses recorded between two dates (inclusive)
+        without blocking the event loop"""
+        return await asyncio.to_thread(
+            lambda: list(self.get_range(start, end))
+        )
+
+    async def add_async(self, item: ExpenseItem, /, *, dt: date):
+        """Record a new expense without blocking the event loop"""
+        await asyncio.to_thread(partial(self.add, item, dt=dt))
+
+    async def add_many_async(self, items: Records, /) -> int:
+        """Record multiple expenses without blocking the event loop"""
+        return await asyncio.to_thread(self.add_many, items)
+
+    async def summarize_async(
+        self, start: date, end: date, *, top: int = 5
+    ) -> Summary:
+        """Aggregate expenses without blocking the event loop"""
+        return await asyncio.to_thread(
+            partial(self.summarize, start, end, top=top)
+        )
+
+    async def flush_async(self):
+        """Persist any buffered writes without blocking the event loop"""
+        await asyncio.to_thread(self.flush)
+
+    async def close_async(self):
+        """Close the repository without blocking the event loop"""
+        await asyncio.to_thread(self.close)
+
+    async def provision_async(self, dt: date) -> bool:
+        """Prepare storage for the month of a given date
+        without blocking the event loop"""
+        return await asyncio.to_thread(self.provision, dt)
@@ -0,0 +1,79 @@
+"""Long-lived resources shared by warm Lambda invocations."""
+
+import asyncio
+import logging
+import time
+from typing import Coroutine, Optional, TypeVar
+
+from aiogram.exceptions import TelegramNetworkError
+from aiohttp import ClientError
+
+from .bot import KeepAliveSession, get_bot
+from .repository import Repository
+from .tenants import tenants
+
+logger = logging.getLogger()
+
+_T = TypeVar("_T")
+
+_NETWORK_ERRORS = (ClientError, OSError, TelegramNetworkError)
+
+
+class Runtime:
+    """Keep one event loop, one Bot API session and the repository
+    connections alive for the lifetime of the container.
+
+    Connections which stayed idle for longer than `max_idle` seconds,
+    or which failed during the previous invocation, are re-established
+    before handling the next one."""
+
+    def __init__(self, *, max_idle: float = 240.0):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._max_idle = max_idle
+        self._last_used = time.monotonic()
+        self._healthy = True
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Event loop shared by all invocations."""
+        if self._loop is None or self._loop.is_closed():
+            logger.info("Creating a new event loop...")
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+        return self._loop
+
+    def run(self, coro: Coroutine[None, None, _T]) -> _T:
+        """Run the coroutine on the shared event loop."""
+        return self.loop.run_until_complete(self._run(coro))
+
+    async def _run(self, coro: Coroutine[None, None, _T]) -> _T:
+        await self.check_health()
+        try:
+            return await coro
+        except _NETWORK_ERRORS:
+            self._healthy = False
+            raise
+        finally:
+            self._last_used = time.monotonic()
+
+    async def check_health(self):
+        """Drop connections which are likely to be stale."""
+        idle = time.monotonic() - self._last_used
+        if self._healthy and idle < self._max_idle:
+            return
+
+        logger.info(
+            "Re-establishing connections (healthy=%s, idle for %.0fs)...",
+            self._healthy,
+            idle,
+        )
+        session = get_bot().session
+        if isinstance(session, KeepAliveSession) and session.is_open:
+            await session.close()
+
+        repo = Repository.get_current()
+        if repo is not None:
+            repo.reset_connections()
+        tenants.reset_connections()
+
+        self._healthy = True
@@ -0,0 +1,169 @@
+"""Scheduling of requests to rate-limited APIs."""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future
+from enum import IntEnum
+from heapq import heapify, heappop, heappush
+from itertools import count
+from typing import Callable, Hashable, Optional, TypeVar
+
+from .metrics import metrics
+
+logger = logging.getLogger()
+
+_T = TypeVar("_T")
+
+
+class Priority(IntEnum):
+    """Request priority, lower values are served first."""
+
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+class TokenBucket:
+    """Thread-safe token bucket, which hands out tokens
+    to the waiting threads in order of priority."""
+
+    def __init__(self, rate: float, capacity: float):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        self._waiters: list[tuple[int, int]] = []
+        self._seq = count()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed, self._updated = now - self._updated, now
+        self._tokens = min(
+            self._capacity, self._tokens + elapsed * self._rate
+        )
+
+    def acquire(self, priority: int = Priority.INTERACTIVE) -> float:
+        """Take a token, waiting until one is available and there are
+        no earlier waiters of the same or higher priority.
+        Return the time spent waiting, in seconds."""
+        started = time.monotonic()
+        entry = (priority, next(self._seq))
+        with self._cond:
+            heappush(self._waiters, entry)
+            try:
+                while True:
+                    self._refill()
+                    is_next = self._waiters[0] == entry
+                    if is_next and self._tokens >= 1:
+                        self._tokens -= 1
+                        return time.monotonic() - started
+
+                    timeout = None
+                    if is_next:
+                        timeout = (1 - self._tokens) / self._rate
+                    self._cond.wait(timeout)
+            finally:
+                if self._waiters[0] == entry:
+                    heappop(self._waiters)
+                else:
+                    self._waiters.remove(entry)
+                    heapify(self._waiters)
+                self._cond.notify_all()
+
+
+class RequestScheduler:  # pylint: disable=R0902
+    """Runs API calls within a per-minute quota, retrying transient
+    failures with exponential backoff and jitter. Concurrent calls
+    with the same key are coalesced into one, and waiting calls are
+    served in order of priority."""
+
+    def __init__(  # pylint: disable=R0913
+        self,
+        quota_per_minute: Optional[int] = None,
+        *,
+        burst: Optional[int] = None,
+        is_transient: Callable[[Exception], bool] = lambda _: False,
+        max_retries: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        name: str = "default",
+    ):
+        self._bucket: Optional[TokenBucket] = None
+        if quota_per_minute:
+            capacity = burst or max(1, quota_per_minute // 6)
+            self._bucket = TokenBucket(quota_per_minute / 60, capacity)
+
+        self._is_transient = is_transient
+        self._max_retries = max_retries
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._name = name
+
+        self._inflight: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def execute(
+        self,
+        func: Callable[[], _T],
+        *,
+        priority: int = Priority.INTERACTIVE,
+        key: Optional[Hashable] = None,
+    ) -> _T:
+        """Run the call, or wait for the result of the identical call
+        (i.e. the one with the same key) that is already running."""
+        if key is None:
+            return self._run(func, priority)
+
+        with self._lock:
+            future = self._inflight.get(key)
+            is_owner = future is None
+            if future is None:
+                future = self._inflight[key] = Future()
+
+        if not is_owner:
+            metrics.increment("CoalescedRequests", Scheduler=self._name)
+            return future.result()
+
+        try:
+            result = self._run(func, priority)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self._max_delay, self._base_delay * 2**attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _run(self, func: Callable[[], _T], priority: int) -> _T:
+        attempt = 0
+        while True:
+            if self._bucket is not None:
+                waited = self._bucket.acquire(priority)
+                metrics.observe(
+                    "ThrottledTime", waited * 1000, Scheduler=self._name
+                )
+
+            try:
+                return func()
+            except Exception as exc:  # pylint: disable=W0718
+                exhausted = attempt >= self._max_retries
+                if exhausted or not self._is_transient(exc):
+                    raise
+                delay = self._backoff(attempt)
+                attempt += 1
+
+            logger.warning(
+                "Transient failure (attempt %s), retrying in %.2fs...",
+                attempt,
+                delay,
+            )
+            metrics.increment("RequestRetries", Scheduler=self._name)
+            time.sleep(delay)
@@ -1,28 +1,215 @@
 """Utilities to handle secrets."""
 
-from functools import cache
-from typing import Any, Callable
+import asyncio
+import inspect
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, NamedTuple, Optional
 
+logger = logging.getLogger()
 
-class SecretsProvider:
-    """Central place to store and retrieve secrets."""
+DEFAULT_CACHE_PATH = "/tmp/expense-bot-secrets"
+
+
+class _Provider(NamedTuple):
+    func: Callable[[], Any]
+    ttl: Optional[float]
+
+
+class _Entry(NamedTuple):
+    value: Any
+    expires_at: float
+
+
+class SecretsProvider:  # pylint: disable=R0902
+    """Central place to store and retrieve secrets.
+
+    Providers may be plain or async callables. Secrets are cached after
+    the first lookup, and the ones registered with a TTL are refreshed
+    in the background once expired, while the stale value is still
+    served. The cache can be persisted to disk, encrypted with Fernet,
+    if `cryptography` is installed (see :meth:`configure_cache`)."""
 
     def __init__(self):
-        self._providers = {}
+        self._providers: dict[str, _Provider] = {}
+        self._cache: dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self._refreshing: set[str] = set()
+        self._tasks: set[asyncio.Task] = set()
+
+        self._cache_path: Optional[str] = None
+        self._fernet: Any = None
+        self._disk_loaded = False
 
     def __getitem__(self, key: str) -> Any:
-        return self._providers[key]()
+        entry = self._lookup(key)
+        if entry is not None:
+            return entry.value
 
-    def register(self, *, secret: str):
+        func = self._providers[key].func
+        if not inspect.iscoroutinefunction(func):
+            return self._store(key, func())
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return self._store(key, asyncio.run(func()))
+        # waiting for the provider here would block the running loop
+        raise RuntimeError(
+            f"Secret '{key}' has an async provider,"
+            " use `await secrets.get()` within an event loop"
+        )
+
+    async def get(self, key: str) -> Any:
+        """Retrieve a secret without blocking the event loop."""
+        entry = self._lookup(key)
+        if entry is not None:
+            return entry.value
+        return self._store(key, await self._call(key))
+
+    def register(self, *, secret: str, ttl: Optional[float] = None):
         """Register callable as a provider
         of a secret with a given name."""
 
         def wrapper(func: Callable[[], Any]):
-            self._providers[secret] = cache(func)
+            self._providers[secret] = _Provider(func, ttl)
             return func
 
         return wrapper
 
+    def configure_cache(
+        self, path: Optional[str] = None, key: Optional[str] = None
+    ) -> bool:
+        """Persist cached secrets to a file encrypted with a Fernet key,
+        read from `SECRETS_CACHE_PATH` and `SECRETS_CACHE_KEY` environment
+        variables by default. Return whether the disk cache is enabled."""
+        key = key or os.environ.get("SECRETS_CACHE_KEY")
+        if not key:
+            return False
+
+        try:
+            # pylint: disable-next=C0415
+            from cryptography.fernet import Fernet
+        except ImportError:
+            logger.warning("Secrets disk cache requires `cryptography`")
+            return False
+
+        self._fernet = Fernet(key)
+        self._cache_path = (
+            path or os.environ.get("SECRETS_CACHE_PATH") or DEFAULT_CACHE_PATH
+        )
+        self._disk_loaded = False
+        return True
+
+    async def prefetch(self, *keys: str):
+        """Fetch secrets (all registered ones by default) concurrently,
+        skipping the ones already cached. Failures are logged, so that
+        the secret is fetched again on first use."""
+        missing = [
+            key
+            for key in keys or list(self._providers)
+            if self._lookup(key) is None
+        ]
+        await asyncio.gather(*(self._refresh(key) for key in missing))
+
+    async def _call(self, key: str) -> Any:
+        func = self._providers[key].func
+        if inspect.iscoroutinefunction(func):
+            return await func()
+        return await asyncio.to_thread(func)
+
+    def _lookup(self, key: str) -> Optional[_Entry]:
+        if key not in self._providers:
+            raise KeyError(key)
+
+        self._load_disk_cache()
+        entry = self._cache.get(key)
+        if entry is not None and entry.expires_at <= time.time():
+            self._schedule_refresh(key)
+        return entry
+
+    def _store(self, key: str, value: Any) -> Any:
+        ttl = self._providers[key].ttl
+        expires_at = math.inf if ttl is None else time.time() + ttl
+        with self._lock:
+            self._cache[key] = _Entry(value, expires_at)
+        self._save_disk_cache()
+        return value
+
+    async def _refresh(self, key: str):
+        try:
+            self._store(key, await self._call(key))
+        except Exception:  # pylint: disable=W0718
+            logger.exception("Failed to fetch secret '%s'", key)
+        finally:
+            self._refreshing.discard(key)
+
+    def _schedule_refresh(self, key: str):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        logger.info("Refreshing secret '%s' in background", key)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            threading.Thread(
+                target=asyncio.run, args=(self._refresh(key),), daemon=True
+            ).start()
+            return
+
+        task = loop.create_task(self._refresh(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _load_disk_cache(self):
+        if self._fernet is None or self._disk_loaded:
+            return
+        self._disk_loaded = True
+
+        # pylint: disable-next=C0415
+        from cryptography.fernet import InvalidToken
+
+        try:
+            with open(self._cache_path or "", "rb") as f:
+                data = json.loads(self._fernet.decrypt(f.read()))
+        except FileNotFoundError:
+            return
+        except (InvalidToken, ValueError):
+            logger.warning("Ignoring unreadable secrets cache")
+            return
+
+        now = time.time()
+        with self._lock:
+            for key, (value, expires_at) in data.items():
+                if key not in self._cache and expires_at > now:
+                    self._cache[key] = _Entry(value, expires_at)
+
+    def _save_disk_cache(self):
+        if self._fernet is None or not self._cache_path:
+            return
+
+        with self._lock:
+            data = {}
+            for key, entry in self._cache.items():
+                try:
+                    json.dumps(entry.value)
+                except TypeError:
+                    continue
+                data[key] = list(entry)
+
+        token = self._fernet.encrypt(json.dumps(data).encode())
+        tmp_path = f"{self._cache_path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(token)
+        os.replace(tmp_path, self._cache_path)
+
 
 secrets = SecretsProvider()
 provides = secrets.register
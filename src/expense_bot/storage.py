@@ -0,0 +1,158 @@
+"""Durable storage for FSM states."""
+
+import asyncio
+import json
+import sqlite3
+from datetime import date
+from typing import Any, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import (
+    BaseStorage,
+    DefaultKeyBuilder,
+    KeyBuilder,
+    StateType,
+    StorageKey,
+)
+
+_Record = tuple[Optional[str], dict[str, Any]]
+
+JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "WAL")
+
+
+def _encode_value(obj: Any) -> Any:
+    if type(obj) is date:  # pylint: disable=C0123
+        return {"$d": obj.toordinal()}
+    raise TypeError(f"Object of type {type(obj).__name__} is not supported")
+
+
+def _decode_value(obj: dict[str, Any]) -> Any:
+    if obj.keys() == {"$d"}:
+        return date.fromordinal(obj["$d"])
+    return obj
+
+
+def encode_data(data: Mapping[str, Any]) -> str:
+    """Serialize FSM data as compact JSON, with dates as ordinals."""
+    return json.dumps(data, separators=(",", ":"), default=_encode_value)
+
+
+def decode_data(value: str) -> dict[str, Any]:
+    """Deserialize FSM data encoded by :func:`encode_data`."""
+    return json.loads(value, object_hook=_decode_value)
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM storage backed by a SQLite database file.
+
+    Records are cached in-process for as long as no other connection
+    modifies the database. Changes made while handling an update are
+    coalesced and written with a single statement per key once
+    the handler yields to the event loop, or on :meth:`flush`.
+
+    WAL journal mode relies on shared memory, which is not shared between
+    hosts on network file systems, e.g. EFS or NFS. Use `DELETE` journal
+    mode when the database is accessed by several hosts there."""
+
+    def __init__(
+        self,
+        path: str,
+        key_builder: Optional[KeyBuilder] = None,
+        journal_mode: str = "WAL",
+    ):
+        journal_mode = journal_mode.upper()
+        if journal_mode not in JOURNAL_MODES:
+            raise ValueError(
+                f"Unsupported journal mode '{journal_mode}',"
+                f" expected one of {JOURNAL_MODES}"
+            )
+
+        self._key_builder = key_builder or DefaultKeyBuilder(
+            with_destiny=True
+        )
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fsm ("
+            " key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL"
+            ") WITHOUT ROWID"
+        )
+
+        self._cache: dict[str, _Record] = {}
+        self._data_version = self._get_data_version()
+        self._dirty: set[str] = set()
+        self._flush_handle: Optional[asyncio.Handle] = None
+
+    def _get_data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _load(self, key: str) -> _Record:
+        data_version = self._get_data_version()
+        if data_version != self._data_version:
+            # another process has written to the database
+            self._data_version = data_version
+            self._cache = {k: self._cache[k] for k in self._dirty}
+
+        if key not in self._cache:
+            row = self._conn.execute(
+                "SELECT state, data FROM fsm WHERE key = ?", (key,)
+            ).fetchone()
+
+            record: _Record = (None, {})
+            if row:
+                record = (row[0], decode_data(row[1]))
+            self._cache[key] = record
+        return self._cache[key]
+
+    def _store(self, key: str, record: _Record):
+        self._cache[key] = record
+        self._dirty.add(key)
+
+        if self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_soon(self.flush)
+
+    def flush(self):
+        """Write pending changes to the database."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        for key in sorted(self._dirty):
+            state, data = self._cache[key]
+            if state is None and not data:
+                self._conn.execute("DELETE FROM fsm WHERE key = ?", (key,))
+            else:
+                self._conn.execute(
+                    "INSERT INTO fsm (key, state, data) VALUES (?, ?, ?)"
+                    " ON CONFLICT (key) DO UPDATE"
+                    " SET state = excluded.state, data = excluded.data",
+                    (key, state, encode_data(data)),
+                )
+        self._dirty.clear()
+        self._data_version = self._get_data_version()
+
+    async def set_state(self, key: StorageKey, state: StateType = None):
+        if isinstance(state, State):
+            state = state.state
+
+        key_str = self._key_builder.build(key)
+        _, data = self._load(key_str)
+        self._store(key_str, (state, data))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = self._load(self._key_builder.build(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]):
+        key_str = self._key_builder.build(key)
+        state, _ = self._load(key_str)
+        self._store(key_str, (state, dict(data)))
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        _, data = self._load(self._key_builder.build(key))
+        return dict(data)
+
+    async def close(self):
+        self.flush()
+        self._conn.close()
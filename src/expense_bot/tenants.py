@@ -0,0 +1,248 @@
+"""Routing of users and chats to their own repositories."""
+
+import asyncio
+import json
+import logging
+import os
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Iterable,
+    Iterator,
+    Optional,
+    Union,
+)
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from .metrics import metrics
+from .repository import Repository
+from .utils import LRUCache
+
+logger = logging.getLogger()
+
+# the only user allowed before multiple tenants were supported
+OWNER_ID = 288450274
+
+
+@dataclass(frozen=True)
+class Tenant:
+    """Repository configuration shared by a group of users and chats.
+    Tenants without a repository type use the default repository."""
+
+    name: str
+    repository: Optional[str] = None
+    options: tuple[tuple[str, Any], ...] = ()
+
+    def create_repository(self) -> Repository:
+        """Instantiate a repository of this tenant."""
+        assert self.repository, "Tenant uses the default repository"
+        return Repository.new(self.repository, **dict(self.options))
+
+
+def sender_ids(event: Union[CallbackQuery, Message]) -> list[int]:
+    """Ids of the user and the chat the event comes from."""
+    ids = []
+    if event.from_user:
+        ids.append(event.from_user.id)
+
+    message = event.message if isinstance(event, CallbackQuery) else event
+    if message:
+        ids.append(message.chat.id)
+    return ids
+
+
+class TenantRegistry:
+    """Maps user and chat ids to tenants, and keeps a bounded LRU pool
+    of live repositories (along with their credentials, connections
+    and caches), one per tenant. Repositories evicted from the pool
+    are closed in background, once they are no longer in use.
+    Repositories which keep records in memory are never evicted."""
+
+    def __init__(self, pool_size: int = 16):
+        self._members: dict[int, Tenant] = {}
+        self._pool: LRUCache[str, Repository] = LRUCache(
+            pool_size, name="Tenants", on_evict=self._on_evict
+        )
+        self._pinned: dict[str, Repository] = {}
+        # evicted repositories are closed once their last user is done
+        self._users: Counter[Repository] = Counter()
+        self._evicted: set[Repository] = set()
+        self._tasks: set[asyncio.Task] = set()
+
+    def __contains__(self, member_id: int) -> bool:
+        return member_id in self._members
+
+    def register(
+        self,
+        name: str,
+        ids: Iterable[int],
+        repository: Optional[str] = None,
+        **options: Any,
+    ) -> Tenant:
+        """Register a tenant with users and chats of given ids."""
+        tenant = Tenant(name, repository, tuple(sorted(options.items())))
+        for member_id in ids:
+            self._members[member_id] = tenant
+        self._discard(name)
+        return tenant
+
+    def configure(self, path: Optional[str] = None) -> bool:
+        """Replace registered tenants with the ones from a JSON file,
+        or from `TENANTS` environment variable, which map tenant names
+        to member `ids` and repository options, e.g.:
+
+            {"home": {"ids": [1, 2], "repository": "GoogleSheets",
+                      "spreadsheet_id": "..."}}
+
+        Return whether any configuration was found."""
+        path = path or os.environ.get("TENANTS_PATH")
+        if path:
+            with open(path, encoding="utf-8") as fin:
+                config = json.load(fin)
+        elif "TENANTS" in os.environ:
+            config = json.loads(os.environ["TENANTS"])
+        else:
+            return False
+
+        for tenant in self.all():
+            self._discard(tenant.name)
+        self._members.clear()
+        for name, options in config.items():
+            self.register(name, **options)
+        logger.info("Configured %s tenant(s)", len(config))
+        return True
+
+    def all(self) -> list[Tenant]:
+        """List registered tenants."""
+        return list(dict.fromkeys(self._members.values()))
+
+    def resolve(self, ids: Iterable[int]) -> Optional[Tenant]:
+        """Find the tenant by the first registered id."""
+        for member_id in ids:
+            tenant = self._members.get(member_id)
+            if tenant is not None:
+                return tenant
+        return None
+
+    def repository(self, tenant: Tenant) -> Repository:
+        """Get a live repository of the tenant from the pool,
+        creating one if needed."""
+        if not tenant.repository:
+            return Repository.current()
+
+        repo = self._pinned.get(tenant.name)
+        if repo is None:
+            repo = self._pool.get(tenant.name)
+        if repo is None:
+            logger.info("Creating repository of tenant '%s'", tenant.name)
+            repo = tenant.create_repository()
+            if repo.durable:
+                self._pool[tenant.name] = repo
+            else:
+                self._pinned[tenant.name] = repo
+        return repo
+
+    @contextmanager
+    def use(self, tenant: Tenant) -> Iterator[Repository]:
+        """Get a live repository of the tenant, which is not closed
+        until the block exits, even if it is evicted meanwhile."""
+        repo = self.repository(tenant)
+        self._users[repo] += 1
+        try:
+            yield repo
+        finally:
+            self._users[repo] -= 1
+            if not self._users[repo]:
+                del self._users[repo]
+                if repo in self._evicted:
+                    self._evicted.discard(repo)
+                    self._close(repo)
+
+    def live(self) -> list[Repository]:
+        """List live repositories of all tenants."""
+        return [*self._pinned.values(), *self._pool.values()]
+
+    def _discard(self, name: str):
+        repo = self._pinned.pop(name, None)
+        if repo is None:
+            repo = self._pool.pop(name)
+        if repo is not None:
+            self._on_evict(repo)
+
+    def _on_evict(self, repo: Repository):
+        if repo in self._users:
+            self._evicted.add(repo)
+        else:
+            self._close(repo)
+
+    def _close(self, repo: Repository):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            repo.close()
+            return
+
+        task = loop.create_task(repo.close_async())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def reset_connections(self):
+        """Drop connections of all live repositories."""
+        for repo in self.live():
+            repo.reset_connections()
+
+    async def flush_async(self):
+        """Persist buffered writes of all live repositories,
+        and wait for the evicted ones to be closed."""
+        await asyncio.gather(
+            *self._tasks,
+            *(repo.flush_async() for repo in self.live()),
+        )
+
+
+class TenantMiddleware(BaseMiddleware):  # pylint: disable=R0903
+    """Route events of every tenant to its own repository, which becomes
+    the current one, and add the tenant name to metric dimensions."""
+
+    def __init__(self, registry: TenantRegistry):
+        self._registry = registry
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        tenant = None
+        if isinstance(event, (CallbackQuery, Message)):
+            tenant = self._registry.resolve(sender_ids(event))
+        if tenant is None:
+            # unauthorized events are rejected by the filters
+            return await handler(event, data)
+
+        with (
+            metrics.dimensions(Tenant=tenant.name),
+            self._registry.use(tenant) as repo,
+        ):
+            token = Repository.set_current(repo)
+            try:
+                return await handler(event, data)
+            finally:
+                Repository.reset_current(token)
+
+
+tenants = TenantRegistry()
+tenants.register("default", [OWNER_ID])
+
+__all__ = [
+    "Tenant",
+    "TenantMiddleware",
+    "TenantRegistry",
+    "tenants",
+]
@@ -0,0 +1,703 @@
+"""In-process stand-ins for external services, for tests and benchmarks."""
+
+import json
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import suppress
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from .repositories.google import GoogleSheets, GoogleSheetsLedger, Scope
+
+_Cells = dict[tuple[int, int], Any]
+_Bounds = tuple[int, int, Optional[int], Optional[int]]
+
+_A1_CELL = re.compile(r"^([A-Z]*)(\d*)$")
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index - 1
+
+
+def _column_letters(index: int) -> str:
+    letters = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+@dataclass
+class _Sheet:
+    sheet_id: int
+    title: str
+    cells: _Cells = field(default_factory=dict)
+    # formats set with updateCells
+    formats: _Cells = field(default_factory=dict)
+
+    def last_row(self) -> int:
+        """Index of the last non-empty row."""
+        return max((row for row, _ in self.cells), default=-1)
+
+
+class _Request:
+    def __init__(self, fake: "FakeSpreadsheets", method: str, func: Callable):
+        self._fake = fake
+        self._method = method
+        self._func = func
+        # same as in the requests built by googleapiclient
+        # pylint: disable-next=C0103
+        self.methodId = f"sheets.spreadsheets.{method}"  # noqa: N815
+
+    def execute(self, **_: Any) -> Any:
+        """Run the request against the fake spreadsheet."""
+        return self._fake.execute(self._method, self._func)
+
+
+class _SheetsResource:
+    def __init__(self, fake: "FakeSpreadsheets"):
+        self._fake = fake
+
+    def copyTo(  # noqa: N802 pylint: disable=C0103
+        self, *, spreadsheetId: str, sheetId: int, body: dict, **_: Any
+    ) -> _Request:
+        """Copy a sheet within the spreadsheet."""
+        fake = self._fake
+        fake.check_id(spreadsheetId)
+
+        def copy_to():
+            source = fake.sheet_by_id(sheetId)
+            title = fake.unique_title(f"Copy of {source.title}")
+            sheet = fake.insert_sheet(
+                title, len(fake.worksheets), source.cells
+            )
+            return fake.properties(sheet)
+
+        assert body, "destination spreadsheet is required"
+        return _Request(fake, "sheets.copyTo", copy_to)
+
+
+class _ValuesResource:
+    # pylint: disable=C0103,W0613
+    def __init__(self, fake: "FakeSpreadsheets"):
+        self._fake = fake
+
+    def _request(self, spreadsheet_id: str, method: str, func: Callable):
+        self._fake.check_id(spreadsheet_id)
+        return _Request(self._fake, f"values.{method}", func)
+
+    def get(
+        self,
+        *,
+        spreadsheetId: str,
+        range: str,  # pylint: disable=W0622
+        valueRenderOption: str = "FORMATTED_VALUE",
+        **_: Any,
+    ) -> _Request:
+        """Read a range of values."""
+        fake = self._fake
+        return self._request(
+            spreadsheetId,
+            "get",
+            lambda: fake.read_range(range, valueRenderOption),
+        )
+
+    def batchGet(
+        self,
+        *,
+        spreadsheetId: str,
+        ranges: list[str],
+        valueRenderOption: str = "FORMATTED_VALUE",
+        **_: Any,
+    ) -> _Request:
+        """Read several ranges of values."""
+        fake = self._fake
+        return self._request(
+            spreadsheetId,
+            "batchGet",
+            lambda: {
+                "spreadsheetId": spreadsheetId,
+                "valueRanges": [
+                    fake.read_range(a1, valueRenderOption) for a1 in ranges
+                ],
+            },
+        )
+
+    def update(
+        self,
+        *,
+        spreadsheetId: str,
+        range: str,  # pylint: disable=W0622
+        body: dict,
+        valueInputOption: str,
+        **_: Any,
+    ) -> _Request:
+        """Write a range of values."""
+        fake = self._fake
+        return self._request(
+            spreadsheetId,
+            "update",
+            lambda: fake.write_range(range, body["values"], valueInputOption),
+        )
+
+    def batchUpdate(
+        self, *, spreadsheetId: str, body: dict, **_: Any
+    ) -> _Request:
+        """Write several ranges of values."""
+        fake = self._fake
+        return self._request(
+            spreadsheetId,
+            "batchUpdate",
+            lambda: {
+                "spreadsheetId": spreadsheetId,
+                "responses": [
+                    fake.write_range(
+                        data["range"],
+                        data["values"],
+                        body["valueInputOption"],
+                    )
+                    for data in body["data"]
+                ],
+            },
+        )
+
+    def append(
+        self,
+        *,
+        spreadsheetId: str,
+        range: str,  # pylint: disable=W0622
+        body: dict,
+        valueInputOption: str,
+        **_: Any,
+    ) -> _Request:
+        """Append rows after the last row of a table."""
+        fake = self._fake
+        return self._request(
+            spreadsheetId,
+            "append",
+            lambda: {
+                "spreadsheetId": spreadsheetId,
+                "updates": fake.append_rows(
+                    range, body["values"], valueInputOption
+                ),
+            },
+        )
+
+    def clear(
+        self,
+        *,
+        spreadsheetId: str,
+        range: str,  # pylint: disable=W0622
+        **_: Any,
+    ) -> _Request:
+        """Clear a range of values."""
+        fake = self._fake
+        return self._request(
+            spreadsheetId, "clear", lambda: fake.clear_range(range)
+        )
+
+
+class FakeSpreadsheets:  # pylint: disable=R0902
+    """Stand-in for the `spreadsheets()` resource of Google Sheets API,
+    which keeps the whole spreadsheet in memory.
+
+    Every executed request is counted per API method in `calls`,
+    and can be delayed by `latency` seconds, or rejected with
+    HTTP 429 once more than `quota_per_minute` requests were made
+    within the last minute. Formulas are stored, but not evaluated.
+    """
+
+    def __init__(
+        self,
+        spreadsheet_id: str = "fake-spreadsheet",
+        *,
+        latency: float = 0.0,
+        quota_per_minute: Optional[int] = None,
+        template_sheet: str = "TEMPLATE",
+    ):
+        self.spreadsheet_id = spreadsheet_id
+        self.latency = latency
+        self.quota_per_minute = quota_per_minute
+
+        self.calls: Counter[str] = Counter()
+        self.worksheets: list[_Sheet] = []
+
+        self._lock = threading.Lock()
+        self._history: deque[float] = deque()
+        self._failures: deque[tuple[int, bool, Optional[str]]] = deque()
+        self._next_sheet_id = 0
+
+        self.add_sheet("Notes", {"D2": [["=100"]]})
+        self.add_sheet(
+            template_sheet,
+            {
+                "A1": [["=SUM(D5:G35)"]],
+                "B4": [["Date", "Weekday", "#1", "#2", "#3", "#4", "Notes"]],
+            },
+        )
+
+    # pylint: disable=C0103
+
+    def get(self, *, spreadsheetId: str, **_: Any) -> _Request:
+        """Read spreadsheet metadata."""
+        self.check_id(spreadsheetId)
+        return _Request(
+            self,
+            "get",
+            lambda: {
+                "spreadsheetId": spreadsheetId,
+                "sheets": [
+                    {"properties": self.properties(sheet)}
+                    for sheet in self.worksheets
+                ],
+            },
+        )
+
+    def batchUpdate(self, *, spreadsheetId: str, body: dict) -> _Request:
+        """Apply structural changes to the spreadsheet."""
+        self.check_id(spreadsheetId)
+
+        requests = body["requests"]
+        if isinstance(requests, dict):
+            requests = [requests]
+
+        def batch_update():
+            return {
+                "spreadsheetId": spreadsheetId,
+                "replies": [self._apply(request) for request in requests],
+            }
+
+        return _Request(self, "batchUpdate", batch_update)
+
+    def sheets(self) -> _SheetsResource:
+        """Access `sheets()` sub-resource."""
+        return _SheetsResource(self)
+
+    def values(self) -> _ValuesResource:
+        """Access `values()` sub-resource."""
+        return _ValuesResource(self)
+
+    # pylint: enable=C0103
+
+    @property
+    def total_calls(self) -> int:
+        """Number of executed requests."""
+        return sum(self.calls.values())
+
+    def reset_calls(self):
+        """Reset request counters."""
+        with self._lock:
+            self.calls.clear()
+
+    def fail_next(
+        self,
+        count: int = 1,
+        *,
+        status: int = 429,
+        applied: bool = False,
+        method: Optional[str] = None,
+    ):
+        """Reject the next `count` requests (of a given method, if any)
+        with given HTTP status, after applying them if `applied` is set,
+        like a request which timed out on the way back."""
+        with self._lock:
+            self._failures.extend(
+                (status, applied, method) for _ in range(count)
+            )
+
+    def add_sheet(
+        self, title: str, values: Optional[dict[str, list[list]]] = None
+    ) -> int:
+        """Create a sheet and fill it with values, keyed by top-left cell."""
+        sheet = self.insert_sheet(title, len(self.worksheets), {})
+        for cell, rows in (values or {}).items():
+            self.write_range(f"'{title}'!{cell}", rows, "USER_ENTERED")
+        return sheet.sheet_id
+
+    def execute(self, method: str, func: Callable) -> Any:
+        """Account for the request, then run it."""
+        with self._lock:
+            self.calls[method] += 1
+            status: Optional[int] = None
+            applied = False
+            if self._failures and self._failures[0][2] in (None, method):
+                status, applied, _ = self._failures.popleft()
+
+            now = time.monotonic()
+            while self._history and self._history[0] <= now - 60:
+                self._history.popleft()
+            quota = self.quota_per_minute
+            if quota is not None and len(self._history) >= quota:
+                status = status or 429
+            self._history.append(now)
+
+        if self.latency:
+            time.sleep(self.latency)
+        if status is not None:
+            if applied:
+                with self._lock:
+                    func()
+            raise self._http_error(status, f"Request to {method} failed")
+
+        with self._lock:
+            return func()
+
+    @staticmethod
+    def _http_error(status: int, message: str) -> HttpError:
+        content = {"error": {"code": status, "message": message}}
+        return HttpError(
+            httplib2.Response({"status": status}),
+            json.dumps(content).encode(),
+        )
+
+    def check_id(self, spreadsheet_id: str):
+        """Validate spreadsheet id."""
+        if spreadsheet_id != self.spreadsheet_id:
+            raise self._http_error(404, "Requested entity was not found.")
+
+    def properties(self, sheet: _Sheet) -> dict:
+        """Describe sheet properties."""
+        return {
+            "sheetId": sheet.sheet_id,
+            "title": sheet.title,
+            "index": self.worksheets.index(sheet),
+            "sheetType": "GRID",
+        }
+
+    def sheet_by_id(self, sheet_id: int) -> _Sheet:
+        """Find sheet by its id."""
+        for sheet in self.worksheets:
+            if sheet.sheet_id == sheet_id:
+                return sheet
+        raise self._http_error(400, f"No sheet with id: {sheet_id}")
+
+    def sheet_by_title(self, title: str) -> _Sheet:
+        """Find sheet by its title."""
+        for sheet in self.worksheets:
+            if sheet.title == title:
+                return sheet
+        raise self._http_error(400, f"Unable to parse range: {title}")
+
+    def unique_title(self, title: str) -> str:
+        """Make sure the title is not taken by another sheet."""
+        titles = {sheet.title for sheet in self.worksheets}
+        candidate, num = title, 1
+        while candidate in titles:
+            num += 1
+            candidate = f"{title} {num}"
+        return candidate
+
+    def insert_sheet(
+        self,
+        title: str,
+        index: int,
+        cells: _Cells,
+        sheet_id: Optional[int] = None,
+    ) -> _Sheet:
+        """Insert a new sheet with a copy of given cells."""
+        if any(sheet.title == title for sheet in self.worksheets):
+            raise self._http_error(
+                400, f"A sheet with the name '{title}' already exists."
+            )
+
+        if sheet_id is None:
+            sheet_id = self._next_sheet_id
+        self._next_sheet_id = max(self._next_sheet_id, sheet_id) + 1
+
+        sheet = _Sheet(sheet_id, title, dict(cells))
+        self.worksheets.insert(index, sheet)
+        return sheet
+
+    def _parse_range(self, a1: str) -> tuple[_Sheet, _Bounds]:
+        title, _, cells = a1.rpartition("!")
+        if not title:
+            title, cells = cells, ""
+        if title.startswith("'") and title.endswith("'"):
+            title = title[1:-1].replace("''", "'")
+
+        sheet = self.sheet_by_title(title)
+        if not cells:
+            return sheet, (0, 0, None, None)
+
+        first, _, last = cells.partition(":")
+        row0, col0 = self._parse_cell(first, a1)
+        row1, col1 = self._parse_cell(last or first, a1)
+        return sheet, (
+            row0 or 0,
+            col0 or 0,
+            None if row1 is None else row1 + 1,
+            None if col1 is None else col1 + 1,
+        )
+
+    def _parse_cell(
+        self, ref: str, a1: str
+    ) -> tuple[Optional[int], Optional[int]]:
+        match = _A1_CELL.match(ref)
+        if not match:
+            raise self._http_error(400, f"Unable to parse range: {a1}")
+
+        letters, digits = match.groups()
+        return (
+            int(digits) - 1 if digits else None,
+            _column_index(letters) if letters else None,
+        )
+
+    @staticmethod
+    def _parse_value(value: Any, value_input_option: str) -> Any:
+        if value_input_option == "USER_ENTERED" and isinstance(value, str):
+            for convert in (int, float):
+                with suppress(ValueError):
+                    return convert(value)
+        return value
+
+    @staticmethod
+    def _render(value: Any, value_render_option: str) -> Any:
+        if value_render_option == "FORMATTED_VALUE":
+            return str(value)
+        return value
+
+    def read_range(self, a1: str, value_render_option: str) -> dict:
+        """Read values in a given range, with trailing
+        empty cells and rows omitted like the real API does."""
+        sheet, (row0, col0, row1, col1) = self._parse_range(a1)
+        if row1 is None:
+            row1 = sheet.last_row() + 1
+        if col1 is None:
+            col1 = max((col + 1 for _, col in sheet.cells), default=0)
+
+        rows = []
+        for row in range(row0, row1):
+            vals = [
+                (
+                    self._render(sheet.cells[row, col], value_render_option)
+                    if (row, col) in sheet.cells
+                    else ""
+                )
+                for col in range(col0, col1)
+            ]
+            while vals and vals[-1] == "":
+                vals.pop()
+            rows.append(vals)
+
+        while rows and not rows[-1]:
+            rows.pop()
+
+        result: dict[str, Any] = {"range": a1, "majorDimension": "ROWS"}
+        if rows:
+            result["values"] = rows
+        return result
+
+    def write_range(
+        self, a1: str, rows: list[list], value_input_option: str
+    ) -> dict:
+        """Write values into a given range."""
+        sheet, (row0, col0, _, _) = self._parse_range(a1)
+        for i, vals in enumerate(rows):
+            for j, value in enumerate(vals):
+                key = (row0 + i, col0 + j)
+                value = self._parse_value(value, value_input_option)
+                if value in ("", None):
+                    sheet.cells.pop(key, None)
+                else:
+                    sheet.cells[key] = value
+
+        return {
+            "updatedRange": a1,
+            "updatedRows": len(rows),
+            "updatedCells": sum(len(vals) for vals in rows),
+        }
+
+    def append_rows(
+        self, a1: str, rows: list[list], value_input_option: str
+    ) -> dict:
+        """Write values after the last non-empty row of a table."""
+        sheet, (row0, col0, _, col1) = self._parse_range(a1)
+        columns = range(col0, col0 + 26 if col1 is None else col1)
+
+        start = max(
+            (row + 1 for row, col in sheet.cells if col in columns),
+            default=row0,
+        )
+        start = max(start, row0)
+
+        title = sheet.title.replace("'", "''")
+        target = f"'{title}'!{_column_letters(col0)}{start + 1}"
+        return self.write_range(target, rows, value_input_option)
+
+    def clear_range(self, a1: str) -> dict:
+        """Clear values in a given range."""
+        sheet, bounds = self._parse_range(a1)
+        self._clear(sheet, bounds)
+        return {"clearedRange": a1}
+
+    @staticmethod
+    def _clear(
+        sheet: _Sheet, bounds: _Bounds, cells: Optional[_Cells] = None
+    ):
+        cells = sheet.cells if cells is None else cells
+        row0, col0, row1, col1 = bounds
+        for row, col in list(cells):
+            in_rows = row0 <= row and (row1 is None or row < row1)
+            in_cols = col0 <= col and (col1 is None or col < col1)
+            if in_rows and in_cols:
+                del cells[row, col]
+
+    def _apply(self, request: dict) -> dict:
+        (kind, params), *rest = request.items()
+        assert not rest, "Each request must contain a single operation"
+
+        handler = getattr(self, f"_apply_{kind}", None)
+        if handler is None:
+            raise self._http_error(400, f"Unsupported request: {kind}")
+        return handler(params)
+
+    def _apply_updateSheetProperties(self, params: dict) -> dict:
+        # pylint: disable=C0103
+        props = params["properties"]
+        fields = {name.strip() for name in params["fields"].split(",")}
+
+        sheet = self.sheet_by_id(props["sheetId"])
+        if "title" in fields and sheet.title != props["title"]:
+            if any(s.title == props["title"] for s in self.worksheets):
+                raise self._http_error(
+                    400, f"A sheet named '{props['title']}' already exists."
+                )
+            sheet.title = props["title"]
+        if "index" in fields:
+            self.worksheets.remove(sheet)
+            self.worksheets.insert(props["index"], sheet)
+        return {}
+
+    def _apply_duplicateSheet(self, params: dict) -> dict:
+        # pylint: disable=C0103
+        source = self.sheet_by_id(params["sourceSheetId"])
+        title = params.get("newSheetName") or self.unique_title(
+            f"Copy of {source.title}"
+        )
+        sheet = self.insert_sheet(
+            title,
+            params.get("insertSheetIndex", len(self.worksheets)),
+            source.cells,
+            params.get("newSheetId"),
+        )
+        return {"duplicateSheet": {"properties": self.properties(sheet)}}
+
+    def _apply_addSheet(self, params: dict) -> dict:
+        # pylint: disable=C0103
+        props = params.get("properties", {})
+        sheet = self.insert_sheet(
+            props.get("title") or self.unique_title("Sheet"),
+            props.get("index", len(self.worksheets)),
+            {},
+            props.get("sheetId"),
+        )
+        return {"addSheet": {"properties": self.properties(sheet)}}
+
+    def _apply_deleteSheet(self, params: dict) -> dict:
+        # pylint: disable=C0103
+        self.worksheets.remove(self.sheet_by_id(params["sheetId"]))
+        return {}
+
+    # pylint: disable-next=R0914
+    def _apply_updateCells(self, params: dict) -> dict:
+        # pylint: disable=C0103
+        fields = {name.strip() for name in params["fields"].split(",")}
+        # values and number formats of the cells are kept separately
+        targets = {}
+        if "userEnteredFormat.numberFormat" in fields:
+            fields.remove("userEnteredFormat.numberFormat")
+            targets["userEnteredFormat"] = "formats"
+        supported = ({"userEnteredValue"}, {"pivotTable"})
+        assert fields in supported, "Not supported"
+        targets[fields.pop()] = "cells"
+
+        if "range" in params:
+            grid = params["range"]
+        else:
+            start = params["start"]
+            grid = {
+                "sheetId": start["sheetId"],
+                "startRowIndex": start.get("rowIndex", 0),
+                "startColumnIndex": start.get("columnIndex", 0),
+            }
+
+        sheet = self.sheet_by_id(grid["sheetId"])
+        row0 = grid.get("startRowIndex", 0)
+        col0 = grid.get("startColumnIndex", 0)
+        bounds = (
+            row0,
+            col0,
+            grid.get("endRowIndex"),
+            grid.get("endColumnIndex"),
+        )
+        for name, attr in targets.items():
+            cells = getattr(sheet, attr)
+            if "range" in params:
+                self._clear(sheet, bounds, cells)
+            for i, row in enumerate(params.get("rows", [])):
+                for j, cell in enumerate(row.get("values", [])):
+                    self._set(cells, (row0 + i, col0 + j), cell, name)
+        return {}
+
+    @staticmethod
+    def _set(cells: _Cells, pos: tuple[int, int], cell: dict, name: str):
+        entered = cell.get(name)
+        if not entered:
+            cells.pop(pos, None)
+        elif name == "userEnteredValue":
+            ((_, value),) = entered.items()
+            cells[pos] = value
+        else:
+            # formats and pivot tables are kept as is, and never evaluated
+            cells[pos] = entered
+
+
+class FakeGoogleSheets(GoogleSheets):
+    """Google Sheets-backed repository which talks
+    to a :class:`FakeSpreadsheets` instead of the real API."""
+
+    def __init__(
+        self, spreadsheets: Optional[FakeSpreadsheets] = None, **kwargs: Any
+    ):
+        self.spreadsheets = spreadsheets or FakeSpreadsheets()
+        # throttle requests only if the fake enforces a quota
+        kwargs.setdefault(
+            "quota_per_minute", self.spreadsheets.quota_per_minute
+        )
+        kwargs.setdefault("retry_delay", 0.01)
+        super().__init__(self.spreadsheets.spreadsheet_id, **kwargs)
+
+    @staticmethod
+    def _credentials_info():
+        return None
+
+    @staticmethod
+    def _load_credentials(info: Any):
+        return None
+
+    def _sheet_service_with_scope(  # type: ignore[override]
+        self, creds: Any, scope: Scope
+    ):  # pylint: disable=W0221
+        return self.spreadsheets
+
+
+# pylint: disable-next=R0901,W0223
+class FakeGoogleSheetsLedger(FakeGoogleSheets, GoogleSheetsLedger):
+    """Ledger-backed repository which talks
+    to a :class:`FakeSpreadsheets` instead of the real API."""
+
+
+__all__ = [
+    "FakeGoogleSheets",
+    "FakeGoogleSheetsLedger",
+    "FakeSpreadsheets",
+]
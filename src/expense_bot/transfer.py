@@ -0,0 +1,225 @@
+"""Bulk import and export of expense records as CSV or JSONL files."""
+
+import asyncio
+import csv
+import io
+import json
+import math
+from datetime import date
+from itertools import islice
+from typing import IO, Any, Iterable, Iterator, NamedTuple, Optional, TypeVar
+
+from .model import EARN, SPEND, Category, ExpenseItem
+from .repository import Records, Repository
+from .utils import parse_date
+
+_T = TypeVar("_T")
+# line number, date and item of a valid row
+_Row = tuple[int, date, ExpenseItem]
+# date and category which the room of a repository is counted by
+_Slot = tuple[date, Category]
+
+FILE_FORMATS = ("csv", "jsonl")
+FIELDS = ["date", "amount", "vendor", "category"]
+BATCH_SIZE = 500
+
+
+class InvalidRecord(ValueError):
+    """Exception to indicate that a record cannot be imported."""
+
+
+class ImportResult(NamedTuple):
+    """Outcome of an import: number of imported records
+    and descriptions of the skipped ones."""
+
+    imported: int
+    errors: list[str]
+
+
+def file_format(filename: str) -> str:
+    """Determine file format by the name extension."""
+    suffix = filename.rpartition(".")[2].lower()
+    if suffix not in FILE_FORMATS:
+        raise ValueError(
+            f"Unsupported file '{filename}', expected one of {FILE_FORMATS}"
+        )
+    return suffix
+
+
+def read_rows(lines: Iterable[str], fmt: str) -> Iterator[tuple[int, Any]]:
+    """Lazily split a CSV file with a header row, or a JSONL file,
+    into raw rows along with their line numbers."""
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_num, line in enumerate(lines, start=1):
+        if line.strip():
+            yield line_num, line
+
+
+def parse_record(raw: Any) -> tuple[date, ExpenseItem]:
+    """Validate a raw row and convert it into a dated expense item."""
+    try:
+        row = json.loads(raw) if isinstance(raw, str) else raw
+        dt = parse_date(str(row["date"]))
+        amt = float(row["amount"])
+        vnd = str(row["vendor"]).strip()
+        cat = Category[str(row.get("category") or SPEND.name).upper()]
+    except KeyError as exc:
+        raise InvalidRecord(f"missing or unknown value {exc}") from None
+    except (AttributeError, TypeError, ValueError) as exc:
+        raise InvalidRecord(str(exc)) from None
+
+    if not math.isfinite(amt):
+        raise InvalidRecord(f"invalid amount {amt}")
+    if not vnd:
+        raise InvalidRecord("empty vendor")
+    return dt, ExpenseItem(amt, vnd, cat)
+
+
+def validate(
+    rows: Iterable[tuple[int, Any]], errors: list[str]
+) -> Iterator[_Row]:
+    """Lazily convert raw rows into dated expense items along with
+    their line numbers, skipping invalid rows and describing them
+    in `errors`."""
+    for line_num, raw in rows:
+        try:
+            yield (line_num, *parse_record(raw))
+        except InvalidRecord as exc:
+            errors.append(f"line {line_num}: {exc}")
+
+
+def _slot(dt: date, cat: Category) -> _Slot:
+    return (dt.replace(day=1) if cat is EARN else dt), cat
+
+
+def _count_room(
+    repo: Repository, batch: list[_Row], rooms: dict[_Slot, Optional[int]]
+):
+    """Look up the room left in the repository for the slots
+    of a batch, which are not counted yet."""
+    for _, dt, item in batch:
+        slot = _slot(dt, item.cat)
+        if slot not in rooms:
+            rooms[slot] = repo.room_for(*slot)
+
+
+def _fit(
+    batch: list[_Row], rooms: dict[_Slot, Optional[int]], errors: list[str]
+) -> list[tuple[date, ExpenseItem]]:
+    """Take items of a batch which fit into the room left,
+    describing the rest in `errors`."""
+    fitting = []
+    for line_num, dt, item in batch:
+        slot = _slot(dt, item.cat)
+        room = rooms[slot]
+        if room is not None:
+            if room <= 0:
+                errors.append(
+                    f"line {line_num}: no room left"
+                    f" for {item.cat.name} items on {dt}"
+                )
+                continue
+            rooms[slot] = room - 1
+        fitting.append((dt, item))
+    return fitting
+
+
+def batched(iterable: Iterable[_T], size: int) -> Iterator[list[_T]]:
+    """Split iterable into lists of a given size (the last may be shorter)."""
+    it = iter(iterable)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+def import_records(
+    repo: Repository,
+    lines: Iterable[str],
+    fmt: str,
+    *,
+    batch_size: int = BATCH_SIZE,
+) -> ImportResult:
+    """Stream records from the lines of a file into the repository.
+    Records which do not fit into the repository, e.g. a day with
+    too many items, are skipped before anything is written."""
+    errors: list[str] = []
+    rooms: dict[_Slot, Optional[int]] = {}
+    imported = 0
+    for batch in batched(validate(read_rows(lines, fmt), errors), batch_size):
+        _count_room(repo, batch, rooms)
+        imported += repo.add_many(_fit(batch, rooms, errors))
+    repo.flush()
+    return ImportResult(imported, errors)
+
+
+async def import_records_async(
+    repo: Repository,
+    lines: Iterable[str],
+    fmt: str,
+    *,
+    batch_size: int = BATCH_SIZE,
+) -> ImportResult:
+    """Stream records from the lines of a file into the repository
+    without blocking the event loop on the repository writes."""
+    errors: list[str] = []
+    rooms: dict[_Slot, Optional[int]] = {}
+    imported = 0
+    for batch in batched(validate(read_rows(lines, fmt), errors), batch_size):
+        await asyncio.to_thread(_count_room, repo, batch, rooms)
+        imported += await repo.add_many_async(_fit(batch, rooms, errors))
+    await repo.flush_async()
+    return ImportResult(imported, errors)
+
+
+def import_file(
+    repo: Repository, path: str, fmt: Optional[str] = None
+) -> ImportResult:
+    """Import records from a CSV or JSONL file."""
+    with open(path, encoding="utf-8", newline="") as fin:
+        return import_records(repo, fin, fmt or file_format(path))
+
+
+def _csv_line(values: list[Any]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerow(values)
+    return buffer.getvalue()
+
+
+def format_record(dt: date, item: ExpenseItem, fmt: str) -> str:
+    """Format a dated expense item as a line of a CSV or JSONL file."""
+    values = [dt.isoformat(), item.amt, item.vnd, item.cat.name]
+    if fmt == "csv":
+        return _csv_line(values)
+    return json.dumps(dict(zip(FIELDS, values, strict=True))) + "\n"
+
+
+def export_records(records: Records, fout: IO[str], fmt: str) -> int:
+    """Stream dated expense items into a file,
+    and return the number of records written."""
+    if fmt == "csv":
+        fout.write(_csv_line(FIELDS))
+
+    count = 0
+    for dt, item in records:
+        fout.write(format_record(dt, item, fmt))
+        count += 1
+    return count
+
+
+def export_file(
+    repo: Repository,
+    start: date,
+    end: date,
+    path: str,
+    fmt: Optional[str] = None,
+) -> int:
+    """Export records between two dates (inclusive)
+    into a CSV or JSONL file."""
+    with open(path, "w", encoding="utf-8", newline="") as fout:
+        return export_records(
+            repo.get_range(start, end), fout, fmt or file_format(path)
+        )
@@ -1,10 +1,27 @@
 """Utility functions and helpers."""
 
+import calendar
 import logging
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
 from contextlib import suppress
-from datetime import date, datetime, timedelta
-from typing import Any, Iterable, Type, TypeVar
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import (
+    Any,
+    Callable,
+    Generic,
+    Iterable,
+    NamedTuple,
+    Optional,
+    Type,
+    TypeVar,
+)
+
+from .metrics import metrics
 
 
 def setup_logging():
@@ -17,10 +34,11 @@ def setup_logging():
     )
 
 
-setup_logging()
 logger = logging.getLogger()
 
 _T = TypeVar("_T")
+_K = TypeVar("_K")
+_V = TypeVar("_V")
 
 
 def all_subclasses(cls: type) -> Iterable[type]:
@@ -47,19 +65,326 @@ class FactoryMixin:  # pylint: disable=R0903
         )
 
 
+class CacheInfo(NamedTuple):
+    """Cache statistics, similar to :func:`functools.lru_cache`."""
+
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class LRUCache(Generic[_K, _V]):  # pylint: disable=R0902
+    """Thread-safe LRU cache with optional expiration of entries.
+    Hits and misses of a named cache are also reported as metrics,
+    and values evicted to make room for new ones are passed
+    to `on_evict` callback, if any."""
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: Optional[float] = None,
+        name: Optional[str] = None,
+        on_evict: Optional[Callable[[_V], Any]] = None,
+    ):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._name = name
+        self._on_evict = on_evict
+        self._data: OrderedDict[_K, tuple[float, _V]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = self._misses = 0
+
+    def get(self, key: _K) -> Optional[_V]:
+        """Get cached value and mark it as recently used,
+        or return None if there is no fresh value."""
+        with self._lock:
+            expiry, value = self._data.get(key, (0.0, None))
+            if value is None or expiry < time.monotonic():
+                self._data.pop(key, None)
+                self._misses += 1
+                value = None
+            else:
+                self._data.move_to_end(key)
+                self._hits += 1
+
+        if self._name:
+            metrics.increment(
+                "CacheMisses" if value is None else "CacheHits",
+                Cache=self._name,
+            )
+        return value
+
+    def __setitem__(self, key: _K, value: _V):
+        expiry = float("inf")
+        if self._ttl is not None:
+            expiry = time.monotonic() + self._ttl
+
+        evicted = []
+        with self._lock:
+            self._data[key] = (expiry, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self._maxsize:
+                evicted.append(self._data.popitem(last=False)[1][1])
+
+        if self._on_evict is not None:
+            for old in evicted:
+                self._on_evict(old)
+
+    def pop(self, key: _K) -> Optional[_V]:
+        """Remove value from the cache, and return it if any."""
+        with self._lock:
+            _, value = self._data.pop(key, (0.0, None))
+        return value
+
+    def values(self) -> list[_V]:
+        """List cached values, including the expired ones."""
+        with self._lock:
+            return [value for _, value in self._data.values()]
+
+    def clear(self):
+        """Remove all values from the cache."""
+        with self._lock:
+            self._data.clear()
+
+    def cache_info(self) -> CacheInfo:
+        """Report cache statistics."""
+        with self._lock:
+            return CacheInfo(
+                self._hits, self._misses, self._maxsize, len(self._data)
+            )
+
+
 FORMATS = ["%Y-%m-%d", "%Y%m%d", "%m/%d/%Y", "%m/%d/%y"]
 
+# names of months and weekdays in the current locale
+_MONTHS = {
+    name.lower(): i
+    for names in (calendar.month_name, calendar.month_abbr)
+    for i, name in enumerate(names)
+    if name
+}
+_WEEKDAYS = {
+    name.lower(): i
+    for names in (calendar.day_name, calendar.day_abbr)
+    for i, name in enumerate(names)
+}
+
+
+def _alternatives(names: Iterable[str]) -> str:
+    # longest first, so that `june` is not matched as `jun`
+    return "|".join(map(re.escape, sorted(names, key=len, reverse=True)))
+
+
+# the same sub-patterns as `datetime.strptime` uses for the directives
+_FIELDS = {
+    "Y": r"\d{4}",
+    "y": r"\d\d",
+    "m": r"1[0-2]|0[1-9]|[1-9]",
+    "d": r"3[01]|[12]\d|0[1-9]|[1-9]",
+    "W": r"5[0-3]|[0-4]\d",
+    "b": _alternatives(_MONTHS),
+}
+
+# equivalents of `FORMATS`, followed by formats with month names
+_DATE_FORMATS = [
+    "{Y}-{m}-{d}",
+    "{Y}{m}{d}",
+    "{m}/{d}/{Y}",
+    "{m}/{d}/{y}",
+    r"{d}\.{m}\.{Y}",
+    r"{b}\.? {d},? {Y}",
+    r"{d} {b}\.?,? {Y}",
+]
+_WEEK_FORMATS = ["{Y}-?w{W}"]
+_MONTH_FORMATS = ["{Y}-{m}", r"{b}\.? {Y}"]
+_YEAR_FORMATS = ["{Y}"]
+
+
+def _compile(formats: list[str]) -> re.Pattern:
+    """Combine formats into a single pattern. Fields of i-th format
+    are captured by groups named `f{i}{field}`."""
+    return re.compile(
+        "|".join(
+            fmt.format(
+                **{
+                    field: f"(?P<f{i}{field}>{pattern})"
+                    for field, pattern in _FIELDS.items()
+                }
+            )
+            for i, fmt in enumerate(formats)
+        ),
+        re.IGNORECASE,
+    )
+
+
+_DATE_RE = _compile(_DATE_FORMATS)
+_WEEK_RE = _compile(_WEEK_FORMATS)
+_MONTH_RE = _compile(_MONTH_FORMATS)
+_YEAR_RE = _compile(_YEAR_FORMATS)
+_DAYS_AGO_RE = re.compile(r"-(\d+)([dw])|(\d+) (day|week)s? ago")
+_WEEKDAY_RE = re.compile(rf"(last )?({_alternatives(_WEEKDAYS)})")
+_MONTH_NAME_RE = re.compile(_FIELDS["b"])
+_PERIOD_RE = re.compile(r"(this|last) (week|month|year)")
+
+
+def _fields(match: Optional[re.Match]) -> Optional[dict[str, str]]:
+    if match is None:
+        return None
+    return {
+        name[-1]: value
+        for name, value in match.groupdict().items()
+        if value is not None
+    }
+
+
+def _year(fields: dict[str, str]) -> int:
+    if "Y" in fields:
+        return int(fields["Y"])
+    # same pivot year as `datetime.strptime`
+    year = int(fields["y"])
+    return year + (2000 if year < 69 else 1900)
+
 
-def parse_date(value: str) -> date:
-    """Parse provided string as date."""
+def _month(fields: dict[str, str]) -> int:
+    if "m" in fields:
+        return int(fields["m"])
+    return _MONTHS[fields["b"].lower()]
+
+
+def _month_range(year: int, month: int) -> tuple[date, date]:
+    days = calendar.monthrange(year, month)[1]
+    return date(year, month, 1), date(year, month, days)
+
+
+@lru_cache(maxsize=1024)
+def _parse_absolute_date(value: str) -> Optional[date]:
+    fields = _fields(_DATE_RE.fullmatch(value))
+    if fields is None:
+        return None
+    return date(_year(fields), _month(fields), int(fields["d"]))
+
+
+def _parse_relative_date(value: str, today: Optional[date]) -> Optional[date]:
+    today = today or date.today()
     if value == "today":
-        return date.today()
+        return today
     if value == "yesterday":
-        return date.today() - timedelta(days=1)
+        return today - timedelta(days=1)
 
-    for fmt in FORMATS:
-        with suppress(ValueError):
-            return datetime.strptime(value, fmt).date()
-    raise ValueError(
-        f"time data '{value}' does not match any of the formats {FORMATS}"
-    )
+    match = _DAYS_AGO_RE.fullmatch(value)
+    if match:
+        count, unit = match[1] or match[3], match[2] or match[4]
+        return today - timedelta(
+            days=int(count) * (7 if unit[0] == "w" else 1)
+        )
+
+    match = _WEEKDAY_RE.fullmatch(value)
+    if match:
+        days = (today.weekday() - _WEEKDAYS[match[2]]) % 7
+        if match[1] and not days:
+            days = 7
+        return today - timedelta(days=days)
+    return None
+
+
+@lru_cache(maxsize=1024)
+def _parse_absolute_range(value: str) -> Optional[tuple[date, date]]:
+    fields = _fields(_WEEK_RE.fullmatch(value))
+    if fields:
+        start = date.fromisocalendar(int(fields["Y"]), int(fields["W"]), 1)
+        return start, start + timedelta(days=6)
+
+    fields = _fields(_MONTH_RE.fullmatch(value))
+    if fields:
+        return _month_range(_year(fields), _month(fields))
+
+    fields = _fields(_YEAR_RE.fullmatch(value))
+    if fields:
+        return date(_year(fields), 1, 1), date(_year(fields), 12, 31)
+    return None
+
+
+def _parse_relative_range(
+    value: str, today: date
+) -> Optional[tuple[date, date]]:
+    if _MONTH_NAME_RE.fullmatch(value):
+        return _month_range(today.year, _MONTHS[value])
+
+    match = _PERIOD_RE.fullmatch(value)
+    if match is None:
+        return None
+
+    unit = match[2]
+    if match[1] == "this":
+        starts = {
+            "week": today - timedelta(days=today.weekday()),
+            "month": today.replace(day=1),
+            "year": today.replace(month=1, day=1),
+        }
+        return starts[unit], today
+
+    # the whole previous week, month or year
+    if unit == "week":
+        start = today - timedelta(days=today.weekday() + 7)
+        return start, start + timedelta(days=6)
+    if unit == "month":
+        end = today.replace(day=1) - timedelta(days=1)
+        return end.replace(day=1), end
+    return date(today.year - 1, 1, 1), date(today.year - 1, 12, 31)
+
+
+def parse_date(value: str, today: Optional[date] = None) -> date:
+    """Parse provided string as date, either absolute, e.g. `2024-01-31`,
+    `1/31/24` or `Jan 31, 2024`, or relative, e.g. `yesterday`, `-3d`
+    or `last friday`. Absolute dates are memoized."""
+    value = value.strip().lower()
+
+    result = _parse_absolute_date(value)
+    if result is None:
+        result = _parse_relative_date(value, today)
+    if result is None:
+        raise ValueError(
+            f"time data '{value}' does not match any of the formats {FORMATS}"
+        )
+    return result
+
+
+def _parse_bounds(value: str, today: Optional[date]) -> tuple[date, date]:
+    with suppress(ValueError):
+        dt = parse_date(value, today)
+        return dt, dt
+
+    value = value.strip().lower()
+    result = _parse_absolute_range(value)
+    if result is None:
+        result = _parse_relative_range(value, today or date.today())
+    if result is None:
+        raise ValueError(f"'{value}' is neither a date nor a period")
+    return result
+
+
+def parse_date_range(
+    value: str, today: Optional[date] = None
+) -> tuple[date, date]:
+    """Parse provided string as an inclusive range of dates,
+    e.g. `2024-01-01..2024-01-31`, `jan..mar`, `2024-W05`
+    or `last month`, or as a single date."""
+    first, sep, last = value.partition("..")
+
+    start, end = _parse_bounds(first, today)
+    if sep:
+        _, end = _parse_bounds(last, today)
+    if start > end:
+        raise ValueError(f"range '{value}' ends before it starts")
+    return start, end
+
+
+def parse_period(
+    value: str, today: Optional[date] = None
+) -> tuple[date, date]:
+    """Parse provided string as the current `week`, `month` or `year`
+    up to today, or as a range of dates."""
+    if value in ("week", "month", "year"):
+        value = f"this {value}"
+    return parse_date_range(value, today)
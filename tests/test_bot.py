@@ -0,0 +1,202 @@
+import asyncio
+import json
+from datetime import date
+from importlib import import_module
+
+import pytest
+from aiogram import Dispatcher
+from aiogram.methods import SendMessage
+
+from expense_bot import tenants
+from expense_bot.commands.common import (
+    auth_required,
+    configure_error_handling,
+)
+from expense_bot.model import ExpenseItem
+from expense_bot.repositories import InMemory
+from expense_bot.repository import Repository
+from expense_bot.tenants import TenantRegistry
+from expense_bot.testing import FakeGoogleSheets, FakeSpreadsheets
+
+# the package re-exports the bot client under the same name
+bot = import_module("expense_bot.bot")
+
+
+def _update(update_id, chat_id):
+    return {
+        "update_id": update_id,
+        "message": {"message_id": update_id, "chat": {"id": chat_id}},
+    }
+
+
+@pytest.fixture
+def processed(monkeypatch):
+    processed = []
+
+    async def feed_update(values):
+        # give other chats a chance to run in between
+        await asyncio.sleep(0.05 if bot.chat_key(values) == 1 else 0)
+        if values["update_id"] == 2:
+            raise RuntimeError("boom")
+        processed.append(values["update_id"])
+
+    monkeypatch.setattr(bot, "_feed_update", feed_update)
+
+    token = Repository.set_current(InMemory())
+    yield processed
+    Repository.reset_current(token)
+
+
+def _callback(update_id, user_id, data):
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": "A"},
+            "chat_instance": "1",
+            "data": data,
+        },
+    }
+
+
+def test_chat_key():
+    callback = {
+        "update_id": 1,
+        "callback_query": {
+            "from": {"id": 5},
+            "message": {"chat": {"id": 7}},
+        },
+    }
+    assert bot.chat_key(callback) == 7
+    assert bot.chat_key({"update_id": 1, "inline_query": {"from": {"id": 5}}})
+    assert bot.chat_key({"update_id": 1}) is None
+
+
+def test_batch_of_records_keeps_per_chat_order(processed):
+    event = {
+        "Records": [
+            {"messageId": f"m{i}", "body": json.dumps(_update(i, chat))}
+            for i, chat in [(1, 1), (2, 1), (3, 1), (4, 2), (5, 2)]
+        ]
+    }
+
+    result = asyncio.run(bot.handle_lambda_event(event))
+
+    assert result == {
+        "batchItemFailures": [
+            {"itemIdentifier": "m2"},
+            {"itemIdentifier": "m3"},
+        ]
+    }
+    # chat 2 is processed concurrently and finishes first
+    assert processed == [4, 5, 1]
+
+
+def test_array_of_updates(processed):
+    event = {"body": json.dumps([_update(4, 2), _update(5, 1)])}
+
+    result = asyncio.run(bot.handle_lambda_event(event))
+
+    assert result == {"batchItemFailures": []}
+    assert sorted(processed) == [4, 5]
+
+
+def test_single_update(processed):
+    event = {"body": json.dumps(_update(4, 2))}
+
+    assert asyncio.run(bot.handle_lambda_event(event)) is None
+    assert processed == [4]
+
+
+def test_writes_are_flushed_at_the_end_of_invocation(monkeypatch):
+    sheets = FakeSpreadsheets()
+    repo = FakeGoogleSheets(sheets, flush_interval=60)
+
+    async def feed_update(values):
+        await Repository.current().add_async(
+            ExpenseItem(1.0, "Cafe"), dt=date(2024, 2, 3)
+        )
+        assert "values.batchUpdate" not in sheets.calls
+
+    monkeypatch.setattr(bot, "_feed_update", feed_update)
+    token = Repository.set_current(repo)
+    try:
+        event = {"body": json.dumps(_update(4, 2))}
+        asyncio.run(bot.handle_lambda_event(event))
+    finally:
+        Repository.reset_current(token)
+
+    assert sheets.calls["values.batchUpdate"] == 1
+
+
+def test_single_update_answered_inline(monkeypatch):
+    async def feed_update(values):
+        return SendMessage(chat_id=2, text="hi", protect_content=True)
+
+    monkeypatch.setattr(bot, "_feed_update", feed_update)
+    token = Repository.set_current(InMemory())
+    try:
+        event = {"body": json.dumps(_update(4, 2))}
+        result = asyncio.run(bot.handle_lambda_event(event))
+    finally:
+        Repository.reset_current(token)
+
+    assert result["statusCode"] == 200
+    assert json.loads(result["body"]) == {
+        "method": "sendMessage",
+        "chat_id": 2,
+        "text": "hi",
+        "protect_content": True,
+    }
+
+
+def test_scheduled_event_provisions_months(processed):
+    event = {"source": "aws.events", "detail-type": "Scheduled Event"}
+
+    assert asyncio.run(bot.handle_lambda_event(event)) == {"provisioned": []}
+    assert not processed
+
+
+@pytest.mark.filterwarnings("ignore::UserWarning")
+def test_handled_errors_are_retried(monkeypatch):
+    dp = Dispatcher()
+
+    @dp.callback_query(auth_required)
+    async def callback(query):
+        if query.data == "fail":
+            raise RuntimeError("boom")
+
+    configure_error_handling(dp)
+    monkeypatch.setattr(bot, "get_dispatcher", lambda: dp)
+
+    records = [
+        (f"m{i}", _callback(i, user_id, data))
+        for i, user_id, data in [
+            (1, tenants.OWNER_ID, "fail"),
+            (2, tenants.OWNER_ID, "ok"),
+            (3, 5, "ok"),
+            (4, tenants.OWNER_ID + 1, "fail"),
+        ]
+    ]
+
+    # unauthorized users are rejected without retries
+    assert asyncio.run(bot.feed_batch(records)) == ["m1", "m2"]
+
+
+def test_every_tenant_is_provisioned(monkeypatch):
+    registry = TenantRegistry(pool_size=1)
+    spreadsheets = [FakeSpreadsheets() for _ in range(2)]
+    for i, fake in enumerate(spreadsheets):
+        registry.register(str(i), [i], "FakeGoogleSheets", spreadsheets=fake)
+    monkeypatch.setattr(bot, "tenants", registry)
+
+    token = Repository.set_current(InMemory())
+    try:
+        created = asyncio.run(bot.provision_months(2, date(2024, 2, 10)))
+    finally:
+        Repository.reset_current(token)
+
+    assert created == ["2024-02", "2024-03"]
+    for fake in spreadsheets:
+        titles = {sheet.title for sheet in fake.worksheets}
+        assert {"02/24", "03/24"} <= titles
@@ -0,0 +1,40 @@
+from datetime import date, timedelta
+
+from expense_bot.commands.show import MAX_MESSAGE_LENGTH, render_report
+from expense_bot.model import EARN, ExpenseItem
+
+
+def test_render_report_single_message():
+    dt = date(2024, 2, 3)
+    items = [
+        (dt, ExpenseItem(1.5, "Cafe")),
+        (dt, ExpenseItem(100, "Paycheck", EARN)),
+        (dt, ExpenseItem(2.25, "Taxi")),
+    ]
+
+    (page,) = render_report(dt, dt, items)
+    text = page.render()[0]
+
+    assert text.splitlines() == [
+        "02/03/2024",
+        "Cafe                      $1.50",
+        "Paycheck               +$100.00",
+        "Taxi                      $2.25",
+        "Total: $3.75, earned: $100.00",
+    ]
+
+
+def test_render_report_splits_long_ranges():
+    start = date(2024, 1, 1)
+    items = [
+        (start + timedelta(days=i // 4), ExpenseItem(i, f"Vendor {i}"))
+        for i in range(400)
+    ]
+
+    pages = render_report(start, start + timedelta(days=99), items)
+    texts = [page.render()[0] for page in pages]
+
+    assert len(pages) > 1
+    assert all(len(text) <= MAX_MESSAGE_LENGTH for text in texts)
+    assert texts[0].startswith("01/01/2024 - 04/09/2024 (1/")
+    assert sum(text.count("Vendor") for text in texts) == 400
@@ -0,0 +1,427 @@
+import asyncio
+import time
+from datetime import date
+
+import pytest
+from googleapiclient.errors import HttpError
+
+from expense_bot.model import EARN, ExpenseItem
+from expense_bot.testing import (
+    FakeGoogleSheets,
+    FakeGoogleSheetsLedger,
+    FakeSpreadsheets,
+)
+
+
+@pytest.fixture
+def sheets():
+    return FakeSpreadsheets()
+
+
+@pytest.fixture
+def repo(sheets):
+    return FakeGoogleSheets(sheets)
+
+
+def test_add_creates_month_sheet(repo, sheets):
+    repo.add(ExpenseItem(12.5, "Grocery"), dt=date(2024, 2, 3))
+    repo.flush()
+
+    titles = [sheet.title for sheet in sheets.worksheets]
+    assert titles == ["Notes", "02/24", "TEMPLATE"]
+
+    dates = sheets.read_range("02/24!B5:B35", "FORMULA")["values"]
+    assert len(dates) == 29
+    assert dates[0] == [45323]  # serial number of 02/01/2024
+    (sheet,) = [
+        sheet for sheet in sheets.worksheets if sheet.title == "02/24"
+    ]
+    assert sheet.formats == {
+        (row, 1): {"numberFormat": {"type": "DATE"}}
+        for row in range(4, 4 + 29)
+    }
+
+    row = sheets.read_range("02/24!D7:H7", "UNFORMATTED_VALUE")["values"]
+    assert row == [[12.5, "", "", "", "Grocery"]]
+
+    formula = sheets.read_range("Notes!D2", "FORMULA")["values"]
+    assert formula == [["=100-'02/24'!A1"]]
+
+
+def test_provision_creates_sheet_in_one_batch(repo, sheets):
+    sheets.add_sheet("02/24")
+    repo.provision(date(2024, 2, 10))
+    sheets.reset_calls()
+
+    assert repo.provision(date(2024, 3, 10))
+    assert not repo.provision(date(2024, 3, 1))
+    # metadata is re-fetched once to make sure the sheet is missing
+    assert sheets.calls == {"get": 1, "values.get": 1, "batchUpdate": 1}
+
+    titles = [sheet.title for sheet in sheets.worksheets]
+    assert titles == ["Notes", "03/24", "TEMPLATE", "02/24"]
+    formula = sheets.read_range("Notes!D2", "FORMULA")["values"]
+    assert formula == [["=100-'03/24'!A1"]]
+
+
+def test_failed_sheet_creation_is_not_repeated(repo, sheets):
+    sheets.fail_next(status=503, applied=True, method="batchUpdate")
+
+    assert repo.provision(date(2024, 3, 10))
+
+    titles = [sheet.title for sheet in sheets.worksheets]
+    assert titles == ["Notes", "03/24", "TEMPLATE"]
+    assert sheets.calls["batchUpdate"] == 1
+    assert not repo.provision(date(2024, 3, 1))
+
+
+def test_missing_sheets_are_cached(repo, sheets):
+    sheets.add_sheet("02/24")
+    start, end = date(2024, 1, 1), date(2024, 12, 31)
+
+    for _ in range(3):
+        assert not list(repo.get_range(start, end))
+    repo.summarize(start, end)
+
+    assert sheets.calls["get"] == 1
+
+
+def test_metadata_is_refreshed_once_expired(sheets):
+    repo = FakeGoogleSheets(sheets, metadata_ttl=0.1)
+    dt = date(2024, 2, 3)
+    assert not list(repo.get_range(dt, dt))
+
+    sheets.add_sheet("02/24", {"D7": [[1, "", "", "", "Cafe"]]})
+    assert not list(repo.get_range(dt, dt))
+    assert sheets.calls["get"] == 1
+
+    time.sleep(0.1)
+    assert list(repo.get_range(dt, dt)) == [(dt, ExpenseItem(1, "Cafe"))]
+    assert sheets.calls["get"] == 2
+
+
+def test_sheets_added_elsewhere_are_not_created_again(repo, sheets):
+    dt = date(2024, 2, 3)
+    assert not list(repo.get_range(dt, dt))
+    other = FakeGoogleSheets(sheets)
+    other.add(ExpenseItem(1.0, "Cafe"), dt=dt)
+    other.flush()
+
+    repo.add(ExpenseItem(2.0, "Taxi"), dt=dt)
+    repo.flush()
+
+    assert [sheet.title for sheet in sheets.worksheets].count("02/24") == 1
+    assert FakeGoogleSheets(sheets).get_all(dt=dt) == [
+        ExpenseItem(1.0, "Cafe"),
+        ExpenseItem(2.0, "Taxi"),
+    ]
+
+
+def test_credentials_are_reloaded_once_refreshed(sheets, monkeypatch):
+    secret = [{"version": 1}]
+    loaded = []
+
+    def load_credentials(info):
+        loaded.append(info)
+        return info
+
+    monkeypatch.setattr(
+        FakeGoogleSheets, "_credentials_info", staticmethod(lambda: secret[0])
+    )
+    monkeypatch.setattr(
+        FakeGoogleSheets, "_load_credentials", staticmethod(load_credentials)
+    )
+    repo = FakeGoogleSheets(sheets)
+    repo.add(ExpenseItem(1, "Cafe"), dt=date(2024, 2, 3))
+    repo.flush()
+    assert loaded == [{"version": 1}]
+
+    secret[0] = {"version": 2}
+    repo.refresh()
+    assert list(repo.get_all(dt=date(2024, 2, 3))) == [ExpenseItem(1, "Cafe")]
+    assert loaded == [{"version": 1}, {"version": 2}]
+    assert repo.creds == {"version": 2}
+
+
+def test_add_call_budget(repo, sheets):
+    repo.add(ExpenseItem(1.0, "Cafe"), dt=date(2024, 2, 3))
+    repo.flush()
+    sheets.reset_calls()
+
+    repo.add(ExpenseItem(2.0, "Taxi"), dt=date(2024, 2, 3))
+    repo.add(ExpenseItem(3.0, "Paycheck", EARN), dt=date(2024, 2, 9))
+    repo.flush()
+
+    assert sheets.calls == {"values.batchUpdate": 1}
+
+
+def test_full_buffer_is_flushed(sheets):
+    sheets.add_sheet("02/24")
+    repo = FakeGoogleSheets(sheets, flush_size=2)
+
+    repo.add(ExpenseItem(1.0, "Cafe"), dt=date(2024, 2, 3))
+    assert "values.batchUpdate" not in sheets.calls
+
+    repo.add(ExpenseItem(2.0, "Taxi"), dt=date(2024, 2, 4))
+    assert sheets.calls["values.batchUpdate"] == 1
+    assert sheets.read_range("02/24!D7:H8", "UNFORMATTED_VALUE")[
+        "values"
+    ] == [[1.0, "", "", "", "Cafe"], [2.0, "", "", "", "Taxi"]]
+
+
+def test_pending_writes_are_flushed_in_background(sheets):
+    sheets.add_sheet("02/24")
+    repo = FakeGoogleSheets(sheets, flush_interval=0.05)
+
+    async def main():
+        await repo.add_async(ExpenseItem(1.0, "Cafe"), dt=date(2024, 2, 3))
+        await repo.add_async(ExpenseItem(2.0, "Taxi"), dt=date(2024, 2, 3))
+        assert "values.batchUpdate" not in sheets.calls
+        await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+
+    assert sheets.calls["values.batchUpdate"] == 1
+    assert sheets.read_range("02/24!D7:H7", "UNFORMATTED_VALUE")[
+        "values"
+    ] == [[1.0, 2.0, "", "", "Cafe, Taxi"]]
+
+
+def test_reads_see_pending_writes(repo, sheets):
+    repo.add(ExpenseItem(1.0, "Cafe"), dt=date(2024, 2, 3))
+    repo.add(ExpenseItem(2.0, "Taxi"), dt=date(2024, 2, 3))
+
+    assert "values.batchUpdate" not in sheets.calls
+    assert repo.get_all(dt=date(2024, 2, 3)) == [
+        ExpenseItem(1.0, "Cafe"),
+        ExpenseItem(2.0, "Taxi"),
+    ]
+
+
+def test_reads_see_flushed_writes_into_new_sheets(repo, sheets):
+    repo.add(ExpenseItem(1.0, "Cafe"), dt=date(2024, 2, 3))
+    repo.flush()
+    sheets.reset_calls()
+
+    assert repo.get_all(dt=date(2024, 2, 3)) == [ExpenseItem(1.0, "Cafe")]
+    assert not sheets.calls
+
+
+def test_get_all_reads_whole_month_once(repo, sheets):
+    sheets.add_sheet("03/24", {"D5": [[1, 2, "", "", "Cafe, Taxi"]]})
+    sheets.add_sheet("04/24")
+
+    for day in range(1, 32):
+        repo.get_all(dt=date(2024, 3, day))
+
+    assert sheets.calls == {"get": 1, "values.batchGet": 1}
+    assert repo.month_cache_info().hits == 30
+    assert repo.get_all(dt=date(2024, 3, 1)) == [
+        ExpenseItem(1, "Cafe"),
+        ExpenseItem(2, "Taxi"),
+    ]
+
+
+def test_get_range_batches_months(repo, sheets):
+    sheets.add_sheet("01/24", {"D3": [[100, "", "", "", "Paycheck"]]})
+    sheets.add_sheet("02/24", {"D33": [[5, "", "", "", "Cafe"]]})
+
+    items = list(repo.get_range(date(2023, 12, 1), date(2024, 2, 29)))
+
+    assert sheets.calls["values.batchGet"] == 1
+    assert items == [
+        (date(2024, 1, 1), ExpenseItem(100, "Paycheck", EARN)),
+        (date(2024, 2, 29), ExpenseItem(5, "Cafe")),
+    ]
+
+
+def test_add_async_does_not_block(sheets):
+    sheets.latency = 0.05
+    repo = FakeGoogleSheets(sheets, flush_size=1)
+    sheets.add_sheet("02/24")
+
+    async def main():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        await repo.add_async(ExpenseItem(1.0, "Cafe"), dt=date(2024, 2, 1))
+        ticker.cancel()
+        return ticks
+
+    assert asyncio.run(main()) > 0
+    assert sheets.calls["values.batchUpdate"] == 1
+
+
+def test_async_reads_run_concurrently(sheets):
+    sheets.add_sheet("02/24")
+    sheets.add_sheet("03/24")
+    repo = FakeGoogleSheets(sheets)
+    repo.refresh()
+    repo.provision(date(2024, 2, 1))
+    sheets.latency = 0.1
+
+    async def main():
+        return await asyncio.gather(
+            repo.get_all_async(dt=date(2024, 2, 3)),
+            repo.get_all_async(dt=date(2024, 3, 3)),
+        )
+
+    started = time.perf_counter()
+    assert asyncio.run(main()) == [[], []]
+    assert time.perf_counter() - started < 0.19
+    assert sheets.calls["values.batchGet"] == 2
+
+
+def test_transient_errors_are_retried(repo, sheets):
+    sheets.add_sheet("02/24")
+    repo.get_all(dt=date(2024, 2, 1))
+    repo._months.clear()  # pylint: disable=W0212
+    sheets.reset_calls()
+    sheets.fail_next(2, status=503)
+
+    assert repo.get_all(dt=date(2024, 2, 3)) == []
+    assert sheets.calls == {"values.batchGet": 3}
+
+
+def test_quota_errors_are_raised_after_retries(sheets):
+    repo = FakeGoogleSheets(sheets, max_retries=2)
+    sheets.fail_next(3, status=429)
+
+    with pytest.raises(HttpError) as err:
+        repo.get_all(dt=date(2024, 2, 3))
+
+    assert err.value.status_code == 429
+    assert sheets.calls["get"] == 3
+
+
+def test_client_errors_are_not_retried(repo, sheets):
+    sheets.fail_next(status=400)
+
+    with pytest.raises(HttpError):
+        repo.get_all(dt=date(2024, 2, 3))
+
+    assert sheets.calls["get"] == 1
+
+
+def test_concurrent_reads_are_coalesced(sheets):
+    sheets.latency = 0.05
+    sheets.add_sheet("02/24")
+    repo = FakeGoogleSheets(sheets)
+    repo.get_all(dt=date(2024, 2, 1))  # warm up metadata cache
+    repo._months.clear()  # pylint: disable=W0212
+
+    async def main():
+        await asyncio.gather(
+            *(repo.get_all_async(dt=date(2024, 2, day)) for day in (1, 2, 3))
+        )
+
+    sheets.reset_calls()
+    asyncio.run(main())
+    assert sheets.calls == {"values.batchGet": 1}
+
+
+def test_ledger_writes_are_single_appends(sheets):
+    repo = FakeGoogleSheetsLedger(sheets)
+    assert repo.provision(date(2024, 2, 1))
+    sheets.reset_calls()
+
+    for amt in range(1, 7):
+        repo.add(ExpenseItem(amt, "Cafe"), dt=date(2024, 2, 3))
+    repo.flush()
+
+    assert sheets.calls == {"values.append": 1}
+    rows = sheets.read_range("Ledger!A1:D9", "UNFORMATTED_VALUE")["values"]
+    assert rows[0] == ["Date", "Amount", "Vendor", "Category"]
+    assert rows[6] == ["2024-02-03", 6, "Cafe", "SPEND"]
+
+    pivot = sheets.sheet_by_title("Monthly").cells[0, 0]
+    assert (
+        pivot["source"]["sheetId"] == sheets.sheet_by_title("Ledger").sheet_id
+    )
+
+
+def test_ledger_reads_are_ordered_by_date(sheets):
+    repo = FakeGoogleSheetsLedger(sheets, pivot_sheet=None)
+    repo.add(ExpenseItem(3, "Taxi"), dt=date(2024, 2, 9))
+    repo.add(ExpenseItem(100, "Paycheck", EARN), dt=date(2024, 2, 1))
+    repo.flush()
+    repo.add(ExpenseItem(1, "Cafe"), dt=date(2024, 2, 3))
+
+    start, end = date(2024, 2, 1), date(2024, 2, 8)
+    expected = [
+        (date(2024, 2, 1), ExpenseItem(100, "Paycheck", EARN)),
+        (date(2024, 2, 3), ExpenseItem(1, "Cafe")),
+    ]
+    assert list(repo.get_range(start, end)) == expected
+    assert "Monthly" not in [sheet.title for sheet in sheets.worksheets]
+
+    repo.flush()
+    other = FakeGoogleSheetsLedger(sheets)
+    assert other.get_all(dt=date(2024, 2, 9)) == [ExpenseItem(3, "Taxi")]
+    assert list(other.get_range(start, end)) == expected
+
+
+def _ledger_rows(sheets):
+    values = sheets.read_range("Ledger!A2:D", "UNFORMATTED_VALUE")
+    return [row for row in values.get("values", []) if row]
+
+
+def test_failed_ledger_appends_are_not_duplicated(sheets):
+    repo = FakeGoogleSheetsLedger(sheets, pivot_sheet=None)
+    repo.provision(date(2024, 2, 1))
+    repo.add(ExpenseItem(1, "Cafe"), dt=date(2024, 2, 3))
+    sheets.reset_calls()
+    sheets.fail_next(status=503, applied=True)
+
+    repo.flush()
+
+    assert sheets.calls == {"values.append": 1, "values.get": 1}
+    assert _ledger_rows(sheets) == [["2024-02-03", 1, "Cafe", "SPEND"]]
+
+
+def test_ledger_append_is_checked_after_retries(sheets):
+    repo = FakeGoogleSheetsLedger(sheets, pivot_sheet=None, max_retries=0)
+    repo.provision(date(2024, 2, 1))
+    repo.add(ExpenseItem(1, "Cafe"), dt=date(2024, 2, 3))
+    sheets.fail_next(status=503, applied=True)
+
+    with pytest.raises(HttpError):
+        repo.flush()
+    repo.add(ExpenseItem(2, "Taxi"), dt=date(2024, 2, 4))
+    repo.flush()
+
+    assert _ledger_rows(sheets) == [
+        ["2024-02-03", 1, "Cafe", "SPEND"],
+        ["2024-02-04", 2, "Taxi", "SPEND"],
+    ]
+
+
+def test_ledger_replace_day(sheets):
+    repo = FakeGoogleSheetsLedger(sheets, pivot_sheet=None)
+    for amt, day in [(1, 3), (2, 4), (3, 3)]:
+        repo.add(ExpenseItem(amt, "Cafe"), dt=date(2024, 2, day))
+    repo.flush()
+
+    repo.replace_day(date(2024, 2, 3), [ExpenseItem(5, "Taxi")])
+    repo.replace_day(
+        date(2024, 2, 4), [ExpenseItem(i, "Bus") for i in (6, 7)]
+    )
+    repo.flush()
+
+    assert _ledger_rows(sheets) == [
+        ["2024-02-03", 5, "Taxi", "SPEND"],
+        ["2024-02-04", 6, "Bus", "SPEND"],
+        ["2024-02-04", 7, "Bus", "SPEND"],
+    ]
+    other = FakeGoogleSheetsLedger(sheets)
+    assert other.get_all(dt=date(2024, 2, 3)) == [ExpenseItem(5, "Taxi")]
+    assert repo.get_all(dt=date(2024, 2, 4)) == [
+        ExpenseItem(6, "Bus"),
+        ExpenseItem(7, "Bus"),
+    ]
@@ -0,0 +1,87 @@
+from datetime import date
+
+import pytest
+
+from expense_bot.metrics import MetricsRegistry, metrics
+from expense_bot.model import ExpenseItem
+from expense_bot.testing import FakeGoogleSheets, FakeSpreadsheets
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_registry_counters_and_histograms():
+    registry = MetricsRegistry()
+    registry.increment("Calls", Method="get")
+    registry.increment("Calls", 2, Method="batchGet")
+    for value in [1, 3, 30, 300]:
+        registry.observe("Latency", value, Handler="cmd_show")
+
+    assert registry.counter("Calls", Method="batchGet") == 2
+    assert registry.counter("Calls") == 3
+
+    histogram = registry.histogram("Latency", Handler="cmd_show")
+    assert histogram.count == 4
+    assert histogram.mean == 83.5
+    assert histogram.quantile(0.5) == 5
+    assert histogram.quantile(1) == 300
+
+
+def test_emf_documents():
+    registry = MetricsRegistry(namespace="Test")
+    registry.increment("Calls", Method="get")
+    registry.observe("Latency", 12.5, Method="get")
+    registry.increment("Errors")
+
+    docs = sorted(registry.emf_documents(), key=len)
+
+    assert docs[0]["Errors"] == 1
+    assert docs[0]["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [[]]
+    assert docs[1]["Method"] == "get"
+    assert docs[1]["Calls"] == 1
+    assert docs[1]["Latency"] == {"Values": [12.5], "Counts": [1]}
+    assert docs[1]["_aws"]["CloudWatchMetrics"] == [
+        {
+            "Namespace": "Test",
+            "Dimensions": [["Method"]],
+            "Metrics": [
+                {"Name": "Calls", "Unit": "Count"},
+                {"Name": "Latency", "Unit": "Milliseconds"},
+            ],
+        }
+    ]
+
+    registry.flush()
+    assert not registry.emf_documents()
+
+
+def test_emf_values_keep_true_counts():
+    registry = MetricsRegistry()
+    for i in range(1000):
+        registry.observe("Latency", 1 + i % 2 * 2)
+
+    (doc,) = registry.emf_documents()
+
+    assert doc["Latency"] == {"Values": [1, 3], "Counts": [500, 500]}
+
+
+def test_google_sheets_calls_are_recorded():
+    sheets = FakeSpreadsheets()
+    sheets.add_sheet("02/24")
+    repo = FakeGoogleSheets(sheets)
+
+    repo.get_all(dt=date(2024, 2, 3))
+    repo.get_all(dt=date(2024, 2, 4))
+    repo.add(ExpenseItem(1.0, "Cafe"), dt=date(2024, 2, 3))
+    repo.flush()
+
+    assert metrics.counter("SheetsCalls", Method="get") == 1
+    assert metrics.counter("SheetsCalls", Method="values.batchGet") == 1
+    assert metrics.counter("SheetsCalls", Method="values.batchUpdate") == 1
+    assert metrics.histogram("SheetsCallLatency", Method="get").count == 1
+    assert metrics.counter("CacheHits", Cache="SheetsMonths") == 2
+    assert metrics.counter("CacheMisses", Cache="SheetsMonths") == 1
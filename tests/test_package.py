@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import expense_bot
+
+# run in a fresh interpreter without the bot token or the token file
+LAZY_IMPORT = """
+import sys
+from importlib import import_module
+
+import expense_bot
+
+heavy = ["aiogram", "googleapiclient", "expense_bot.repositories"]
+assert not [name for name in heavy if name in sys.modules]
+
+expense_bot.InMemory()
+assert "expense_bot.repositories" in sys.modules
+assert "googleapiclient" not in sys.modules
+
+bot = import_module("expense_bot.bot")
+assert bot.get_bot.cache_info().currsize == 0
+assert bot.get_dispatcher.cache_info().currsize == 0
+"""
+
+
+def test_import_is_lazy_and_side_effect_free(tmp_path):
+    env = {k: v for k, v in os.environ.items() if k != "BOT_TOKEN"}
+    env["PYTHONPATH"] = os.pathsep.join(sys.path)
+
+    result = subprocess.run(
+        [sys.executable, "-c", LAZY_IMPORT],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+
+    assert result.returncode == 0, result.stderr
+
+
+def test_unknown_attribute():
+    with pytest.raises(AttributeError):
+        expense_bot.missing  # pylint: disable=W0104
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import signal
+
+import pytest
+from aiogram.types import Update
+
+from expense_bot import polling
+from expense_bot.polling import PollingRunner
+
+
+def _update(update_id, chat_id):
+    return Update.model_validate(
+        {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": 0,
+                "chat": {"id": chat_id, "type": "private"},
+            },
+        }
+    )
+
+
+class FakeBot:
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.offsets = []
+        self.confirmed = []
+
+    async def delete_webhook(self, drop_pending_updates=False):
+        return True
+
+    async def get_updates(self, offset=None, timeout=None, **kwargs):
+        if timeout == 0:
+            # confirms the updates before the offset without waiting
+            self.confirmed.append(offset)
+            return []
+
+        self.offsets.append(offset)
+        if self.batches:
+            return self.batches.pop(0)
+        # long polling with no new updates
+        await asyncio.Event().wait()
+        return []
+
+
+@pytest.fixture
+def runner(monkeypatch):
+    runner = PollingRunner(concurrency=2, max_pending=3)
+    runner.processed = []
+    runner.flushed = []
+    runner.running = 0
+    runner.max_running = 0
+
+    async def process(update):
+        runner.running += 1
+        runner.max_running = max(runner.max_running, runner.running)
+        chat_id = update.message.chat.id
+        # give other chats a chance to run in between
+        await asyncio.sleep(0.05 if chat_id == 1 else 0.01)
+        runner.processed.append(update.update_id)
+        runner.running -= 1
+
+    async def flush_buffers():
+        runner.flushed.append(len(runner.processed))
+
+    monkeypatch.setattr(runner, "_process", process)
+    monkeypatch.setattr(polling, "flush_buffers", flush_buffers)
+    return runner
+
+
+def _run(runner, bot, monkeypatch, stop_after):
+    monkeypatch.setattr(polling, "get_bot", lambda: bot)
+
+    async def main():
+        task = asyncio.create_task(runner.run())
+        while len(runner.processed) < stop_after:
+            await asyncio.sleep(0.01)
+        os.kill(os.getpid(), signal.SIGTERM)
+        await task
+
+    asyncio.run(main())
+
+
+def test_updates_of_a_chat_are_processed_in_order(runner, monkeypatch):
+    updates = [_update(i, chat) for i, chat in [(1, 1), (2, 1), (3, 2)]]
+    bot = FakeBot([updates, [_update(4, 1), _update(5, 3)]])
+
+    _run(runner, bot, monkeypatch, stop_after=5)
+
+    # other chats are processed concurrently and finish first
+    assert runner.processed.index(3) < runner.processed.index(1)
+    assert [i for i in runner.processed if i in (1, 2, 4)] == [1, 2, 4]
+    assert runner.max_running == 2
+    assert bot.offsets == [None, 4, 6]
+
+
+def test_polling_pauses_while_updates_are_pending(runner, monkeypatch):
+    updates = [_update(i, 1) for i in range(1, 5)]
+    bot = FakeBot([updates, [_update(5, 2)]])
+
+    _run(runner, bot, monkeypatch, stop_after=5)
+
+    # next batch is fetched only once pending updates drop below the limit
+    assert runner.processed.index(5) > runner.processed.index(2)
+
+
+def test_stop_drains_pending_updates(runner, monkeypatch):
+    bot = FakeBot([[_update(i, 1) for i in range(1, 4)]])
+
+    _run(runner, bot, monkeypatch, stop_after=1)
+
+    assert runner.processed == [1, 2, 3]
+    assert runner.flushed == [3]
+    assert runner.pending == 0
+    # Telegram would deliver the processed updates again otherwise
+    assert bot.confirmed == [4]
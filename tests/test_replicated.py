@@ -0,0 +1,186 @@
+from datetime import date
+
+import pytest
+
+from expense_bot.model import ExpenseItem
+from expense_bot.repositories import InMemory, Replicated, replicated
+from expense_bot.testing import FakeGoogleSheets, FakeSpreadsheets
+
+DAY = date.today().replace(day=3)
+
+
+@pytest.fixture
+def sheets():
+    sheets = FakeSpreadsheets()
+    remote = FakeGoogleSheets(sheets)
+    remote.add(ExpenseItem(1.0, "Cafe"), dt=DAY)
+    remote.flush()
+    sheets.reset_calls()
+    return sheets
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    return str(tmp_path / "replica.json")
+
+
+def _replicated(sheets, snapshot):
+    return Replicated(
+        FakeGoogleSheets(sheets), InMemory(), snapshot_path=snapshot
+    )
+
+
+def test_reads_are_served_locally(sheets, snapshot):
+    repo = _replicated(sheets, snapshot)
+
+    assert repo.get_all(dt=DAY) == [ExpenseItem(1.0, "Cafe")]
+    calls = sheets.total_calls
+    assert list(repo.get_range(DAY, DAY)) == [(DAY, ExpenseItem(1.0, "Cafe"))]
+    assert sheets.total_calls == calls
+
+
+def test_only_changed_days_are_pushed(sheets, snapshot):
+    repo = _replicated(sheets, snapshot)
+    repo.get_all(dt=DAY)
+
+    repo.add(ExpenseItem(2.0, "Taxi"), dt=DAY)
+    sheets.reset_calls()
+    repo.flush()
+
+    # compared with the cached remote month, not read again
+    assert sheets.calls == {"values.batchUpdate": 1}
+    row = sheets.read_range(f"{DAY:%m/%y}!D7:H7", "UNFORMATTED_VALUE")
+    assert row["values"] == [[1, 2, "", "", "Cafe, Taxi"]]
+
+
+def test_remote_edits_are_pulled(sheets, snapshot):
+    repo = _replicated(sheets, snapshot)
+    repo.get_all(dt=DAY)
+
+    # edited by hand in the spreadsheet
+    sheets.write_range(
+        f"'{DAY:%m/%y}'!D7:H7", [["5", "", "", "", "Bakery"]], "USER_ENTERED"
+    )
+    result = repo.sync()
+
+    assert (result.pulled, result.pushed, result.conflicts) == (1, 0, 0)
+    assert repo.get_all(dt=DAY) == [ExpenseItem(5.0, "Bakery")]
+
+
+def test_snapshot_is_restored(sheets, snapshot):
+    _replicated(sheets, snapshot).get_all(dt=DAY)
+    sheets.reset_calls()
+
+    repo = _replicated(sheets, snapshot)
+
+    assert repo.get_all(dt=DAY) == [ExpenseItem(1.0, "Cafe")]
+    assert sheets.total_calls == 0
+
+
+def test_flush_saves_only_changed_months(sheets, snapshot, monkeypatch):
+    repo = _replicated(sheets, snapshot)
+    repo.get_all(dt=DAY)
+    saved = []
+    replace = replicated.os.replace
+    monkeypatch.setattr(
+        replicated.os,
+        "replace",
+        lambda src, dst: saved.append(dst) or replace(src, dst),
+    )
+
+    repo.add(ExpenseItem(2.0, "Taxi"), dt=DAY)
+    repo.flush()
+
+    assert saved == [
+        snapshot.replace(".json", f"-{DAY:%Y-%m}.json"),
+        snapshot,
+    ]
+    restored = _replicated(sheets, snapshot)
+    assert restored.get_all(dt=DAY) == [
+        ExpenseItem(1.0, "Cafe"),
+        ExpenseItem(2.0, "Taxi"),
+    ]
+
+
+def test_months_outside_initial_span_are_pulled(sheets, snapshot):
+    old = date(DAY.year - 2, DAY.month, 3)
+    remote = FakeGoogleSheets(sheets)
+    remote.add(ExpenseItem(7.0, "Books"), dt=old)
+    remote.flush()
+
+    repo = _replicated(sheets, snapshot)
+
+    assert repo.get_all(dt=old) == [ExpenseItem(7.0, "Books")]
+    repo.add(ExpenseItem(2.0, "Taxi"), dt=old)
+    repo.flush()
+    assert FakeGoogleSheets(sheets).get_all(dt=old) == [
+        ExpenseItem(7.0, "Books"),
+        ExpenseItem(2.0, "Taxi"),
+    ]
+
+
+def test_remote_must_support_replacing_days():
+    class AppendOnly(InMemory):
+        supports_replace = False
+
+    with pytest.raises(TypeError):
+        Replicated(AppendOnly(), InMemory(), snapshot_path=None)
+
+
+def test_writes_which_do_not_fit_are_rejected(sheets, snapshot):
+    repo = _replicated(sheets, snapshot)
+    items = [(DAY, ExpenseItem(amt, "Cafe")) for amt in (2.0, 3.0, 4.0)]
+    repo.add_many(items)
+
+    with pytest.raises(AssertionError):
+        repo.add(ExpenseItem(5.0, "Cafe"), dt=DAY)
+    assert len(repo.get_all(dt=DAY)) == 4
+
+
+def test_failed_pushes_do_not_abort_sync(sheets, snapshot):
+    repo = _replicated(sheets, snapshot)
+    repo.get_all(dt=DAY)
+    other = DAY.replace(day=4)
+    # bypasses the checks of the replicated repository
+    repo.replica.add_many([(DAY, ExpenseItem(2.0, "Taxi"))] * 4)
+    repo.add(ExpenseItem(3.0, "Bakery"), dt=other)
+
+    result = repo.sync()
+
+    assert (result.pushed, result.failed) == (1, 1)
+    assert FakeGoogleSheets(sheets).get_all(dt=other) == [
+        ExpenseItem(3.0, "Bakery")
+    ]
+    assert len(repo.get_all(dt=DAY)) == 5
+
+
+def test_conflicting_local_items_are_kept(sheets, snapshot):
+    repo = _replicated(sheets, snapshot)
+    repo.get_all(dt=DAY)
+
+    repo.add(ExpenseItem(2.0, "Taxi"), dt=DAY)
+    sheets.write_range(
+        f"'{DAY:%m/%y}'!D7:H7", [["5", "", "", "", "Bakery"]], "USER_ENTERED"
+    )
+    result = repo.sync()
+
+    expected = [ExpenseItem(5.0, "Bakery"), ExpenseItem(2.0, "Taxi")]
+    assert result.conflicts == 1
+    assert repo.get_all(dt=DAY) == expected
+    assert FakeGoogleSheets(sheets).get_all(dt=DAY) == expected
+
+
+def test_default_snapshot_paths_are_per_repository():
+    def path(**options):
+        return Replicated._default_snapshot_path(  # pylint: disable=W0212
+            "GoogleSheets", options, "InMemory", None
+        )
+
+    assert path(spreadsheet_id="a") != path(spreadsheet_id="b")
+    assert path(spreadsheet_id="a") == path(spreadsheet_id="a")
+    assert (
+        Replicated(
+            FakeGoogleSheets(FakeSpreadsheets()), "InMemory"
+        )._snapshot_path
+        is None
+    )  # pylint: disable=W0212
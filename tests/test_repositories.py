@@ -0,0 +1,179 @@
+import asyncio
+import random
+from datetime import date
+
+import pytest
+
+from expense_bot.model import EARN, SPEND, ExpenseItem
+from expense_bot.repositories import InMemory
+from expense_bot.repository import Repository
+
+
+@pytest.fixture(params=["InMemory", "SQLite"])
+def repo(request, tmp_path):
+    if request.param == "SQLite":
+        return Repository.new("SQLite", path=str(tmp_path / "db.sqlite3"))
+    return Repository.new(request.param)
+
+
+def test_in_memory_get_range():
+    repo = InMemory()
+    repo.add(ExpenseItem(3.0, "Cafe"), dt=date(2024, 2, 3))
+    repo.add(ExpenseItem(1.0, "Grocery"), dt=date(2024, 1, 15))
+    repo.add(ExpenseItem(2.0, "Paycheck", EARN), dt=date(2024, 1, 31))
+    repo.add(ExpenseItem(4.0, "Taxi"), dt=date(2024, 1, 15))
+
+    assert list(repo.get_range(date(2024, 1, 15), date(2024, 1, 31))) == [
+        (date(2024, 1, 15), ExpenseItem(1.0, "Grocery")),
+        (date(2024, 1, 15), ExpenseItem(4.0, "Taxi")),
+        (date(2024, 1, 31), ExpenseItem(2.0, "Paycheck", EARN)),
+    ]
+    assert not list(repo.get_range(date(2024, 2, 4), date(2024, 3, 1)))
+
+
+def test_add_many_and_get(repo):
+    count = repo.add_many(
+        [
+            (date(2024, 2, 3), ExpenseItem(3.0, "Cafe")),
+            (date(2024, 1, 15), ExpenseItem(1.0, "Grocery")),
+            (date(2024, 1, 15), ExpenseItem(4.0, "Taxi")),
+        ]
+    )
+
+    assert count == 3
+    assert list(repo.get_all(dt=date(2024, 1, 15))) == [
+        ExpenseItem(1.0, "Grocery"),
+        ExpenseItem(4.0, "Taxi"),
+    ]
+    assert [dt for dt, _ in repo.get_range(date(2024, 1, 1), date.max)] == [
+        date(2024, 1, 15),
+        date(2024, 1, 15),
+        date(2024, 2, 3),
+    ]
+
+
+def test_async_variants(repo):
+    async def main():
+        await repo.add_async(ExpenseItem(1.0, "Cafe"), dt=date(2024, 1, 15))
+        await repo.add_many_async(
+            [(date(2024, 1, 16), ExpenseItem(2, "Taxi"))]
+        )
+        await repo.flush_async()
+        return (
+            list(await repo.get_all_async(dt=date(2024, 1, 15))),
+            list(await repo.get_range_async(date(2024, 1, 1), date.max)),
+        )
+
+    items, records = asyncio.run(main())
+
+    assert items == [ExpenseItem(1.0, "Cafe")]
+    assert records == [
+        (date(2024, 1, 15), ExpenseItem(1.0, "Cafe")),
+        (date(2024, 1, 16), ExpenseItem(2, "Taxi")),
+    ]
+
+
+def test_totals(repo):
+    repo.add_many(
+        [
+            (date(2024, 1, 15), ExpenseItem(1.0, "Cafe")),
+            (date(2024, 1, 15), ExpenseItem(4.0, "Taxi")),
+            (date(2024, 1, 31), ExpenseItem(2.0, "Paycheck", EARN)),
+            (date(2024, 2, 3), ExpenseItem(3.0, "Cafe")),
+            (date(2024, 3, 1), ExpenseItem(8.0, "Cafe")),
+        ]
+    )
+    start, end = date(2024, 1, 1), date(2024, 2, 29)
+
+    assert repo.totals(start, end) == {SPEND: 8.0, EARN: 2.0}
+    assert repo.totals(start, end, by="vnd", cat=SPEND) == {
+        "Cafe": 4.0,
+        "Taxi": 4.0,
+    }
+    assert repo.totals(start, end, by="day") == {
+        date(2024, 1, 15): 5.0,
+        date(2024, 1, 31): 2.0,
+        date(2024, 2, 3): 3.0,
+    }
+
+
+def test_sqlite_persists(tmp_path):
+    path = str(tmp_path / "db.sqlite3")
+    repo = Repository.new("SQLite", path=path)
+    repo.add(ExpenseItem(1.5, "Cafe"), dt=date(2024, 2, 3))
+    repo.close()
+
+    reopened = Repository.new("SQLite", path=path)
+    assert list(reopened.get_all(dt=date(2024, 2, 3))) == [
+        ExpenseItem(1.5, "Cafe")
+    ]
+
+
+def test_in_memory_fixed_point_totals():
+    repo = InMemory()
+    repo.add(ExpenseItem(0.1, "Cafe"), dt=date(2024, 1, 1))
+    repo.add(ExpenseItem(0.2, "Cafe"), dt=date(2024, 1, 2))
+
+    assert repo.totals(date(2024, 1, 1), date(2024, 1, 31)) == {SPEND: 0.3}
+    assert not hasattr(repo.get_all(dt=date(2024, 1, 1))[0], "__dict__")
+
+
+def test_in_memory_aggregates_match_records():
+    repo = InMemory()
+    rnd = random.Random(1)
+    repo.add_many(
+        (
+            date(2024, rnd.randint(1, 3), rnd.randint(1, 28)),
+            ExpenseItem(
+                rnd.randint(1, 20) / 4,
+                rnd.choice(["Cafe", "Taxi", "Books"]),
+                rnd.choice([EARN, SPEND, SPEND]),
+            ),
+        )
+        for _ in range(300)
+    )
+    start, end = date(2024, 1, 10), date(2024, 3, 20)
+
+    for by in ["cat", "vnd", "day"]:
+        for cat in [None, SPEND]:
+            assert repo.totals(start, end, by=by, cat=cat) == pytest.approx(
+                Repository.totals(repo, start, end, by=by, cat=cat)
+            )
+    assert repo.summarize(start, end) == Repository.summarize(
+        repo, start, end
+    )
+
+
+def test_summarize(repo):
+    repo.add_many(
+        [
+            (date(2024, 1, 15), ExpenseItem(1.0, "Cafe")),
+            (date(2024, 1, 15), ExpenseItem(4.0, "Taxi")),
+            (date(2024, 1, 31), ExpenseItem(20.0, "Paycheck", EARN)),
+            (date(2024, 2, 3), ExpenseItem(4.0, "Cafe")),
+            (date(2024, 3, 1), ExpenseItem(8.0, "Cafe")),
+        ]
+    )
+
+    summary = repo.summarize(date(2024, 1, 1), date(2024, 2, 29), top=2)
+
+    assert (summary.earned, summary.spent, summary.net) == (20.0, 9.0, 11.0)
+    assert summary.daily_average == 9.0 / 60
+    assert summary.vendors == [("Cafe", 5.0), ("Taxi", 4.0)]
+    assert summary.largest == [
+        (date(2024, 1, 15), ExpenseItem(4.0, "Taxi")),
+        (date(2024, 2, 3), ExpenseItem(4.0, "Cafe")),
+    ]
+
+
+def test_replace_day(repo):
+    assert repo.supports_replace
+    repo.add(ExpenseItem(1.0, "Cafe"), dt=date(2024, 1, 15))
+    repo.add(ExpenseItem(2.0, "Taxi"), dt=date(2024, 1, 16))
+
+    repo.replace_day(date(2024, 1, 15), [ExpenseItem(5.0, "Grocery")])
+    repo.replace_day(date(2024, 1, 16), [])
+
+    assert list(repo.get_range(date(2024, 1, 1), date(2024, 1, 31))) == [
+        (date(2024, 1, 15), ExpenseItem(5.0, "Grocery")),
+    ]
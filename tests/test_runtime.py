@@ -0,0 +1,56 @@
+import asyncio
+
+from expense_bot import runtime as runtime_module
+from expense_bot.repositories import InMemory
+from expense_bot.repository import Repository
+from expense_bot.runtime import Runtime
+from expense_bot.tenants import TenantRegistry
+
+
+class _Repository(InMemory):
+    def __init__(self):
+        super().__init__()
+        self.resets = 0
+
+    def reset_connections(self):
+        self.resets += 1
+
+
+async def _current_loop():
+    return asyncio.get_running_loop()
+
+
+def test_runtime_reuses_event_loop():
+    runtime = Runtime()
+
+    assert runtime.run(_current_loop()) is runtime.run(_current_loop())
+
+
+def test_runtime_resets_idle_connections():
+    repo = _Repository()
+    token = Repository.set_current(repo)
+    try:
+        runtime = Runtime(max_idle=3600)
+        runtime.run(_current_loop())
+        assert repo.resets == 0
+
+        runtime = Runtime(max_idle=0)
+        runtime.run(_current_loop())
+        assert repo.resets == 1
+    finally:
+        Repository.reset_current(token)
+
+
+def test_runtime_resets_tenant_connections(monkeypatch):
+    registry = TenantRegistry()
+    tenant = registry.register("home", [1], "_Repository")
+    monkeypatch.setattr(runtime_module, "tenants", registry)
+    repo = registry.repository(tenant)
+
+    token = Repository.set_current(InMemory())
+    try:
+        Runtime(max_idle=0).run(_current_loop())
+    finally:
+        Repository.reset_current(token)
+
+    assert repo.resets == 1
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from expense_bot.scheduler import Priority, RequestScheduler, TokenBucket
+
+
+def test_token_bucket_serves_higher_priority_first():
+    bucket = TokenBucket(rate=50, capacity=1)
+    bucket.acquire()
+    served = []
+
+    def worker(name, priority):
+        bucket.acquire(priority)
+        served.append(name)
+
+    threads = [
+        threading.Thread(target=worker, args=("flush", Priority.BACKGROUND)),
+        threading.Thread(target=worker, args=("read", Priority.INTERACTIVE)),
+    ]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.005)
+    for thread in threads:
+        thread.join()
+
+    assert served == ["read", "flush"]
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=100, capacity=2)
+
+    started = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+
+    assert time.monotonic() - started >= 0.035
+
+
+def test_scheduler_retries_transient_failures():
+    failures = iter([ValueError("flaky"), ValueError("flaky")])
+
+    def call():
+        exc = next(failures, None)
+        if exc:
+            raise exc
+        return "ok"
+
+    scheduler = RequestScheduler(
+        is_transient=lambda exc: isinstance(exc, ValueError), base_delay=0.001
+    )
+    assert scheduler.execute(call) == "ok"
+
+    with pytest.raises(KeyError):
+        scheduler.execute(lambda: {}["missing"])
+
+
+def test_scheduler_coalesces_identical_calls():
+    calls = []
+
+    def call():
+        calls.append(1)
+        time.sleep(0.05)
+        return len(calls)
+
+    scheduler = RequestScheduler()
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(scheduler.execute(call, key="k"))
+        )
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [1, 1, 1]
+    assert len(calls) == 1
@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import pytest
+
+from expense_bot.secrets import SecretsProvider
+
+
+@pytest.fixture
+def secrets():
+    return SecretsProvider()
+
+
+def test_sync_and_async_providers(secrets):
+    @secrets.register(secret="sync")
+    def sync_provider():
+        return "a"
+
+    @secrets.register(secret="async")
+    async def async_provider():
+        return "b"
+
+    assert secrets["sync"] == "a"
+    assert secrets["async"] == "b"
+    assert asyncio.run(secrets.get("async")) == "b"
+
+    with pytest.raises(KeyError):
+        secrets["missing"]  # pylint: disable=W0104
+
+
+def test_async_provider_is_not_awaited_on_running_loop(secrets):
+    @secrets.register(secret="async")
+    async def async_provider():
+        return "b"
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            secrets["async"]  # pylint: disable=W0104
+
+        assert await secrets.get("async") == "b"
+        return secrets["async"]
+
+    assert asyncio.run(main()) == "b"
+
+
+def test_prefetch_is_concurrent(secrets):
+    calls = []
+
+    for name in ["a", "b", "c"]:
+
+        @secrets.register(secret=name)
+        async def provider(name=name):
+            calls.append(name)
+            await asyncio.sleep(0.1)
+            return name
+
+    started = time.perf_counter()
+    asyncio.run(secrets.prefetch())
+
+    assert time.perf_counter() - started < 0.25
+    assert [secrets[name] for name in "abc"] == ["a", "b", "c"]
+    assert len(calls) == 3
+
+
+def test_expired_secret_is_refreshed_in_background(secrets):
+    values = iter(["old", "new"])
+
+    @secrets.register(secret="token", ttl=0)
+    async def provider():
+        return next(values)
+
+    async def main():
+        first = await secrets.get("token")
+        stale = await secrets.get("token")
+        await asyncio.sleep(0.01)
+        return first, stale, await secrets.get("token")
+
+    assert asyncio.run(main()) == ("old", "old", "new")
+
+
+def test_encrypted_disk_cache(secrets, tmp_path):
+    fernet = pytest.importorskip("cryptography.fernet")
+    key, path = fernet.Fernet.generate_key().decode(), tmp_path / "cache"
+
+    @secrets.register(secret="token", ttl=60)
+    def provider():
+        return {"password": "hunter2"}
+
+    assert secrets.configure_cache(str(path), key)
+    assert secrets["token"] == {"password": "hunter2"}
+    assert b"hunter2" not in path.read_bytes()
+
+    restarted = SecretsProvider()
+    restarted.register(secret="token", ttl=60)(lambda: pytest.fail())
+    restarted.configure_cache(str(path), key)
+    assert restarted["token"] == {"password": "hunter2"}
@@ -0,0 +1,78 @@
+import asyncio
+import sqlite3
+from datetime import date
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+from expense_bot.storage import SQLiteStorage, decode_data, encode_data
+
+KEY = StorageKey(bot_id=1, chat_id=2, user_id=3)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "fsm.sqlite3")
+
+
+def _rows(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT state, data FROM fsm").fetchall()
+
+
+def test_encode_data():
+    data = {"dt": date(2024, 1, 31), "amount": 12.5}
+
+    assert encode_data(data) == '{"dt":{"$d":738916},"amount":12.5}'
+    assert decode_data(encode_data(data)) == data
+
+
+def test_transition_is_written_once(path):
+    async def main():
+        storage = SQLiteStorage(path)
+        await storage.set_state(KEY, "Add:amount")
+        await storage.update_data(KEY, {"dt": date(2024, 1, 31)})
+        assert not _rows(path)
+
+        await asyncio.sleep(0)
+        assert _rows(path) == [("Add:amount", '{"dt":{"$d":738916}}')]
+
+        await storage.set_state(KEY, None)
+        await storage.set_data(KEY, {})
+        await storage.close()
+        assert not _rows(path)
+
+    asyncio.run(main())
+
+
+def test_state_survives_restart(path):
+    async def main():
+        first = SQLiteStorage(path)
+        second = SQLiteStorage(path)
+
+        assert await second.get_state(KEY) is None
+
+        await first.set_state(KEY, "Add:vendor")
+        await first.update_data(KEY, {"amount": 3.0})
+        first.flush()
+
+        assert await second.get_state(KEY) == "Add:vendor"
+        assert await second.get_data(KEY) == {"amount": 3.0}
+
+    asyncio.run(main())
+
+
+def test_journal_mode(path):
+    async def main():
+        storage = SQLiteStorage(path, journal_mode="delete")
+        await storage.set_state(KEY, "Add:amount")
+        await storage.close()
+
+    asyncio.run(main())
+
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone() == ("delete",)
+    assert _rows(path) == [("Add:amount", "{}")]
+
+    with pytest.raises(ValueError):
+        SQLiteStorage(path, journal_mode="wal; DROP TABLE fsm")
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import sqlite3
+from datetime import date, datetime
+
+import pytest
+from aiogram.types import Chat, Message, User
+
+from expense_bot.metrics import metrics
+from expense_bot.model import ExpenseItem
+from expense_bot.repositories import InMemory, SQLite
+from expense_bot.repository import Repository
+from expense_bot.tenants import TenantMiddleware, TenantRegistry
+
+
+def _message(user_id, chat_id):
+    return Message(
+        message_id=1,
+        date=datetime(2024, 2, 3),
+        chat=Chat(id=chat_id, type="group"),
+        from_user=User(id=user_id, is_bot=False, first_name="Test"),
+    )
+
+
+@pytest.fixture
+def registry():
+    registry = TenantRegistry(pool_size=1)
+    registry.register("home", [1, 2], "InMemory")
+    registry.register("team", [-100], "InMemory")
+    return registry
+
+
+def test_resolve_by_user_or_chat(registry):
+    assert registry.resolve([2, 5]).name == "home"
+    assert registry.resolve([3, -100]).name == "team"
+    assert registry.resolve([3, 4]) is None
+    assert [tenant.name for tenant in registry.all()] == ["home", "team"]
+
+
+def test_repositories_are_pooled(tmp_path):
+    registry = TenantRegistry(pool_size=1)
+    home, team = (
+        registry.register(name, [i], "SQLite", path=str(tmp_path / name))
+        for i, name in enumerate(["home", "team"])
+    )
+
+    repo = registry.repository(home)
+    assert isinstance(repo, SQLite)
+    assert registry.repository(home) is repo
+
+    # the pool holds a single repository, the evicted one is closed
+    assert registry.repository(team) is not repo
+    assert registry.repository(home) is not repo
+    with pytest.raises(sqlite3.ProgrammingError):
+        repo.get_all(dt=date(2024, 2, 3))
+
+
+def test_in_memory_repositories_are_not_evicted(registry):
+    home, team = registry.resolve([1]), registry.resolve([-100])
+
+    repo = registry.repository(home)
+    repo.add(ExpenseItem(1.0, "Cafe"), dt=date(2024, 2, 3))
+    registry.repository(team)
+
+    assert registry.repository(home) is repo
+    assert len(registry.live()) == 2
+
+
+def test_repositories_in_use_are_closed_later(tmp_path):
+    registry = TenantRegistry(pool_size=1)
+    home = registry.register("home", [1], "SQLite", path=str(tmp_path / "a"))
+    team = registry.register("team", [2], "SQLite", path=str(tmp_path / "b"))
+
+    with registry.use(home) as repo:
+        registry.repository(team)
+        repo.add(ExpenseItem(1.0, "Cafe"), dt=date(2024, 2, 3))
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        repo.get_all(dt=date(2024, 2, 3))
+    assert registry.repository(home).get_all(dt=date(2024, 2, 3)) == [
+        ExpenseItem(1.0, "Cafe")
+    ]
+
+
+def test_configure_from_environment(registry, monkeypatch):
+    config = {"solo": {"ids": [7], "repository": "InMemory"}}
+    monkeypatch.setenv("TENANTS", json.dumps(config))
+
+    assert registry.configure()
+    assert registry.resolve([1]) is None
+    assert registry.resolve([7]).name == "solo"
+
+
+def test_middleware_routes_to_tenant_repository(registry):
+    metrics.reset()
+    middleware = TenantMiddleware(registry)
+    seen = []
+
+    async def handler(event, data):
+        metrics.increment("Handled")
+        seen.append(Repository.current())
+
+    default = InMemory()
+    token = Repository.set_current(default)
+    try:
+        asyncio.run(middleware(handler, _message(1, 1), {}))
+        asyncio.run(middleware(handler, _message(3, -100), {}))
+        asyncio.run(middleware(handler, _message(3, 3), {}))
+    finally:
+        Repository.reset_current(token)
+
+    assert seen[0] is not default
+    assert seen[1] is not default
+    assert seen[2] is default
+    assert metrics.counter("Handled", Tenant="home") == 1
+    assert metrics.counter("Handled", Tenant="team") == 1
+    metrics.reset()
@@ -0,0 +1,99 @@
+import asyncio
+import io
+from datetime import date
+
+from expense_bot.model import EARN, ExpenseItem
+from expense_bot.repositories import InMemory
+from expense_bot.testing import FakeGoogleSheets
+from expense_bot.transfer import (
+    batched,
+    export_file,
+    import_file,
+    import_records,
+    import_records_async,
+)
+
+CSV = """date,amount,vendor,category
+2024-01-15,1.5,Cafe,
+2024-01-15,abc,Taxi,SPEND
+01/31/2024,100,Paycheck,earn
+2024-02-03,2,,SPEND
+2024-02-03,4,"Grocery, Inc",spend
+"""
+
+
+def test_import_csv_skips_invalid_rows():
+    repo = InMemory()
+
+    result = import_records(repo, io.StringIO(CSV), "csv", batch_size=2)
+
+    assert result.imported == 3
+    assert [error.split(":")[0] for error in result.errors] == [
+        "line 3",
+        "line 5",
+    ]
+    assert list(repo.get_range(date(2024, 1, 1), date(2024, 2, 29))) == [
+        (date(2024, 1, 15), ExpenseItem(1.5, "Cafe")),
+        (date(2024, 1, 31), ExpenseItem(100, "Paycheck", EARN)),
+        (date(2024, 2, 3), ExpenseItem(4, "Grocery, Inc")),
+    ]
+
+
+def test_import_jsonl():
+    lines = [
+        '{"date": "2024-01-15", "amount": 1.5, "vendor": "Cafe"}\n',
+        "\n",
+        "not json\n",
+        '{"date": "2024-01-16", "amount": 2, "vendor": "Taxi"}\n',
+    ]
+
+    result = import_records(InMemory(), lines, "jsonl")
+
+    assert result.imported == 2
+    assert result.errors[0].startswith("line 3: ")
+
+
+def test_import_skips_records_which_do_not_fit():
+    repo = FakeGoogleSheets()
+    repo.add(ExpenseItem(1, "Cafe"), dt=date(2024, 1, 15))
+    lines = [
+        f'{{"date": "2024-01-15", "amount": {i}, "vendor": "Taxi"}}\n'
+        for i in range(5)
+    ]
+
+    result = import_records(repo, lines, "jsonl", batch_size=2)
+
+    assert result.imported == 3
+    assert result.errors == [
+        "line 4: no room left for SPEND items on 2024-01-15",
+        "line 5: no room left for SPEND items on 2024-01-15",
+    ]
+    assert len(list(repo.get_all(dt=date(2024, 1, 15)))) == 4
+
+    lines = ['{"date": "2024-01-16", "amount": 1, "vendor": "Taxi"}\n']
+    result = asyncio.run(import_records_async(repo, lines * 6, "jsonl"))
+
+    assert result.imported == 4
+    assert len(result.errors) == 2
+
+
+def test_export_round_trip(tmp_path):
+    source = FakeGoogleSheets()
+    source.add(ExpenseItem(1.5, "Cafe"), dt=date(2024, 1, 15))
+    source.add(ExpenseItem(100, "Paycheck", EARN), dt=date(2024, 2, 1))
+
+    for fmt in ["csv", "jsonl"]:
+        path = str(tmp_path / f"export.{fmt}")
+        count = export_file(source, date(2024, 1, 1), date(2024, 2, 29), path)
+        assert count == 2
+
+        target = InMemory()
+        assert import_file(target, path).imported == 2
+        assert list(target.get_range(date.min, date.max)) == list(
+            source.get_range(date(2024, 1, 1), date(2024, 2, 29))
+        )
+
+
+def test_batched():
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert not list(batched([], 2))
@@ -2,7 +2,13 @@ from datetime import date, timedelta
 
 import pytest
 
-from expense_bot.utils import all_subclasses, parse_date
+from expense_bot.utils import (
+    LRUCache,
+    all_subclasses,
+    parse_date,
+    parse_date_range,
+    parse_period,
+)
 
 
 def test_all_subclasses():
@@ -38,6 +44,38 @@ def test_all_subclasses():
     assert set(all_subclasses(BC)) == set()
 
 
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache["a"] = 1
+    cache["b"] = 2
+
+    assert cache.get("a") == 1
+    cache["c"] = 3
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.cache_info() == (3, 1, 2, 2)
+
+
+def test_lru_cache_on_evict():
+    evicted = []
+    cache = LRUCache(maxsize=1, on_evict=evicted.append)
+    cache["a"] = 1
+    cache["b"] = 2
+
+    assert evicted == [1]
+    assert cache.values() == [2]
+
+
+def test_lru_cache_expires_values():
+    cache = LRUCache(maxsize=2, ttl=-1)
+    cache["a"] = 1
+
+    assert cache.get("a") is None
+    assert cache.cache_info() == (0, 1, 2, 0)
+
+
 @pytest.mark.parametrize(
     "dt_str, result",
     [
@@ -69,3 +107,76 @@ def test_parse_date_succeeds(dt_str, result):
 def test_parse_date_raises(dt_str):
     with pytest.raises(ValueError):
         parse_date(dt_str)
+
+
+@pytest.mark.parametrize(
+    "value, result",
+    [
+        ("2024-01-01..2024-01-31", (date(2024, 1, 1), date(2024, 1, 31))),
+        ("1/1/24 .. 1/2/24", (date(2024, 1, 1), date(2024, 1, 2))),
+        ("20240105", (date(2024, 1, 5), date(2024, 1, 5))),
+    ],
+)
+def test_parse_date_range_succeeds(value, result):
+    assert parse_date_range(value) == result
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "2024-01-31..2024-01-01",
+        "2024-01-01..",
+        "..2024-01-01",
+    ],
+)
+def test_parse_date_range_raises(value):
+    with pytest.raises(ValueError):
+        parse_date_range(value)
+
+
+@pytest.mark.parametrize(
+    "value, result",
+    [
+        ("week", (date(2024, 2, 5), date(2024, 2, 8))),
+        ("month", (date(2024, 2, 1), date(2024, 2, 8))),
+        ("year", (date(2024, 1, 1), date(2024, 2, 8))),
+        ("2024-01-01..2024-01-31", (date(2024, 1, 1), date(2024, 1, 31))),
+    ],
+)
+def test_parse_period(value, result):
+    assert parse_period(value, today=date(2024, 2, 8)) == result
+
+
+@pytest.mark.parametrize(
+    "value, result",
+    [
+        ("Jan 31, 2024", date(2024, 1, 31)),
+        ("31 january 2024", date(2024, 1, 31)),
+        ("31.01.2024", date(2024, 1, 31)),
+        ("-3d", date(2024, 2, 5)),
+        ("2 weeks ago", date(2024, 1, 25)),
+        ("thursday", date(2024, 2, 8)),
+        ("last thursday", date(2024, 2, 1)),
+        ("last fri", date(2024, 2, 2)),
+    ],
+)
+def test_parse_date_natural(value, result):
+    assert parse_date(value, today=date(2024, 2, 8)) == result
+
+
+@pytest.mark.parametrize(
+    "value, result",
+    [
+        ("jan..mar", (date(2024, 1, 1), date(2024, 3, 31))),
+        ("dec", (date(2024, 12, 1), date(2024, 12, 31))),
+        ("2024-W05", (date(2024, 1, 29), date(2024, 2, 4))),
+        ("2023-02", (date(2023, 2, 1), date(2023, 2, 28))),
+        ("2023", (date(2023, 1, 1), date(2023, 12, 31))),
+        ("last week", (date(2024, 1, 29), date(2024, 2, 4))),
+        ("last month", (date(2024, 1, 1), date(2024, 1, 31))),
+        ("this month", (date(2024, 2, 1), date(2024, 2, 8))),
+        ("-7d..yesterday", (date(2024, 2, 1), date(2024, 2, 7))),
+    ],
+)
+def test_parse_date_range_natural(value, result):
+    assert parse_date_range(value, today=date(2024, 2, 8)) == result